@@ -0,0 +1,58 @@
+"""
+Measure how long building a report matrix takes as the number of cases in
+one class grows
+
+usage: python benchmarks/bench_matrix.py [AXES]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from junit2htmlreport import matrix, parser  # noqa: E402
+
+
+def make_report(axis, cases):
+    """
+    Build a report holding one class of parameterized cases, without parsing any xml
+    """
+    report = parser.Junit.__new__(parser.Junit)
+    report.filename = axis
+    report.suites = []
+    suite = parser.Suite()
+    suite.name = "suite"
+    testclass = parser.Class()
+    testclass.name = "pkg.module.TestParameterized"
+    suite.classes[testclass.name] = testclass
+    for number in range(cases):
+        case = parser.Case()
+        case.name = "test_param[{}]".format(number)
+        case.testclass = testclass
+        if (number + axis) % 7 == 0:
+            case.failure = "failed"
+        testclass.add_case(case)
+    report.suites.append(suite)
+    return report
+
+
+def main():
+    axes = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    for cases in (1000, 5000, 10000, 30000):
+        reports = [make_report(axis, cases) for axis in range(axes)]
+        textmatrix = matrix.TextReportMatrix()
+        start = time.perf_counter()
+        for axis, report in enumerate(reports):
+            textmatrix.add_parsed_report("axis{}.xml".format(axis), report)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        for classname, casenames in textmatrix.casenames.items():
+            for casename in casenames:
+                textmatrix.combined_result_list(classname, casename)
+        combined = time.perf_counter() - start
+        print("{:>6} cases x {} axes: build {:>7.2f}s, combine {:>6.2f}s".format(
+            cases, axes, built, combined))
+
+
+if __name__ == "__main__":
+    main()
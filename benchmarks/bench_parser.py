@@ -0,0 +1,56 @@
+"""
+Measure how many test cases per second each parser backend can read
+
+usage: python benchmarks/bench_parser.py [CASES]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from junit2htmlreport import parser  # noqa: E402
+
+
+def write_report(filename, cases):
+    """
+    Write a synthetic report with a mix of passing, failing and skipped cases
+    """
+    with open(filename, "w") as outfile:
+        outfile.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n')
+        for suite in range(max(1, cases // 1000)):
+            outfile.write('<testsuite name="suite{}" time="1.0">\n'.format(suite))
+            for case in range(min(cases, 1000)):
+                outfile.write('<testcase classname="pkg.module.Class{}" name="test_{}" time="0.01">'.format(
+                    case % 20, case))
+                if case % 10 == 0:
+                    outfile.write('<failure message="assert 1 == 2">Traceback (most recent call last):\n'
+                                  '  File "test.py", line 1\nAssertionError</failure>')
+                elif case % 10 == 1:
+                    outfile.write('<skipped message="not today"/>')
+                outfile.write('<system-out>some output from test {}</system-out></testcase>\n'.format(case))
+            outfile.write('</testsuite>\n')
+        outfile.write('</testsuites>\n')
+
+
+def main():
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    backends = ["etree"] + sorted(parser.BACKENDS)
+    if not parser.have_lxml():
+        backends.remove("lxml")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "bench.xml")
+        write_report(filename, cases)
+        for backend in backends:
+            start = time.perf_counter()
+            report = parser.Junit(filename, backend=backend)
+            elapsed = time.perf_counter() - start
+            total = sum(len(suite.all()) for suite in report.suites)
+            print("{:<10} {:>8} cases {:>7.2f}s {:>10.0f} cases/sec".format(
+                backend, total, elapsed, total / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measure the time to render many small reports back to back, compiling the
+templates for every report, once per process, and once per bytecode cache,
+then the cases per second of the jinja and native report renderers
+
+usage: python benchmarks/bench_render.py [REPORTS [CASES]]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from junit2htmlreport import parser, render  # noqa: E402
+from bench_parser import write_report  # noqa: E402
+
+REPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "tests", "junit-simple_suite.xml")
+
+
+def render_all(report, count, fresh):
+    """
+    Render report count times with jinja, return the mean seconds per report
+    """
+    doc = render.HTMLReport(native=False)
+    doc.load(report, "bench")
+    start = time.perf_counter()
+    for _ in range(count):
+        if fresh:
+            # what every render did before environments were shared
+            render._ENVIRONMENTS.clear()
+        str(doc)
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    report = parser.Junit(REPORT)
+    render.set_bytecode_cache(None)
+    print("{:<28} {:>8.2f}ms per report".format("new environment each time", 1000 * render_all(report, count, True)))
+    print("{:<28} {:>8.2f}ms per report".format("shared environment", 1000 * render_all(report, count, False)))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        render.set_bytecode_cache(tmpdir)
+        cold = render_all(report, 1, True)
+        # a new process starts with no environments but finds the bytecode
+        warm = render_all(report, 20, True)
+        print("{:<28} {:>8.2f}ms".format("first report, no bytecode", 1000 * cold))
+        print("{:<28} {:>8.2f}ms".format("first report, bytecode", 1000 * warm))
+        render.set_bytecode_cache(None)
+
+        cases = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+        filename = os.path.join(tmpdir, "bench.xml")
+        write_report(filename, cases)
+        report = parser.Junit(filename)
+        report.allocate_anchors()
+        for native in (False, True):
+            doc = render.HTMLReport(native=native)
+            doc.load(report, "bench")
+            start = time.perf_counter()
+            with open(os.devnull, "wb") as outfile:
+                doc.write_to(outfile)
+            elapsed = time.perf_counter() - start
+            print("{:<28} {:>8.2f}s {:>10.0f} cases/sec".format(
+                "native" if native else "jinja", elapsed, cases / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+On-disk cache of parsed reports
+"""
+from typing import TYPE_CHECKING
+
+import hashlib
+import marshal
+import os
+import tempfile
+
+from .capture import CapturedText
+from .parser import Case, Class, Junit, Property, Suite, intern_text
+
+if TYPE_CHECKING: # pragma: no cover
+    from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# bump this when the shape of the cached report data changes
+CACHE_VERSION = 2
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+ENTRY_SUFFIX = ".j2h"
+
+
+def _properties_state(properties: "List[Property]"):
+    return [(prop.name, prop.value) for prop in properties]
+
+
+def _make_properties(state: "Any") -> "List[Property]":
+    properties = []
+    for name, value in state:
+        prop = Property()
+        prop.name = name
+        prop.value = value
+        properties.append(prop)
+    return properties
+
+
+def _text_state(text: "Optional[str]") -> "Any":
+    # marshal only stores exact str objects
+    if isinstance(text, CapturedText):
+        return str(text), text.total, text.link
+    return text
+
+
+def _make_text(state: "Any") -> "Optional[str]":
+    if isinstance(state, tuple):
+        return CapturedText(*state)
+    return state
+
+
+def report_state(report: "Junit") -> "Tuple[Any, ...]":
+    """
+    Flatten a report into nested tuples and lists of plain values that
+    marshal can store, which loads much faster than pickling the objects
+    :param report:
+    :return:
+    """
+    suites = []
+    for suite in report.suites:
+        classes = []
+        for testclass in suite.classes.values():
+            cases = [(case.name, case.duration, case.failure, case.failure_msg,
+                      case.skipped, case.skipped_msg, _text_state(case.stdout), _text_state(case.stderr),
+                      _properties_state(case.properties))
+                     for case in testclass.cases]
+            classes.append((testclass.name, cases))
+        suites.append((suite.name, suite.package, suite.duration,
+                       _text_state(suite.stdout), _text_state(suite.stderr),
+                       suite.errors, _properties_state(suite.properties), classes))
+    return CACHE_VERSION, report.filename, report.backend, suites
+
+
+def report_from_state(state: "Tuple[Any, ...]") -> "Junit":
+    """
+    Rebuild a report from report_state()
+    :param state:
+    :return:
+    """
+    version, filename, backend, suites = state
+    if version != CACHE_VERSION:
+        raise ValueError("unsupported cache version {}".format(version))
+    report = Junit.__new__(Junit)
+    report.filename = filename
+    report.backend = backend
+    report.capture = None
+    report.tree = None
+    report.suites = []
+    texts: "Dict[Any, str]" = {}
+    for name, package, duration, stdout, stderr, errors, properties, classes in suites:
+        suite = Suite()
+        suite.name = name
+        suite.package = package
+        suite.duration = duration
+        suite.stdout = _make_text(stdout)
+        suite.stderr = _make_text(stderr)
+        suite.errors = errors
+        suite.properties = _make_properties(properties)
+        for classname, cases in classes:
+            testclass = Class()
+            testclass.name = classname
+            suite.classes[classname] = testclass
+            for (casename, caseduration, failure, failure_msg, skipped, skipped_msg,
+                 casestdout, casestderr, caseprops) in cases:
+                case = Case()
+                case.name = casename
+                case.duration = caseduration
+                case.failure = intern_text(texts, failure)
+                case.failure_msg = intern_text(texts, failure_msg)
+                case.skipped = intern_text(texts, skipped)
+                case.skipped_msg = intern_text(texts, skipped_msg)
+                case.stdout = intern_text(texts, _make_text(casestdout))
+                case.stderr = intern_text(texts, _make_text(casestderr))
+                if caseprops:
+                    case.properties = _make_properties(caseprops)
+                case.testclass = testclass
+                testclass.cases.append(case)
+        report.suites.append(suite)
+    report.allocate_anchors()
+    return report
+
+
+def file_digest(filename: str) -> str:
+    """
+    Return the sha256 hex digest of a file's content
+    :param filename:
+    :return:
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ReportCache(object):
+    """
+    Store parsed Junit reports in a compact marshal format, keyed by the path, size and
+    modification time (and optionally the content hash) of the source file.
+
+    Entries are touched when they are used and the least recently used
+    entries are removed once the cache grows beyond max_bytes.  Stale
+    entries are simply never looked up again, corrupt ones are discarded.
+    """
+    directory: str
+    max_bytes: int
+    use_hash: bool
+
+    def __init__(self, directory: str, max_bytes: int=DEFAULT_MAX_BYTES, use_hash: bool=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.use_hash = use_hash
+
+    def entry_path(self, filename: str, variant: str="") -> str:
+        """
+        Return the cache file for the current content of filename
+        :param filename:
+        :param variant: extra key material, for parser options that change the parsed model
+        :return:
+        """
+        stat = os.stat(filename)
+        key = [str(CACHE_VERSION), os.path.abspath(filename), str(stat.st_size), str(stat.st_mtime_ns), variant]
+        if self.use_hash:
+            key.append(file_digest(filename))
+        name = hashlib.sha256("\0".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ENTRY_SUFFIX)
+
+    def get(self, filename: str, variant: str="") -> "Optional[Junit]":
+        """
+        Return the cached report for filename, or None
+        :param filename:
+        :param variant:
+        :return:
+        """
+        path = self.entry_path(filename, variant)
+        try:
+            with open(path, "rb") as infile:
+                # marshal.load() makes many small reads, loads() is far quicker
+                report = report_from_state(marshal.loads(infile.read()))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # corrupt or from an incompatible version, parse again
+            self.discard(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError: # pragma: no cover
+            pass
+        return report
+
+    def put(self, filename: str, report: "Junit", variant: str=""):
+        """
+        Store a parsed report
+        :param filename:
+        :param report:
+        :param variant:
+        :return:
+        """
+        path = self.entry_path(filename, variant)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        handle, tmppath = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as outfile:
+                marshal.dump(report_state(report), outfile)
+            os.replace(tmppath, path)
+        except BaseException:
+            self.discard(tmppath)
+            raise
+        self.evict(keep=path)
+
+    def load(self, filename: str, loader: "Callable[[], Junit]", variant: str="") -> "Junit":
+        """
+        Return the cached report for filename, calling loader() to parse and
+        cache it if there is no usable entry
+        :param filename:
+        :param loader:
+        :param variant:
+        :return:
+        """
+        report = self.get(filename, variant)
+        if report is None:
+            report = loader()
+            self.put(filename, report, variant)
+        return report
+
+    def entries(self) -> "List[Tuple[float, int, str]]":
+        """
+        Return (last used, size, path) for each cache entry
+        :return:
+        """
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError: # pragma: no cover
+                    continue
+                found.append((stat.st_mtime, stat.st_size, path))
+        return found
+
+    def evict(self, keep: "Optional[str]"=None):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes
+        :param keep: never remove this entry
+        :return:
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self.discard(path)
+            total -= size
+
+    @staticmethod
+    def discard(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,174 @@
+"""
+Limit how much system-out/system-err text is kept from a report
+"""
+from typing import TYPE_CHECKING
+
+import collections
+import hashlib
+import os
+import tempfile
+
+if TYPE_CHECKING: # pragma: no cover
+    from typing import Deque, IO, List, Optional
+
+# the elements whose text a CapturePolicy applies to
+CAPTURED_TAGS = ("system-out", "system-err")
+
+TRUNCATION_MARKER = "\n\n[... {} characters not shown ...]\n\n"
+
+
+class CapturedText(str):
+    """
+    The head and tail of a stream that was too long to keep in full
+    """
+    total: int
+    link: "Optional[str]"
+
+    def __new__(cls, text: str, total: int, link: "Optional[str]"=None):
+        value = super(CapturedText, cls).__new__(cls, text)
+        value.total = total
+        value.link = link
+        return value
+
+    def __reduce__(self):
+        return CapturedText, (str(self), self.total, self.link)
+
+
+class CapturePolicy(object):
+    """
+    Keep at most `limit` characters of each captured stream.  Longer streams
+    keep their first `head` and last `tail` characters around a truncation
+    marker, and if `spill_dir` is set the full text is written to a side file
+    there, named by its content hash, which the report links to.
+    """
+    limit: int
+    head: int
+    tail: int
+    spill_dir: "Optional[str]"
+    link_base: "Optional[str]"
+
+    def __init__(self, limit: int, head: "Optional[int]"=None, tail: "Optional[int]"=None,
+                 spill_dir: "Optional[str]"=None, link_base: "Optional[str]"=None):
+        """
+        :param limit: the longest stream kept in full
+        :param head: characters kept from the start of longer streams, default half the limit
+        :param tail: characters kept from the end of longer streams, default half the limit
+        :param spill_dir: write the full text of longer streams to files in this folder
+        :param link_base: link to spilled files relative to this, default spill_dir
+        """
+        self.limit = limit
+        self.head = limit // 2 if head is None else head
+        self.tail = limit - self.head if tail is None else tail
+        if self.head + self.tail > limit:
+            raise ValueError("head and tail must fit within the limit")
+        self.spill_dir = spill_dir
+        self.link_base = link_base
+
+    def __repr__(self):
+        return "CapturePolicy(limit={}, head={}, tail={}, spill_dir={!r}, link_base={!r})".format(
+            self.limit, self.head, self.tail, self.spill_dir, self.link_base)
+
+    def new_capture(self) -> "Capture":
+        """
+        Start capturing a stream
+        :return:
+        """
+        return Capture(self)
+
+    def apply(self, text: "Optional[str]") -> "Optional[str]":
+        """
+        Apply the policy to text that has already been read in full
+        :param text:
+        :return:
+        """
+        if text is None or len(text) <= self.limit:
+            return text
+        capture = self.new_capture()
+        capture.append(text)
+        return capture.value()
+
+    def link(self, name: str) -> str:
+        """
+        Return the report link for a spilled file
+        :param name:
+        :return:
+        """
+        base = self.spill_dir if self.link_base is None else self.link_base
+        if not base:
+            return name
+        return base.replace(os.sep, "/").rstrip("/") + "/" + name
+
+
+class Capture(object):
+    """
+    Accumulate the text of one stream as it is parsed, holding no more than
+    the policy limit in memory
+    """
+    def __init__(self, policy: "CapturePolicy"):
+        self.policy = policy
+        self.size = 0
+        self.parts: "List[str]" = []
+        self.head: "Optional[str]" = None
+        self.tail: "Deque[str]" = collections.deque()
+        self.tail_size = 0
+        self.spill: "Optional[IO[str]]" = None
+        self.spill_path: "Optional[str]" = None
+        self.digest = hashlib.sha1()
+
+    def append(self, text: str):
+        """
+        Add the next piece of the stream
+        :param text:
+        :return:
+        """
+        self.size += len(text)
+        if self.head is None:
+            self.parts.append(text)
+            if self.size > self.policy.limit:
+                self._overflow()
+        else:
+            self._write(text)
+            self._add_tail(text)
+
+    def _overflow(self):
+        text = "".join(self.parts)
+        self.parts = []
+        self.head = text[:self.policy.head]
+        if self.policy.spill_dir:
+            if not os.path.isdir(self.policy.spill_dir):
+                os.makedirs(self.policy.spill_dir)
+            handle, self.spill_path = tempfile.mkstemp(dir=self.policy.spill_dir, suffix=".tmp")
+            self.spill = os.fdopen(handle, "w", encoding="utf-8", errors="replace")
+            self._write(text)
+        self._add_tail(text[self.policy.head:])
+
+    def _write(self, text: str):
+        if self.spill is not None:
+            self.spill.write(text)
+            self.digest.update(text.encode("utf-8", errors="replace"))
+
+    def _add_tail(self, text: str):
+        self.tail.append(text)
+        self.tail_size += len(text)
+        while self.tail and self.tail_size - len(self.tail[0]) >= self.policy.tail:
+            self.tail_size -= len(self.tail.popleft())
+
+    def value(self) -> "Optional[str]":
+        """
+        Finish the stream and return the text to keep
+        :return:
+        """
+        if self.head is None:
+            return "".join(self.parts) or None
+
+        tail = "".join(self.tail)
+        tail = tail[max(0, len(tail) - self.policy.tail):]
+        omitted = self.size - len(self.head) - len(tail)
+        link = None
+        if self.spill is not None and self.spill_path is not None:
+            self.spill.close()
+            name = self.digest.hexdigest() + ".txt"
+            os.replace(self.spill_path, os.path.join(self.policy.spill_dir, name))
+            self.spill = None
+            link = self.policy.link(name)
+        return CapturedText(self.head + TRUNCATION_MARKER.format(omitted) + tail, self.size, link)
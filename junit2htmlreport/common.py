@@ -5,10 +5,15 @@ from __future__ import print_function
 
 from typing import TYPE_CHECKING
 
-from .parser import Case, Junit
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+from . import cache, parserimpl, sources
+from .parser import Case, Junit, ParserError
 
 if TYPE_CHECKING: # pragma: no cover
-    from typing import Dict, List
+    from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 
 class ReportContainer(object):
@@ -16,13 +21,47 @@ class ReportContainer(object):
     Hold one or more reports
     """
     reports: "Dict[str, Junit]"
+    parser_options: "Dict[str, Any]"
 
-    def __init__(self):
+    def __init__(self, **parser_options: "Any"):
+        """
+        :param parser_options: keyword arguments for parserimpl.load_report()
+        """
         self.reports = {}
+        self.parser_options = parser_options
 
     def add_report(self, filename: str) -> None:
         raise NotImplementedError()
 
+    def load_report(self, filename: str, fileobj: "Optional[IO[bytes]]"=None) -> Junit:
+        """
+        Parse a report file using the options given to this container
+        :param filename:
+        :param fileobj: read the report from this stream instead of opening filename
+        :return:
+        """
+        return parserimpl.load_report(filename, fileobj=fileobj, **self.parser_options)
+
+    def load_reports(self, filename: str) -> "Iterator[Tuple[str, Junit]]":
+        """
+        Parse a report file, or each report in a zip or tar archive, yielding
+        the name and parsed report.  Archive members are read in place and
+        skipped if they are not junit xml.
+        :param filename:
+        :return:
+        """
+        if not sources.is_archive(filename):
+            yield filename, self.load_report(filename)
+            return
+
+        for member, stream in sources.iter_archive(filename):
+            name = os.path.join(filename, member)
+            try:
+                report = self.load_report(name, fileobj=stream)
+            except (ParserError, ET.ParseError):
+                continue
+            yield name, report
+
     def failures(self):
         """
         Return all the failed test cases
@@ -45,3 +84,135 @@ class ReportContainer(object):
             for suite in self.reports[report].suites:
                 found.extend(suite.skipped())
         return found
+
+    def failure_count(self) -> int:
+        """
+        Return the number of failed test cases
+        :return:
+        """
+        return len(self.failures())
+
+    def skip_count(self) -> int:
+        """
+        Return the number of skipped test cases
+        :return:
+        """
+        return len(self.skips())
+
+
+def _load_reports_job(filename: str, parser_options: "Dict[str, Any]") -> "List[Tuple[str, Any]]":
+    """
+    Parse a report file or archive in a worker process.  Reports are returned
+    flattened by cache.report_state(), which is much quicker to send back to
+    the parent than the report objects.  Files that are not junit xml give
+    an empty list.
+    :param filename:
+    :param parser_options:
+    :return:
+    """
+    try:
+        return [(name, cache.report_state(report))
+                for name, report in ReportContainer(**parser_options).load_reports(filename)]
+    except (ParserError, ET.ParseError):
+        return []
+
+
+def map_jobs(func: "Callable[..., Any]", filenames: "Sequence[Any]", jobs: int, *args: "Any") -> "Iterator[Any]":
+    """
+    Yield func(filename, *args) for each filename, in order, using a pool of
+    jobs processes.  func and args must be picklable.
+    :param func: a module level function
+    :param filenames:
+    :param jobs: number of worker processes, 1 runs func in this process
+    :param args: extra arguments for every call
+    :return:
+    """
+    if jobs <= 1 or len(filenames) < 2:
+        for filename in filenames:
+            yield func(filename, *args)
+        return
+
+    chunksize = max(1, min(64, len(filenames) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(func, filenames, *[[arg] * len(filenames) for arg in args],
+                            chunksize=chunksize)
+
+
+def load_reports_parallel(filenames: "Sequence[str]", jobs: int,
+                          parser_options: "Dict[str, Any]") -> "Iterator[Tuple[str, Junit]]":
+    """
+    Parse report files (or archives of them) using a pool of jobs processes,
+    yielding (name, report) in the order of filenames.  Files that are not
+    junit xml are skipped.
+    :param filenames:
+    :param jobs: number of worker processes, 1 parses in this process
+    :param parser_options: keyword arguments for parserimpl.load_report()
+    :return:
+    """
+    if jobs <= 1 or len(filenames) < 2:
+        container = ReportContainer(**parser_options)
+        for filename in filenames:
+            try:
+                yield from list(container.load_reports(filename))
+            except (ParserError, ET.ParseError):
+                pass
+        return
+
+    for results in map_jobs(_load_reports_job, filenames, jobs, parser_options):
+        for name, state in results:
+            yield name, cache.report_from_state(state)
+
+
+class ResultCounter(ReportContainer):
+    """
+    Count the failed and skipped cases of one or more reports by streaming
+    them through parserimpl.iter_cases(), without keeping the report models
+    or the cases.  There are no cases to return from failures() and skips(),
+    use failure_count() and skip_count().
+    """
+    failed: int
+    skipped: int
+
+    def __init__(self, **parser_options: "Any"):
+        super(ResultCounter, self).__init__(**parser_options)
+        self.failed = 0
+        self.skipped = 0
+
+    def add_report(self, filename: str) -> None:
+        """
+        Count the outcomes in a report file
+        :param filename:
+        :return:
+        """
+        if sources.is_archive(filename):
+            for member, stream in sources.iter_archive(filename):
+                try:
+                    self.add_records(parserimpl.iter_cases(member, fileobj=stream))
+                except (ParserError, ET.ParseError):
+                    pass
+        else:
+            self.add_records(parserimpl.iter_cases(filename))
+
+    def add_records(self, records: "Iterator[parserimpl.CaseRecord]") -> None:
+        """
+        Count the outcomes of a sequence of case records
+        :param records:
+        :return:
+        """
+        for record in records:
+            if record.failed:
+                self.failed += 1
+            if record.skipped:
+                self.skipped += 1
+
+    def failures(self):
+        raise NotImplementedError("ResultCounter does not keep the cases, use failure_count()")
+
+    def skips(self):
+        raise NotImplementedError("ResultCounter does not keep the cases, use skip_count()")
+
+    def failure_count(self) -> int:
+        return self.failed
+
+    def skip_count(self) -> int:
+        return self.skipped
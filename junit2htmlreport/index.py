@@ -0,0 +1,508 @@
+"""
+Byte offset index of the suites and cases in a junit report, so single
+suites or cases can be loaded from a large report without parsing it all
+"""
+from typing import TYPE_CHECKING
+
+import collections
+import json
+import mmap
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+import zlib
+from xml.parsers import expat
+
+from .case_result import CaseResult
+from .parser import CHUNK_SIZE, NO_CLASSNAME, ParserError, SuiteBuilder, _SuiteFinder, clean_xml_value
+from .sources import _opener_for
+
+if TYPE_CHECKING: # pragma: no cover
+    from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+    from .parser import Case, Suite
+
+INDEX_VERSION = 2
+
+INDEX_SUFFIX = ".j2hidx"
+
+# about this many keys are kept in each bucket of a lookup table in the sidecar
+KEYS_PER_BUCKET = 64
+
+# the lookup tables of the sidecar, and the column of a case row each one is keyed by
+LOOKUP_TABLES = (("classes", 1), ("names", 2), ("outcomes", 3))
+
+
+CaseEntry = collections.namedtuple("CaseEntry", ["suite", "classname", "name", "outcome", "offset"])
+"""
+Where one test case starts in the report, and what happened to it
+"""
+
+
+class _Indexer(object):
+    """
+    Expat callbacks recording where each suite and case starts
+    """
+    def __init__(self, parser: "Any"):
+        self.parser = parser
+        self.finder = _SuiteFinder()
+        self.encoding: "Optional[str]" = None
+        self.suites: "List[Tuple[str, int]]" = []
+        self.classnames: "Dict[str, int]" = {}
+        self.cases: "List[List[Any]]" = []
+        self.case: "Optional[List[Any]]" = None
+        self.in_suite = False
+
+    def xmldecl(self, version: str, encoding: "Optional[str]", standalone: int):
+        self.encoding = encoding
+
+    def start(self, tag: str, attrib: "Dict[str, str]"):
+        offset = self.parser.CurrentByteIndex
+        if self.finder.start(tag):
+            name = clean_xml_value(attrib.get("name", "suite-" + str(self.finder.suitecount)))
+            self.suites.append((name, offset))
+            self.in_suite = True
+            return
+        if not self.in_suite:
+            return
+        depth = self.finder.depth - self.finder.suite_depth - 1
+        if depth == 1 and tag == "testcase":
+            classname = attrib.get("classname", None) or NO_CLASSNAME
+            classindex = self.classnames.setdefault(classname, len(self.classnames))
+            self.case = [len(self.suites) - 1, classindex, clean_xml_value(attrib.get("name")),
+                         CaseResult.PASSED.value, offset]
+            self.cases.append(self.case)
+        elif depth == 2 and self.case is not None:
+            if tag == "skipped":
+                self.case[3] = CaseResult.SKIPPED.value
+            elif tag in ("failure", "error") and self.case[3] != CaseResult.SKIPPED.value:
+                self.case[3] = CaseResult.FAILED.value
+
+    def end(self, tag: str):
+        depth = self.finder.end()
+        if depth == 0:
+            self.in_suite = False
+        elif depth == 1:
+            self.case = None
+
+
+class _FragmentDone(Exception):
+    """
+    Raised to stop parsing once the requested element has been read
+    """
+
+
+def _bucket(key: str, buckets: int) -> int:
+    return zlib.crc32(key.encode("utf-8", "surrogatepass")) % buckets
+
+
+def _parse_rows(data: bytes) -> "List[Tuple[Any, ...]]":
+    """
+    Parse consecutive case rows of a sidecar
+    :param data:
+    :return:
+    """
+    if not data:
+        return []
+    # one json array is much quicker to parse than a json value per row
+    return [tuple(row) for row in json.loads(b"[" + data[:-1].replace(b"\n", b",") + b"]")]
+
+
+class ReportIndex(object):
+    """
+    The byte offsets of each <testsuite> and <testcase> in an uncompressed
+    junit report, with the suite, class, name and outcome of each case.
+
+    The sidecar starts with a json header line holding the suites and class
+    names, followed by lookup tables from class name, case name and outcome
+    to the case rows, split into buckets by a hash of the key, and then one
+    json row per case.  An index read from a sidecar only loads its header,
+    find_cases() reads the buckets and rows it needs.
+    """
+    filename: str
+    size: int
+    mtime_ns: int
+    encoding: "Optional[str]"
+    suites: "List[Tuple[str, int]]"
+    classnames: "List[str]"
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.size = 0
+        self.mtime_ns = 0
+        self.encoding = None
+        self.suites = []
+        self.classnames = []
+        self._cases: "Optional[List[Tuple[int, int, Optional[str], str, int]]]" = None
+        self._lookup: "Optional[Dict[str, Dict[Any, List[int]]]]" = None
+        # where the parts of the sidecar are, for an index that was read from one
+        self._path: "Optional[str]" = None
+        self._body = 0
+        self._tables: "Dict[str, List[List[int]]]" = {}
+        self._rows: "List[int]" = [0, 0]
+        self._suite_rows: "List[List[int]]" = []
+
+    @property
+    def cases(self) -> "List[Tuple[int, int, Optional[str], str, int]]":
+        """
+        The (suite index, class index, name, outcome, offset) of every case,
+        read from the sidecar the first time it is needed
+        :return:
+        """
+        if self._cases is None:
+            assert self._path is not None
+            with open(self._path, "rb") as infile:
+                infile.seek(self._body + self._rows[0])
+                self._cases = _parse_rows(infile.read(self._rows[1]))
+        return self._cases
+
+    @classmethod
+    def build(cls, filename: str) -> "ReportIndex":
+        """
+        Read a report and record where everything is
+        :param filename:
+        :return:
+        """
+        index = cls(filename)
+        stat = os.stat(filename)
+        index.size = stat.st_size
+        index.mtime_ns = stat.st_mtime_ns
+        parser = expat.ParserCreate()
+        indexer = _Indexer(parser)
+        parser.XmlDeclHandler = indexer.xmldecl
+        parser.StartElementHandler = indexer.start
+        parser.EndElementHandler = indexer.end
+        with open(filename, "rb") as infile:
+            if _opener_for(infile.read(6)) is not None:
+                raise ParserError("can't index a compressed report")
+            infile.seek(0)
+            try:
+                for chunk in iter(lambda: infile.read(CHUNK_SIZE), b""):
+                    parser.Parse(chunk, False)
+                parser.Parse(b"", True)
+            except expat.ExpatError as err:
+                raise ET.ParseError("{}: line {}, column {}".format(
+                    expat.ErrorString(err.code), err.lineno, err.offset)) from err
+        indexer.finder.close()
+        index.encoding = indexer.encoding
+        index.suites = indexer.suites
+        index.classnames = list(indexer.classnames)
+        index._cases = [tuple(case) for case in indexer.cases]
+        return index
+
+    @classmethod
+    def read(cls, path: str) -> "ReportIndex":
+        """
+        Load an index saved by save()
+        :param path:
+        :return:
+        """
+        with open(path, "rb") as infile:
+            header = infile.readline()
+        state = json.loads(header.decode("utf-8"))
+        if state.get("version") != INDEX_VERSION:
+            raise ValueError("unsupported index version {}".format(state.get("version")))
+        index = cls(state["filename"])
+        index.size = state["size"]
+        index.mtime_ns = state["mtime_ns"]
+        index.encoding = state["encoding"]
+        index.suites = [(name, offset) for name, offset, _, _ in state["suites"]]
+        index.classnames = state["classnames"]
+        index._path = path
+        index._body = len(header)
+        index._tables = state["tables"]
+        index._rows = state["rows"]
+        index._suite_rows = [[start, end] for _, _, start, end in state["suites"]]
+        return index
+
+    def save(self, path: "Optional[str]"=None):
+        """
+        Write the index as a compact json sidecar file, by default next to the report
+        :param path:
+        :return:
+        """
+        if path is None:
+            path = self.filename + INDEX_SUFFIX
+        cases = self.cases
+        rows = []
+        starts = []
+        ends = [0] * len(self.suites)
+        size = 0
+        for case in cases:
+            row = (json.dumps(case, separators=(",", ":")) + "\n").encode("utf-8")
+            starts.append(size)
+            rows.append(row)
+            size += len(row)
+            ends[case[0]] = size
+        # the cases of each suite are next to each other, in suite order
+        suite_rows = []
+        start = 0
+        for end in ends:
+            end = max(start, end)
+            suite_rows.append((start, end))
+            start = end
+
+        # the tables come first, rows are placed after them
+        body: "List[bytes]" = []
+        offset = 0
+        tables: "Dict[str, List[List[int]]]" = {}
+        for table, column in LOOKUP_TABLES:
+            keys: "Dict[Any, List[int]]" = {}
+            for case, start in zip(cases, starts):
+                key = self.classnames[case[1]] if table == "classes" else case[column]
+                if key is not None:
+                    keys.setdefault(key, []).append(start)
+            buckets: "List[Dict[Any, List[int]]]" = [{} for _ in range(max(1, len(keys) // KEYS_PER_BUCKET))]
+            for key, found in keys.items():
+                buckets[_bucket(key, len(buckets))][key] = found
+            tables[table] = []
+            for bucket in buckets:
+                data = (json.dumps(bucket, separators=(",", ":")) + "\n").encode("utf-8")
+                tables[table].append([offset, len(data)])
+                body.append(data)
+                offset += len(data)
+
+        state = {
+            "version": INDEX_VERSION,
+            "filename": self.filename,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "encoding": self.encoding,
+            "suites": [[name, suiteoffset, start + offset, end + offset]
+                       for (name, suiteoffset), (start, end) in zip(self.suites, suite_rows)],
+            "classnames": self.classnames,
+            "tables": tables,
+            "rows": [offset, size],
+        }
+        handle, tmppath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        with os.fdopen(handle, "wb") as outfile:
+            outfile.write((json.dumps(state, separators=(",", ":")) + "\n").encode("utf-8"))
+            outfile.writelines(body)
+            outfile.writelines(rows)
+        os.replace(tmppath, path)
+
+    def is_current(self) -> bool:
+        """
+        Return True if the report has not changed since it was indexed
+        :return:
+        """
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def find_cases(self, suite: "Optional[str]"=None, classname: "Optional[str]"=None,
+                   name: "Optional[str]"=None, outcome: "Optional[str]"=None) -> "List[CaseEntry]":
+        """
+        Return the cases matching all of the given values
+        :param suite: suite name
+        :param classname:
+        :param name: case name
+        :param outcome: a CaseResult, eg "failed"
+        :return:
+        """
+        keys = {"classes": classname, "names": name, "outcomes": outcome}
+        if self._cases is not None:
+            rows = self._find_loaded(suite, keys)
+        else:
+            rows = self._find_stored(suite, keys)
+        return [CaseEntry(self.suites[suiteindex][0], self.classnames[classindex], casename, caseoutcome, offset)
+                for suiteindex, classindex, casename, caseoutcome, offset in rows]
+
+    def _find_loaded(self, suite: "Optional[str]", keys: "Dict[str, Optional[str]]") -> "List[Tuple[Any, ...]]":
+        """
+        Return the matching case rows of an index held in memory
+        :param suite:
+        :param keys: the value to match for each lookup table, None to match any
+        :return:
+        """
+        cases = self.cases
+        if self._lookup is None:
+            self._lookup = {}
+            for table, column in LOOKUP_TABLES:
+                lookup: "Dict[Any, List[int]]" = {}
+                for position, case in enumerate(cases):
+                    key = self.classnames[case[1]] if table == "classes" else case[column]
+                    lookup.setdefault(key, []).append(position)
+                self._lookup[table] = lookup
+        found: "Optional[List[int]]" = None
+        for table, _ in LOOKUP_TABLES:
+            key = keys[table]
+            if key is None:
+                continue
+            positions = self._lookup[table].get(key, [])
+            found = positions if found is None else sorted(set(found).intersection(positions))
+        if found is None:
+            found = list(range(len(cases)))
+        if suite is not None:
+            found = [position for position in found if self.suites[cases[position][0]][0] == suite]
+        return [cases[position] for position in found]
+
+    def _find_stored(self, suite: "Optional[str]", keys: "Dict[str, Optional[str]]") -> "List[Tuple[Any, ...]]":
+        """
+        Return the matching case rows of an index read from a sidecar, only
+        reading the lookup buckets and rows needed
+        :param suite:
+        :param keys: the value to match for each lookup table, None to match any
+        :return:
+        """
+        assert self._path is not None
+        ranges = [self._rows[0], self._rows[0] + self._rows[1]]
+        if suite is not None:
+            ranges = []
+            for (suitename, _), (start, end) in zip(self.suites, self._suite_rows):
+                if suitename == suite:
+                    ranges += [start, end]
+        with open(self._path, "rb") as infile:
+            found: "Optional[List[int]]" = None
+            for table, _ in LOOKUP_TABLES:
+                key = keys[table]
+                if key is None:
+                    continue
+                buckets = self._tables[table]
+                start, length = buckets[_bucket(key, len(buckets))]
+                infile.seek(self._body + start)
+                bucket = json.loads(infile.read(length).decode("utf-8"))
+                starts = [self._rows[0] + rowstart for rowstart in bucket.get(key, [])]
+                found = starts if found is None else sorted(set(found).intersection(starts))
+
+            rows = []
+            if found is None:
+                for start, end in zip(ranges[::2], ranges[1::2]):
+                    infile.seek(self._body + start)
+                    rows += _parse_rows(infile.read(end - start))
+                return rows
+            for start in found:
+                if any(first <= start < end for first, end in zip(ranges[::2], ranges[1::2])):
+                    infile.seek(self._body + start)
+                    rows.append(tuple(json.loads(infile.readline())))
+            return rows
+
+    def load_suites(self, name: str) -> "List[Suite]":
+        """
+        Parse only the suites called name
+        :param name:
+        :return:
+        """
+        offsets = [offset for suitename, offset in self.suites if suitename == name]
+        suites = []
+        with _open_view(self.filename) as view:
+            for offset in offsets:
+                builder = SuiteBuilder()
+                self._parse_fragment(view, offset, builder, 0)
+                suites.extend(builder.suites)
+        return suites
+
+    def load_cases(self, entries: "Iterable[CaseEntry]") -> "List[Case]":
+        """
+        Parse only the given cases.  Cases from the same suite share a Suite
+        that only has its name set.
+        :param entries: from find_cases()
+        :return:
+        """
+        builders: "Dict[str, SuiteBuilder]" = collections.OrderedDict()
+        cases = []
+        with _open_view(self.filename) as view:
+            for entry in entries:
+                builder = builders.get(entry.suite)
+                if builder is None:
+                    builder = SuiteBuilder()
+                    builder.start("testsuite", {"name": entry.suite})
+                    builders[entry.suite] = builder
+                self._parse_fragment(view, entry.offset, builder, 1)
+                testclass = builder.suite.classes[entry.classname]
+                cases.append(testclass.cases[-1])
+        return cases
+
+    def _parse_fragment(self, view: "Any", offset: int, builder: "SuiteBuilder", depth: int):
+        """
+        Feed the element starting at offset to builder, stopping at its end tag
+        :param view: mmap or file of the report
+        :param offset:
+        :param builder:
+        :param depth: builder depth at which the element ends
+        :return:
+        """
+        parser = expat.ParserCreate(self.encoding)
+        parser.buffer_text = True
+        parser.buffer_size = CHUNK_SIZE
+        parser.StartElementHandler = builder.start
+        parser.CharacterDataHandler = builder.data
+
+        def end(tag: str):
+            builder.end(tag)
+            if builder.finder.depth == depth:
+                raise _FragmentDone()
+
+        parser.EndElementHandler = end
+        try:
+            for chunk in _read_from(view, offset):
+                parser.Parse(chunk, False)
+            parser.Parse(b"", True)
+        except _FragmentDone:
+            return
+        raise ParserError("index does not match {}".format(self.filename))
+
+
+class _FileView(object):
+    """
+    Seek and read access to a file that can't be mapped
+    """
+    def __init__(self, filename: str):
+        self.file = open(filename, "rb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args: "Any"):
+        self.file.close()
+
+    def __getitem__(self, item: slice) -> bytes:
+        self.file.seek(item.start)
+        return self.file.read(item.stop - item.start)
+
+
+def _open_view(filename: str) -> "Any":
+    """
+    Memory map filename, or fall back to seeking and reading it
+    :param filename:
+    :return:
+    """
+    with open(filename, "rb") as infile:
+        try:
+            return mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            pass
+    return _FileView(filename)
+
+
+def _read_from(view: "Any", offset: int) -> "Iterator[bytes]":
+    while True:
+        chunk = view[offset:offset + CHUNK_SIZE]
+        if not chunk:
+            return
+        yield chunk
+        offset += len(chunk)
+
+
+def load_index(filename: str, path: "Optional[str]"=None) -> "ReportIndex":
+    """
+    Return the index of a report, reading the sidecar file if it is up to
+    date and otherwise indexing the report and saving a new sidecar
+    :param filename: uncompressed report file
+    :param path: sidecar file, default is filename + INDEX_SUFFIX
+    :return:
+    """
+    if path is None:
+        path = filename + INDEX_SUFFIX
+    try:
+        index = ReportIndex.read(path)
+        # the sidecar belongs to the report it was saved with, however it is named now
+        index.filename = filename
+        if index.is_current():
+            return index
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    index = ReportIndex.build(filename)
+    index.save(path)
+    return index
@@ -3,54 +3,239 @@ Handle multiple parsed junit reports
 """
 from __future__ import unicode_literals
 
+import collections
+import csv
+import marshal
 import os
+import tempfile
+from io import StringIO
 from typing import TYPE_CHECKING
 
-from . import parser
+from . import cache
 from .case_result import CaseResult
-from .common import ReportContainer
-from .render import HTMLMatrix
+from .common import ReportContainer, map_jobs
+from .render import STYLESHEET_NAME, HTMLMatrix, HTMLMatrixIndex, HTMLMatrixPage, write_stylesheet
 
 UNTESTED = CaseResult.UNTESTED
 PARTIAL_PASS = CaseResult.PARTIAL_PASS
 PARTIAL_FAIL = CaseResult.PARTIAL_FAIL
 TOTAL_FAIL = CaseResult.TOTAL_FAIL
 
+# bump this when the shape of a saved matrix state changes
+MATRIX_STATE_VERSION = 1
+
+# column separators of the table formats of TextReportMatrix.write_summary()
+SUMMARY_DELIMITERS = {"csv": ",", "tsv": "\t"}
+
+# the order of the combined results on the index page of a paginated html matrix
+COMBINED_OUTCOMES = [CaseResult.PASSED, CaseResult.PARTIAL_FAIL, CaseResult.FAILED,
+                     CaseResult.UNTESTED, CaseResult.PARTIAL_PASS, CaseResult.TOTAL_FAIL]
+
+# default number of test cases on each page of a paginated html matrix
+MATRIX_PAGE_ROWS = 1000
+
+# bits of a combined outcome mask, combined_result() only looks at these outcomes
+OUTCOME_BITS = {
+    CaseResult.PASSED: 1,
+    CaseResult.FAILED: 2,
+    CaseResult.SKIPPED: 4,
+    CaseResult.PARTIAL_PASS: 8,
+    CaseResult.TOTAL_FAIL: 16,
+}
+
+
+def outcome_mask(results: "Iterable[CaseResult]") -> int:
+    """
+    Return the combined outcome bits of a list of results
+    :param results:
+    :return:
+    """
+    mask = 0
+    for outcome in results:
+        mask |= OUTCOME_BITS.get(outcome, 0)
+    return mask
+
 
 if TYPE_CHECKING: # pragma: no cover
-    from .parser import Case, Class
-    from typing import Dict, List, Optional, Any, Literal
+    from .parser import Case, Class, Junit
+    from typing import IO, Dict, Iterable, Iterator, List, Optional, Any, Literal, Sequence, Tuple
+
+
+def strip_report(report: "Junit") -> "Junit":
+    """
+    Drop the output, properties and failure/skip text from the cases and
+    suites of a report, keeping the names, outcomes and anchors a matrix needs
+    :param report:
+    :return: report
+    """
+    for suite in report.suites:
+        suite.stdout = None
+        suite.stderr = None
+        suite.properties = []
+        suite.errors = []
+        for case in suite.all():
+            case.stdout = None
+            case.stderr = None
+            case.properties = []
+            if case.failure is not None:
+                case.failure = "failed"
+            if case.skipped:
+                case.skipped = "skipped"
+    return report
+
+
+def write_report_page(outdir: str, axis: str, report: "Junit", show_toc: bool=True, multipage: bool=False):
+    """
+    Write the html page for one matrix axis
+    :param outdir:
+    :param axis:
+    :param report:
+    :param show_toc:
+    :param multipage: write an index page and a page per suite sharing a stylesheet
+    :return:
+    """
+    if multipage:
+        report.write_html_pages(os.path.join(outdir, axis) + ".html", show_toc=show_toc)
+        return
+    if outdir != "" and not os.path.exists(outdir):
+        os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, axis) + ".html", "wb") as filehandle:
+        report.write_html(filehandle, show_toc=show_toc)
+
+
+MatrixPage = collections.namedtuple("MatrixPage", ["number", "count", "filename", "index",
+                                                 "previous", "next", "axes", "classes"])
+"""
+One page of a paginated html matrix.  axes holds the (axis, short name) of
+each report and classes the (classname, anchor, rows) on the page, each row
+being (casename, combined result, cells) with a cell of (outcome, short
+outcome, case anchor) for each axis, or None where the case is missing.
+"""
+
+MatrixClass = collections.namedtuple("MatrixClass", ["name", "href", "total", "counts"])
+"""
+A test class on the index page of a paginated html matrix, with the number
+of its cases for each combined result
+"""
+
+
+def page_filename(index: str, number: int) -> str:
+    """
+    Return the file name of a page of a paginated matrix
+    :param index: file name of the index page
+    :param number: page number, from 1
+    :return:
+    """
+    return "{}-{}.html".format(os.path.splitext(os.path.basename(index))[0], number)
+
+
+def _matrix_page_job(page: "MatrixPage", outdir: str, template: "Optional[Any]",
+                     stylesheet: "Optional[str]") -> str:
+    """
+    Render and write one page of a paginated matrix
+    :param page:
+    :param outdir:
+    :param template:
+    :param stylesheet:
+    :return: the page file name
+    """
+    with open(os.path.join(outdir, page.filename), "wb") as filehandle:
+        HTMLMatrixPage(page, template, stylesheet).write_to(filehandle)
+    return page.filename
+
+
+def file_signature(filename: str) -> "Tuple[int, int]":
+    """
+    Return the size and modification time of a file
+    :param filename:
+    :return:
+    """
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _matrix_job(filename: str, parser_options: "Dict[str, Any]", outdir: "Optional[str]",
+                show_toc: bool, multipage: bool) -> "List[Tuple[str, Any]]":
+    """
+    Parse a report file or archive in a worker process, write the page for
+    each axis if outdir is set, and return the stripped reports flattened by
+    cache.report_state()
+    :param filename:
+    :param parser_options:
+    :param outdir:
+    :param show_toc:
+    :param multipage:
+    :return:
+    """
+    found = []
+    for name, report in ReportContainer(**parser_options).load_reports(filename):
+        axis = os.path.basename(name)
+        if outdir is not None:
+            write_report_page(outdir, axis, report, show_toc, multipage)
+        found.append((axis, cache.report_state(strip_report(report))))
+    return found
 
 
 class ReportMatrix(ReportContainer):
     """
     Load and handle several report files
+
+    casenames maps each class to an insertion ordered dict of its case names
+    (used as an ordered set), and case_masks holds the OUTCOME_BITS seen for
+    each case across all axes, so adding a case and combining its results
+    don't depend on how many cases or axes there are.
+
+    The matrix can be saved with save_state() and loaded again with
+    load_state(), keeping stripped copies of the reports (see
+    strip_report()) and the size and modification time of each source file,
+    so update_reports() only needs to parse new or changed files.
     """
     cases: "Dict[str, Dict[str, Dict[str, Case]]]"
     classes: "Dict[str, Dict[str, Class]]"
-    casenames: "Dict[str, List[str]]"
+    casenames: "Dict[str, Dict[str, None]]"
     result_stats: "Dict[CaseResult, int]"
     case_results: "Dict[str, Dict[str, List[CaseResult]]]"
+    case_masks: "Dict[str, Dict[str, int]]"
+    sources: "Dict[str, Tuple[int, int, List[str]]]"
 
-    def __init__(self):
-        super(ReportMatrix, self).__init__()
+    def __init__(self, jobs: int=1, **parser_options: "Any"):
+        """
+        :param jobs: parse reports given to add_reports() with this many processes
+        :param parser_options: keyword arguments for parserimpl.load_report()
+        """
+        super(ReportMatrix, self).__init__(**parser_options)
+        self.jobs = jobs
+        self.sources = {}
+        self._combined: "Dict[int, Tuple[str, str]]" = {}
+        self._reset_index()
+
+    def _reset_index(self):
         self.cases = {}
         self.classes = {}
         self.casenames = {}
         self.result_stats = {}
         self.case_results = {}
+        self.case_masks = {}
 
-    def add_case_result(self, case: "Case"):
+    def add_case_result(self, case: "Case", outcome: "Optional[CaseResult]"=None):
         if case.testclass is None or case.testclass.name is None:
             testclass = ""
         else:
             testclass = case.testclass.name
         casename = "" if case.name is None else case.name
-        if testclass not in self.case_results:
-            self.case_results[testclass] = {}
-        if casename not in self.case_results[testclass]:
-            self.case_results[testclass][casename] = []
-        self.case_results[testclass][casename].append(case.outcome())
+        if outcome is None:
+            outcome = case.outcome()
+        results = self.case_results.get(testclass)
+        if results is None:
+            results = self.case_results[testclass] = {}
+            self.case_masks[testclass] = {}
+        masks = self.case_masks[testclass]
+        if casename in results:
+            results[casename].append(outcome)
+            masks[casename] |= OUTCOME_BITS.get(outcome, 0)
+        else:
+            results[casename] = [outcome]
+            masks[casename] = OUTCOME_BITS.get(outcome, 0)
 
     def report_order(self):
         return sorted(self.reports.keys())
@@ -73,37 +258,182 @@ class ReportMatrix(ReportContainer):
 
         return "?"
 
-    def add_report(self, filename: str):
+    def add_report(self, filename: str) -> "List[str]":
         """
-        Load a report into the matrix
+        Load a report, or each report in a zip/tar archive, into the matrix
         :param filename:
+        :return: the names of the matrix axes that were added
+        """
+        added = []
+        for name, parsed in self.load_reports(filename):
+            axis = os.path.basename(name)
+            self.add_parsed_report(axis, parsed)
+            added.append(axis)
+        self._add_source(filename, added)
+        return added
+
+    def _add_source(self, filename: str, axes: "List[str]"):
+        if os.path.isfile(filename):
+            size, mtime_ns = file_signature(filename)
+            self.sources[os.path.abspath(filename)] = (size, mtime_ns, axes)
+
+    def add_reports(self, filenames: "Sequence[str]") -> "List[str]":
+        """
+        Load several reports into the matrix.  With more than one job the
+        reports are parsed in worker processes, and only stripped copies
+        (see strip_report()) are kept.
+        :param filenames:
+        :return: the names of the matrix axes that were added
+        """
+        if self.jobs <= 1:
+            return [axis for filename in filenames for axis in self.add_report(filename)]
+        return self._add_reports_parallel(filenames, None, True)
+
+    def _add_reports_parallel(self, filenames: "Sequence[str]", outdir: "Optional[str]",
+                              show_toc: bool, multipage: bool=False) -> "List[str]":
+        added = []
+        jobs = map_jobs(_matrix_job, filenames, self.jobs, self.parser_options, outdir, show_toc, multipage)
+        for filename, results in zip(filenames, jobs):
+            axes = []
+            for axis, state in results:
+                self.add_parsed_report(axis, cache.report_from_state(state))
+                axes.append(axis)
+            self._add_source(filename, axes)
+            added.extend(axes)
+        return added
+
+    def remove_reports(self, axes: "Iterable[str]"):
+        """
+        Remove axes from the matrix, rebuilding the indexes from the remaining reports
+        :param axes:
+        :return:
+        """
+        removed = set(axes)
+        remaining = [(axis, report) for axis, report in self.reports.items() if axis not in removed]
+        self.reports = {}
+        self._reset_index()
+        for axis, report in remaining:
+            self.add_parsed_report(axis, report)
+        for source, (size, mtime_ns, sourceaxes) in list(self.sources.items()):
+            sourceaxes = [axis for axis in sourceaxes if axis not in removed]
+            if sourceaxes:
+                self.sources[source] = (size, mtime_ns, sourceaxes)
+            else:
+                del self.sources[source]
+
+    def remove_report(self, axis: str):
+        """
+        Remove one axis from the matrix
+        :param axis:
+        :return:
+        """
+        self.remove_reports([axis])
+
+    def is_current(self, filename: str) -> bool:
+        """
+        Return True if the matrix holds the axes of filename and the file has not changed since
+        :param filename:
+        :return:
+        """
+        source = self.sources.get(os.path.abspath(filename))
+        if source is None or not os.path.isfile(filename):
+            return False
+        return file_signature(filename) == tuple(source[:2])
+
+    def update_reports(self, filenames: "Sequence[str]", **options: "Any") -> "List[str]":
+        """
+        Make the matrix hold the reports from exactly these files, keeping the
+        axes of unchanged files, removing all the others and adding new or
+        changed files with add_reports()
+        :param filenames:
+        :param options: keyword arguments for add_reports()
+        :return: the names of the matrix axes that were added
+        """
+        keep = set()
+        changed = []
+        for filename in filenames:
+            if self.is_current(filename):
+                keep.update(self.sources[os.path.abspath(filename)][2])
+            else:
+                changed.append(filename)
+        stale = [axis for axis in self.reports if axis not in keep]
+        if stale:
+            self.remove_reports(stale)
+        return self.add_reports(changed, **options)
+
+    def save_state(self, filename: str):
+        """
+        Save stripped copies of the reports and their source files so the
+        matrix can be loaded again by load_state()
+        :param filename:
+        :return:
+        """
+        reports = []
+        for axis, report in self.reports.items():
+            # copy the report before stripping it
+            stripped = strip_report(cache.report_from_state(cache.report_state(report)))
+            reports.append((axis, cache.report_state(stripped)))
+        sources = [(source, size, mtime_ns, axes) for source, (size, mtime_ns, axes) in self.sources.items()]
+        state = (MATRIX_STATE_VERSION, reports, sources)
+        folder = os.path.dirname(os.path.abspath(filename))
+        handle, tmppath = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as outfile:
+                marshal.dump(state, outfile)
+            os.replace(tmppath, filename)
+        except BaseException:
+            os.unlink(tmppath)
+            raise
+
+    def load_state(self, filename: str):
+        """
+        Replace the content of the matrix with a state saved by save_state()
+        :param filename:
+        :return:
+        """
+        try:
+            with open(filename, "rb") as infile:
+                version, reports, sources = marshal.loads(infile.read())
+            if version != MATRIX_STATE_VERSION:
+                raise ValueError("unsupported matrix state version {}".format(version))
+            loaded = [(axis, cache.report_from_state(state)) for axis, state in reports]
+        except (EOFError, TypeError, ValueError) as err:
+            raise ValueError("can't load matrix state from {}: {}".format(filename, err)) from err
+        self.reports = {}
+        self._reset_index()
+        for axis, report in loaded:
+            self.add_parsed_report(axis, report)
+        self.sources = {source: (size, mtime_ns, list(axes)) for source, size, mtime_ns, axes in sources}
+
+    def add_parsed_report(self, filename: str, parsed: "Junit"):
+        """
+        Add a parsed report to the matrix as a new axis
+        :param filename: axis name
+        :param parsed:
         :return:
         """
-        parsed = parser.Junit(filename=filename)
-        filename = os.path.basename(filename)
         self.reports[filename] = parsed
 
         for suite in parsed.suites:
             for testclass in suite.classes:
                 if testclass not in self.classes:
                     self.classes[testclass] = {}
-                if testclass not in self.casenames:
-                    self.casenames[testclass] = list()
+                    self.casenames[testclass] = {}
+                    self.cases[testclass] = {}
                 self.classes[testclass][filename] = suite.classes[testclass]
+                casenames = self.casenames[testclass]
+                classcases = self.cases[testclass]
 
                 for testcase in self.classes[testclass][filename].cases:
                     name = "" if testcase.name is None else testcase.name.strip()
-                    if name not in self.casenames[testclass]:
-                        self.casenames[testclass].append(name)
-
-                    if testclass not in self.cases:
-                        self.cases[testclass] = {}
-                    if name not in self.cases[testclass]:
-                        self.cases[testclass][name] = {}
-                    self.cases[testclass][name][filename] = testcase
+                    axes = classcases.get(name)
+                    if axes is None:
+                        casenames[name] = None
+                        axes = classcases[name] = {}
+                    axes[filename] = testcase
 
                     outcome = testcase.outcome()
-                    self.add_case_result(testcase)
+                    self.add_case_result(testcase, outcome)
 
                     self.result_stats[outcome] = 1 + self.result_stats.get(
                         outcome, 0)
@@ -122,10 +452,9 @@ class ReportMatrix(ReportContainer):
         :param casename:
         :return:
         """
-        if classname in self.case_results:
-            if casename in self.case_results[classname]:
-                results = self.case_results[classname][casename]
-                return self.combined_result(results)
+        masks = self.case_masks.get(classname)
+        if masks is not None and casename in masks:
+            return self.combined_result_mask(masks[casename])
 
         return " ", ""
 
@@ -135,20 +464,33 @@ class ReportMatrix(ReportContainer):
         :param results:
         :return:
         """
-        if results:
-            if CaseResult.PASSED in results:
-                if CaseResult.FAILED in results:
-                    return self.short_outcome(CaseResult.PARTIAL_FAIL), CaseResult.PARTIAL_FAIL.title()
-                return self.short_outcome(CaseResult.PASSED), CaseResult.PASSED.title()
-
-            if CaseResult.FAILED in results:
-                return self.short_outcome(CaseResult.FAILED), CaseResult.FAILED.title()
-            if CaseResult.SKIPPED in results:
-                return self.short_outcome(CaseResult.UNTESTED), CaseResult.UNTESTED.title()
-            if CaseResult.PARTIAL_PASS in results:
-                return self.short_outcome(CaseResult.PARTIAL_PASS), CaseResult.PARTIAL_PASS.title()
-            if CaseResult.TOTAL_FAIL in results:
-                return self.short_outcome(CaseResult.TOTAL_FAIL), CaseResult.TOTAL_FAIL.title()
+        return self.combined_result_mask(outcome_mask(results))
+
+    def combined_result_mask(self, mask: int) -> "Tuple[str, str]":
+        """
+        Given the OUTCOME_BITS of some results, produce a "combined" overall result
+        :param mask:
+        :return:
+        """
+        combined = self._combined.get(mask)
+        if combined is None:
+            combined = self._combined[mask] = self._combine_mask(mask)
+        return combined
+
+    def _combine_mask(self, mask: int) -> "Tuple[str, str]":
+        if mask & OUTCOME_BITS[CaseResult.PASSED]:
+            if mask & OUTCOME_BITS[CaseResult.FAILED]:
+                return self.short_outcome(CaseResult.PARTIAL_FAIL), CaseResult.PARTIAL_FAIL.title()
+            return self.short_outcome(CaseResult.PASSED), CaseResult.PASSED.title()
+
+        if mask & OUTCOME_BITS[CaseResult.FAILED]:
+            return self.short_outcome(CaseResult.FAILED), CaseResult.FAILED.title()
+        if mask & OUTCOME_BITS[CaseResult.SKIPPED]:
+            return self.short_outcome(CaseResult.UNTESTED), CaseResult.UNTESTED.title()
+        if mask & OUTCOME_BITS[CaseResult.PARTIAL_PASS]:
+            return self.short_outcome(CaseResult.PARTIAL_PASS), CaseResult.PARTIAL_PASS.title()
+        if mask & OUTCOME_BITS[CaseResult.TOTAL_FAIL]:
+            return self.short_outcome(CaseResult.TOTAL_FAIL), CaseResult.TOTAL_FAIL.title()
         return " ", ""
 
 
@@ -158,24 +500,61 @@ class HtmlReportMatrix(ReportMatrix):
     """
 
     outdir: str
+    multipage: bool
 
-    def __init__(self, outdir: str):
-        super(HtmlReportMatrix, self).__init__()
+    def __init__(self, outdir: str, jobs: int=1, multipage: bool=False, **parser_options: "Any"):
+        """
+        :param outdir: folder for the page of each axis
+        :param jobs:
+        :param multipage: write the page of each axis as an index and a page per suite, and
+            have all the pages link to one stylesheet in outdir instead of including the styles
+        :param parser_options:
+        """
+        super(HtmlReportMatrix, self).__init__(jobs=jobs, **parser_options)
         self.outdir = outdir
+        self.multipage = multipage
 
-    def add_report(self, filename: str, show_toc: bool=True):
+    def stylesheet(self) -> "Optional[str]":
         """
-        Load a report
+        Write the shared stylesheet if pages link to it, and return its name
+        :return:
         """
-        super(HtmlReportMatrix, self).add_report(filename)
-        basename = os.path.basename(filename)
-        # make the individual report too
-        report = self.reports[basename].html(show_toc=show_toc)
+        if not self.multipage:
+            return None
         if self.outdir != "" and not os.path.exists(self.outdir):
-            os.makedirs(self.outdir)
-        with open(
-                os.path.join(self.outdir, basename) + ".html", "wb") as filehandle:
-            filehandle.write(report.encode("utf-8"))
+            os.makedirs(self.outdir, exist_ok=True)
+        write_stylesheet(self.outdir)
+        return STYLESHEET_NAME
+
+    def add_report(self, filename: str, show_toc: bool=True) -> "List[str]":
+        """
+        Load a report
+        """
+        added = super(HtmlReportMatrix, self).add_report(filename)
+        for basename in added:
+            # make the individual report too
+            write_report_page(self.outdir, basename, self.reports[basename], show_toc, self.multipage)
+        return added
+
+    def add_reports(self, filenames: "Sequence[str]", show_toc: bool=True) -> "List[str]":
+        """
+        Load several reports and write their pages, in worker processes if
+        there is more than one job
+        """
+        if self.jobs <= 1:
+            return [axis for filename in filenames for axis in self.add_report(filename, show_toc)]
+        return self._add_reports_parallel(filenames, self.outdir, show_toc, self.multipage)
+
+    def is_current(self, filename: str) -> bool:
+        """
+        Return True if filename is unchanged and the pages for its axes are still there
+        :param filename:
+        :return:
+        """
+        if not super(HtmlReportMatrix, self).is_current(filename):
+            return False
+        axes = self.sources[os.path.abspath(filename)][2]
+        return all(os.path.exists(os.path.join(self.outdir, axis) + ".html") for axis in axes)
 
     def short_outcome(self, outcome: CaseResult) -> "Literal['ok', '/', 's', 'f', 'F', '%', 'X', 'U', '?']":
         if outcome == CaseResult.PASSED:
@@ -192,10 +571,116 @@ class HtmlReportMatrix(ReportMatrix):
         Render the html
         :return:
         """
-        html_matrix = HTMLMatrix(self, template)
+        html_matrix = HTMLMatrix(self, template, self.stylesheet())
 
         return str(html_matrix)
 
+    def write_html(self, stream: "IO[bytes]", template: "Optional[Any]"=None):
+        """
+        Render the html into a binary stream as utf-8
+        :param stream:
+        :param template:
+        :return:
+        """
+        HTMLMatrix(self, template, self.stylesheet()).write_to(stream)
+
+    def _matrix_rows(self, classname: str, axes: "List[str]") -> "List[Tuple[str, str, List[Any]]]":
+        """
+        Return the (casename, combined result, cells) rows of a class for a MatrixPage
+        :param classname:
+        :param axes:
+        :return:
+        """
+        classcases = self.cases[classname]
+        rows = []
+        for casename in self.casenames[classname]:
+            axiscases = classcases[casename]
+            cells: "List[Optional[Tuple[str, str, str]]]" = []
+            for axis in axes:
+                testcase = axiscases.get(axis)
+                if testcase is None:
+                    cells.append(None)
+                else:
+                    outcome = testcase.outcome()
+                    cells.append((outcome.value, self.short_outcome(outcome), testcase.anchor()))
+            rows.append((casename, self.combined_result_list(classname, casename)[1], cells))
+        return rows
+
+    def matrix_pages(self, filename: str, page_rows: "Optional[int]"=MATRIX_PAGE_ROWS
+                     ) -> "Tuple[List[MatrixPage], List[MatrixClass], List[str]]":
+        """
+        Split the matrix into pages.  Whole classes are put on a page until it
+        holds page_rows cases, and classes with more cases are split over
+        several pages of their own.
+        :param filename: file name of the index page
+        :param page_rows: cases on each page, None for one page per class
+        :return: the pages, the index entry of each class and the combined results counted
+        """
+        axes = self.report_order()
+        groups: "List[List[Tuple[str, str, List[Any]]]]" = []
+        classes = []
+        counted: "Dict[str, None]" = {}
+        current: "List[Tuple[str, str, List[Any]]]" = []
+        current_rows = 0
+        for classnumber, classname in enumerate(self.classes):
+            rows = self._matrix_rows(classname, axes)
+            anchor = "c{}".format(classnumber)
+            counts: "Dict[str, int]" = {}
+            for row in rows:
+                counts[row[1]] = counts.get(row[1], 0) + 1
+                counted[row[1]] = None
+
+            if current and (not page_rows or current_rows + len(rows) > page_rows):
+                groups.append(current)
+                current = []
+                current_rows = 0
+            href = "{}#{}".format(page_filename(filename, len(groups) + 1), anchor)
+            classes.append(MatrixClass(classname, href, len(rows), counts))
+            if page_rows and len(rows) > page_rows:
+                for start in range(0, len(rows), page_rows):
+                    groups.append([(classname, anchor if start == 0 else "", rows[start:start + page_rows])])
+                continue
+            current.append((classname, anchor, rows))
+            current_rows += len(rows)
+        if current:
+            groups.append(current)
+
+        axisnames = [(axis, self.short_axis(axis)) for axis in axes]
+        pages = []
+        for number, group in enumerate(groups, 1):
+            pages.append(MatrixPage(
+                number, len(groups), page_filename(filename, number), os.path.basename(filename),
+                page_filename(filename, number - 1) if number > 1 else None,
+                page_filename(filename, number + 1) if number < len(groups) else None,
+                axisnames, group))
+        outcomes = [outcome.title() for outcome in COMBINED_OUTCOMES if outcome.title() in counted]
+        outcomes.extend(outcome for outcome in counted if outcome not in outcomes)
+        return pages, classes, outcomes
+
+    def write_pages(self, filename: str, template: "Optional[Any]"=None,
+                    page_rows: "Optional[int]"=MATRIX_PAGE_ROWS) -> "List[str]":
+        """
+        Write the matrix as an index page listing the number of cases of each
+        class by combined result, and pages of at most page_rows cases next to
+        it, rendering the pages in worker processes if there is more than one job
+        :param filename: the index page
+        :param template:
+        :param page_rows: cases on each page, None for one page per class
+        :return: the file names of the pages
+        """
+        outdir = os.path.dirname(filename)
+        if outdir != "" and not os.path.exists(outdir):
+            os.makedirs(outdir, exist_ok=True)
+        pages, classes, outcomes = self.matrix_pages(filename, page_rows)
+        stylesheet = None
+        if self.multipage:
+            write_stylesheet(outdir)
+            stylesheet = STYLESHEET_NAME
+        written = list(map_jobs(_matrix_page_job, pages, self.jobs, outdir, template, stylesheet))
+        with open(filename, "wb") as filehandle:
+            HTMLMatrixIndex(self, pages, classes, outcomes, template, stylesheet).write_to(filehandle)
+        return written
+
 
 class TextReportMatrix(ReportMatrix):
     """
@@ -207,74 +692,92 @@ class TextReportMatrix(ReportMatrix):
         Render as a string
         :return:
         """
+        buf = StringIO()
+        self.write_summary(buf)
+        return buf.getvalue()
 
-        output = "\nMatrix Test Report\n"
-        output += "===================\n"
-
-        axis = list(self.reports.keys())
-        axis.sort()
-
-        # find the longest classname or test case name
-        left_indent = 0
-        for classname in self.classes:
-            left_indent = max(len(classname), left_indent)
-            for casename in self.casenames[classname]:
-                left_indent = max(len(casename), left_indent)
-
-        # render the axis headings in a stepped tree
-        treelines = ""
-        for filename in self.report_order():
-            output += "{}    {}{}\n".format(" " * left_indent, treelines,
-                                            filename)
-            treelines += "| "
-        output += "{}    {}\n".format(" " * left_indent, treelines)
-        # render in groups of the same class
-
+    def _case_rows(self, axes: "List[str]") -> "Iterator[Tuple[str, str, List[str], Tuple[str, str]]]":
+        """
+        Yield the class name, case name, per axis outcome and combined result of each row
+        :param axes: the sorted axis names
+        :return:
+        """
         for classname in self.classes:
-            # new class
-            output += "{}  \n".format(classname)
-
-            # print the case name
-            for casename in sorted(set(self.casenames[classname])):
-                output += "- {}{}  ".format(casename,
-                                            " " * (left_indent - len(casename)))
-
-                # print each test and its result for each axis
-                case_data = ""
+            classcases = self.cases[classname]
+            masks = self.case_masks[classname]
+            for casename in sorted(self.casenames[classname]):
+                axiscases = classcases[casename]
+                outcomes = []
                 testcase: "Optional[Case]" = None
-                for axis in self.report_order():
-                    if axis not in self.cases[classname][casename]:
-                        case_data += "  "
+                for axis in axes:
+                    testcase_on_axis = axiscases.get(axis)
+                    if testcase_on_axis is None:
+                        outcomes.append("")
                     else:
-                        testcase = self.cases[classname][casename][axis]
+                        testcase = testcase_on_axis
                         if testcase.skipped:
-                            case_data += "s "
+                            outcomes.append("s")
                         elif testcase.failure:
-                            case_data += "f "
+                            outcomes.append("f")
                         else:
-                            case_data += "/ "
+                            outcomes.append("/")
 
                 if testcase is None or testcase.name is None:
                     testcase_name = ""
                 else:
                     testcase_name = testcase.name
-                combined, combined_name = self.combined_result(
-                    self.case_results[classname][testcase_name])
+                yield classname, casename, outcomes, self.combined_result_mask(masks[testcase_name])
 
-                output += case_data
-                output += " {} {}\n".format(combined, combined_name)
+    def write_summary(self, stream: "IO[str]", fmt: str="text"):
+        """
+        Write the matrix to a text stream row by row
+        :param stream:
+        :param fmt: "text" for the summary() layout, "csv" or "tsv" for a table
+            of class, case, one column per axis and the combined result
+        :return:
+        """
+        axes = self.report_order()
+        if fmt in SUMMARY_DELIMITERS:
+            writer = csv.writer(stream, delimiter=SUMMARY_DELIMITERS[fmt], lineterminator="\n")
+            writer.writerow(["class", "case"] + axes + ["combined"])
+            for classname, casename, outcomes, combined in self._case_rows(axes):
+                writer.writerow([classname, casename] + outcomes + [combined[1]])
+            return
+        if fmt != "text":
+            raise ValueError("unknown summary format {}".format(fmt))
+
+        write = stream.write
+        write("\nMatrix Test Report\n")
+        write("===================\n")
 
-        # print the result stats
+        # find the longest classname or test case name
+        left_indent = 0
+        for classname in self.classes:
+            left_indent = max(len(classname), left_indent)
+            for casename in self.casenames[classname]:
+                left_indent = max(len(casename), left_indent)
 
-        output += "\n"
-        output += "-" * 79
-        output += "\n"
+        # render the axis headings in a stepped tree
+        treelines = ""
+        for filename in axes:
+            write("{}    {}{}\n".format(" " * left_indent, treelines, filename))
+            treelines += "| "
+        write("{}    {}\n".format(" " * left_indent, treelines))
 
-        output += "Test Results:\n"
+        # render in groups of the same class
+        lastclass = None
+        for classname, casename, outcomes, combined in self._case_rows(axes):
+            if classname != lastclass:
+                write("{}  \n".format(classname))
+                lastclass = classname
+            case_data = "".join((outcome or " ") + " " for outcome in outcomes)
+            write("- {}{}  {} {} {}\n".format(casename, " " * (left_indent - len(casename)),
+                                              case_data, combined[0], combined[1]))
 
+        # print the result stats
+        write("\n")
+        write("-" * 79)
+        write("\n")
+        write("Test Results:\n")
         for outcome in sorted(self.result_stats):
-            output += "  {:<12} : {:>6}\n".format(
-                outcome.title(),
-                self.result_stats[outcome])
-
-        return output
+            write("  {:<12} : {:>6}\n".format(outcome.title(), self.result_stats[outcome]))
@@ -5,58 +5,128 @@ from __future__ import unicode_literals
 
 from typing import TYPE_CHECKING
 
+import json
 import os
+import tempfile
 import xml.etree.ElementTree as ET
-from io import BytesIO
+from io import StringIO
 
-from . import parser
-from .common import ReportContainer
+from . import parser, sources
+from .cache import file_digest
+from .common import ReportContainer, load_reports_parallel
 from .textutils import unicode_str
 
 if TYPE_CHECKING:
-    from typing import List
+    from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Set
+
+XML_HEADER = u'<?xml version="1.0" encoding="utf-8"?>' + u"\n"
+
+# room left in the <testsuites> start tag for the final duration
+DURATION_WIDTH = 64
+
+MERGE_STATE_VERSION = 1
+
+MERGE_STATE_SUFFIX = ".j2hmerge"
 
 
 def has_xml_header(filepath: str):
     """
-    Return True if the first line of the file is <?xml
+    Return True if the file starts like a junit xml report, or is an archive that may hold some
     :param filepath:
     :return:
     """
-    return True
+    return sources.sniff_report(filepath)
+
+
+def iter_folder_reports(folder: str) -> "Iterator[str]":
+    """
+    Yield the files in a folder and its subfolders that could be reports, in sorted order
+    :param folder:
+    :return:
+    """
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for filename in sorted(files):
+            filepath = os.path.join(root, filename)
+            if has_xml_header(filepath):
+                yield filepath
+
+
+def unique_files(filenames: "Iterable[str]", seen: "Set[str]",
+                 sizes: "Optional[Dict[int, Optional[str]]]"=None) -> "List[str]":
+    """
+    Return the files whose content hash is not already in seen, adding the new hashes to seen.
+    Given sizes, files are only hashed once another file has the same size.
+    :param filenames:
+    :param seen:
+    :param sizes: file sizes seen so far, with the file of that size that has not been hashed yet
+    :return:
+    """
+    found = []
+    for filename in filenames:
+        if sizes is not None:
+            size = os.path.getsize(filename)
+            if size not in sizes:
+                # no file so far could be a copy of this one
+                sizes[size] = filename
+                found.append(filename)
+                continue
+            first = sizes[size]
+            if first is not None:
+                seen.add(file_digest(first))
+                sizes[size] = None
+        digest = file_digest(filename)
+        if digest not in seen:
+            seen.add(digest)
+            found.append(filename)
+    return found
 
 
 class Merger(ReportContainer, parser.ToJunitXmlBase):
     """
     Utility class to create a merged junix xml report
+
+    Files found in folders with the same content as a file already found are skipped.
     """
     suites: "List[parser.Suite]"
+    jobs: int
 
-    def __init__(self):
-        super(Merger, self).__init__()
+    def __init__(self, jobs: int=1, **parser_options: "Any"):
+        """
+        :param jobs: parse the reports in a folder with this many processes
+        :param parser_options: keyword arguments for parserimpl.load_report()
+        """
+        super(Merger, self).__init__(**parser_options)
         self.suites = []
+        self.jobs = jobs
+        self.digests: "Set[str]" = set()
+        self.sizes: "Dict[int, Optional[str]]" = {}
 
     def add_report(self, filename: str):
         """
-        Load a test report or folder
+        Load a test report, zip/tar archive of reports, or folder
         :param filename:
         :return:
         """
         if os.path.isfile(filename):
-            report = parser.Junit(filename)
-            self.reports[filename] = report
-            for suite in report.suites:
-                self.suites.append(suite)
+            for name, report in self.load_reports(filename):
+                self.add_parsed_report(name, report)
         elif os.path.isdir(filename):
-            # try importing all files in this folder
-            for root, dirs, files in os.walk(filename):
-                for filename in files:
-                    filepath = os.path.join(root, filename)
-                    if has_xml_header(filepath):
-                        try:
-                            self.add_report(filepath)
-                        except (parser.ParserError, ET.ParseError):
-                            pass
+            # try importing all the reports in this folder
+            filenames = unique_files(iter_folder_reports(filename), self.digests, self.sizes)
+            for name, report in load_reports_parallel(filenames, self.jobs, self.parser_options):
+                self.add_parsed_report(name, report)
+
+    def add_parsed_report(self, name: str, report: "parser.Junit"):
+        """
+        Add the suites of a report that has already been parsed
+        :param name:
+        :param report:
+        :return:
+        """
+        self.reports[name] = report
+        for suite in report.suites:
+            self.suites.append(suite)
 
     def add_suite(self, suite: "parser.Suite"):
         """
@@ -73,8 +143,7 @@ class Merger(ReportContainer, parser.ToJunitXmlBase):
         """
         total = 0
         for suite in self.suites:
-            for testcase in suite.all():
-                total += testcase.duration
+            total += suite.cases_duration()
         return total
 
     def tojunit(self):
@@ -88,12 +157,283 @@ class Merger(ReportContainer, parser.ToJunitXmlBase):
             root.append(suite.tojunit())
         return root
 
+    def write_junit(self, stream: "IO[str]"):
+        """
+        Write the merged report to a text stream
+        :param stream:
+        :return:
+        """
+        stream.write(u'<testsuites duration="{}"'.format(unicode_str(self.calculate_duration())))
+        if not self.suites:
+            stream.write(" />")
+            return
+        stream.write(">")
+        for suite in self.suites:
+            suite.write_junit(stream)
+        stream.write("</testsuites>")
+
+    def write_xmlfile(self, filename: str):
+        """
+        Write the xml document to a file, with non-ascii characters as character references
+        :param filename:
+        :return:
+        """
+        with open(filename, "w", encoding="us-ascii", errors="xmlcharrefreplace") as outfile:
+            outfile.write(XML_HEADER)
+            self.write_junit(outfile)
+
     def toxmlstring(self):
         """
         Render the xml document as a string
         :return:
         """
-        tree = ET.ElementTree(self.tojunit())
-        buf = BytesIO()
-        tree.write(buf)
-        return u'<?xml version="1.0" encoding="utf-8"?>' + u"\n" + unicode_str(buf.getvalue())
+        buf = StringIO()
+        self.write_junit(buf)
+        return XML_HEADER + buf.getvalue().encode("us-ascii", "xmlcharrefreplace").decode("us-ascii")
+
+
+class StreamingMerger(ReportContainer):
+    """
+    Merge reports straight into a seekable binary output file, one suite at a
+    time.  Each suite is written as soon as it has been parsed and then
+    dropped, so memory use does not grow with the number of inputs.  The
+    total duration is filled in to the <testsuites> tag by finish(), space
+    is left for it in the tag so the output has whitespace before the ">"
+    that Merger does not write.
+
+    Parsed reports are not kept, so there are no cases to return from
+    failures() and skips(), failure_count() and skip_count() count the cases
+    as they are copied.
+    """
+    outfile: "IO[bytes]"
+    duration: float
+    failed: int
+    skipped: int
+    # skip report files given to add_report() that have the same content as one already added
+    skip_copies: bool = False
+
+    def __init__(self, outfile: "IO[bytes]", **parser_options: "Any"):
+        """
+        :param outfile: seekable binary file to write the merged report to
+        :param parser_options: as for Merger, only the parser backend is used
+        """
+        super(StreamingMerger, self).__init__(**parser_options)
+        self.digests: "Set[str]" = set()
+        self.sizes: "Dict[int, Optional[str]]" = {}
+        self.outfile = outfile
+        self.duration = 0
+        self.duration_offset = None
+        self.failed = 0
+        self.skipped = 0
+
+    def start(self):
+        """
+        Write the xml header and the <testsuites> start tag
+        :return:
+        """
+        self.outfile.write(XML_HEADER.encode("utf-8"))
+        self.duration_offset = self.outfile.tell()
+        self.outfile.write(self._testsuites_tag())
+
+    def _testsuites_tag(self) -> bytes:
+        attrib = u'<testsuites duration="{}"'.format(unicode_str(self.duration))
+        if len(attrib) > DURATION_WIDTH:
+            raise ValueError("duration is too long to write")
+        return (attrib.ljust(DURATION_WIDTH) + u">").encode("us-ascii")
+
+    def iter_report_suites(self, fileobj: "IO[bytes]") -> "Iterator[parser.Suite]":
+        """
+        Incrementally parse the suites from one report
+        :param fileobj:
+        :return:
+        """
+        backend = parser.select_backend(self.parser_options.get("backend"), streaming=True)
+        return parser.BACKENDS[backend](fileobj)
+
+    def add_report(self, filename: str):
+        """
+        Copy the suites from a test report, zip/tar archive of reports, or folder
+        to the output.  Reports in archives or folders that can't be parsed
+        are left out.
+        :param filename:
+        :return:
+        """
+        if self.duration_offset is None:
+            self.start()
+        if os.path.isfile(filename):
+            if not self.skip_copies or unique_files([filename], self.digests):
+                self._copy_file(filename)
+        elif os.path.isdir(filename):
+            # an incremental merge keeps the hash of every input, others only hash possible copies
+            sizes = None if self.skip_copies else self.sizes
+            for filepath in unique_files(iter_folder_reports(filename), self.digests, sizes):
+                try:
+                    self._copy_file(filepath)
+                except (parser.ParserError, ET.ParseError):
+                    pass
+
+    def _copy_file(self, filename: str):
+        """
+        Write the suites of a report file or of each report in an archive
+        :param filename:
+        :return:
+        """
+        if not sources.is_archive(filename):
+            with sources.open_report(filename) as infile:
+                self._copy_report(infile)
+            return
+        for member, stream in sources.iter_archive(filename):
+            try:
+                self._copy_report(stream)
+            except (parser.ParserError, ET.ParseError):
+                pass
+
+    def _copy_report(self, fileobj: "IO[bytes]"):
+        """
+        Write the suites of one report, removing them again if it turns out not to be valid
+        :param fileobj:
+        :return:
+        """
+        position = self.outfile.tell()
+        counts = self.duration, self.failed, self.skipped
+        try:
+            for suite in self.iter_report_suites(fileobj):
+                self.add_suite(suite)
+        except BaseException:
+            self.outfile.seek(position)
+            self.outfile.truncate()
+            self.duration, self.failed, self.skipped = counts
+            raise
+
+    def add_suite(self, suite: "parser.Suite"):
+        """
+        Write a suite to the output
+        :param suite:
+        :return:
+        """
+        if self.duration_offset is None:
+            self.start()
+        buf = StringIO()
+        suite.write_junit(buf)
+        self.outfile.write(buf.getvalue().encode("us-ascii", "xmlcharrefreplace"))
+        self.duration += suite.cases_duration()
+        self.failed += len(suite.failed())
+        self.skipped += len(suite.skipped())
+
+    def failures(self):
+        raise NotImplementedError("StreamingMerger does not keep the cases, use failure_count()")
+
+    def skips(self):
+        raise NotImplementedError("StreamingMerger does not keep the cases, use skip_count()")
+
+    def failure_count(self) -> int:
+        return self.failed
+
+    def skip_count(self) -> int:
+        return self.skipped
+
+    def finish(self):
+        """
+        Close the <testsuites> tag and fill in the total duration
+        :return:
+        """
+        if self.duration_offset is None:
+            self.start()
+        self.outfile.write(b"</testsuites>")
+        end = self.outfile.tell()
+        self.outfile.seek(self.duration_offset)
+        self.outfile.write(self._testsuites_tag())
+        self.outfile.seek(end)
+
+
+class IncrementalMerger(StreamingMerger):
+    """
+    Append suites to a merged report written by an earlier IncrementalMerger.
+
+    A small json sidecar next to the merged file holds the running duration,
+    where the </testsuites> trailer starts and the content hashes of the
+    inputs merged so far, so each update only reads the new inputs and
+    rewrites the fixed size <testsuites> tag and trailer.  Inputs that have
+    already been merged are skipped.  If an update is interrupted, the next
+    one drops whatever was written after the last complete update.  A new
+    merged report is written to a temporary file that only replaces filename,
+    after the sidecar has been saved, when finish() is called, so an
+    interrupted first merge leaves nothing behind to block the next one.
+    """
+    filename: str
+    sidecar: str
+    skip_copies = True
+
+    def __init__(self, filename: str, **parser_options: "Any"):
+        """
+        :param filename: merged report, created if it does not exist
+        :param parser_options: as for Merger, only the parser backend is used
+        """
+        self.filename = filename
+        self.sidecar = filename + MERGE_STATE_SUFFIX
+        self.tmpname: "Optional[str]" = None
+        if not os.path.exists(filename):
+            handle, self.tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                                    prefix=os.path.basename(filename) + ".", suffix=".tmp")
+            super(IncrementalMerger, self).__init__(os.fdopen(handle, "w+b"), **parser_options)
+            self.start()
+            return
+
+        try:
+            with open(self.sidecar, "r", encoding="utf-8") as infile:
+                state = json.load(infile)
+        except (OSError, ValueError) as err:
+            raise ValueError("{} was not written by an incremental merge".format(filename)) from err
+        if state.get("version") != MERGE_STATE_VERSION or os.path.getsize(filename) < state["trailer_offset"]:
+            raise ValueError("{} does not match {}".format(filename, self.sidecar))
+
+        super(IncrementalMerger, self).__init__(open(filename, "r+b"), **parser_options)
+        self.duration = state["duration"]
+        self.duration_offset = state["duration_offset"]
+        self.failed = state.get("failed", 0)
+        self.skipped = state.get("skipped", 0)
+        self.digests.update(state["inputs"])
+        self.trailer_offset = state["trailer_offset"]
+        self.outfile.seek(self.trailer_offset)
+        self.outfile.truncate()
+
+    def finish(self):
+        """
+        Close the <testsuites> tag, fill in the total duration and save the sidecar
+        :return:
+        """
+        trailer_offset = self.outfile.tell()
+        super(IncrementalMerger, self).finish()
+        self.outfile.close()
+        state = {
+            "version": MERGE_STATE_VERSION,
+            "duration": self.duration,
+            "duration_offset": self.duration_offset,
+            "trailer_offset": trailer_offset,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "inputs": sorted(self.digests),
+        }
+        handle, tmppath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.sidecar)), suffix=".tmp")
+        with os.fdopen(handle, "w", encoding="utf-8") as outfile:
+            json.dump(state, outfile, separators=(",", ":"))
+        os.replace(tmppath, self.sidecar)
+        if self.tmpname is not None:
+            os.replace(self.tmpname, self.filename)
+            self.tmpname = None
+
+    def abandon(self):
+        """
+        Stop without saving this update, removing a new merged report or
+        putting back the merged report as it was
+        :return:
+        """
+        if self.tmpname is not None:
+            self.outfile.close()
+            os.remove(self.tmpname)
+            self.tmpname = None
+            return
+        self.outfile.seek(self.trailer_offset)
+        self.outfile.truncate()
+        self.outfile.write(b"</testsuites>")
+        self.outfile.close()
@@ -6,17 +6,23 @@ from __future__ import unicode_literals
 from typing import TYPE_CHECKING
 
 import os
+import re
 import sys
 import xml.etree.ElementTree as ET
+from xml.parsers import expat
 import collections
-import uuid
+import itertools
+from io import StringIO
 
+from .capture import CAPTURED_TAGS, CapturedText
 from .case_result import CaseResult
-from .render import HTMLReport
+from .render import HTMLCompactReport, HTMLReport
+from .sources import open_report
 from .textutils import unicode_str
 
 if TYPE_CHECKING:
-    from typing import Dict, List, Optional, Union, Any, OrderedDict
+    from typing import Dict, List, Optional, Union, Any, OrderedDict, IO, Iterator, Tuple, Mapping, Callable
+    from .capture import Capture, CapturePolicy
 
 NO_CLASSNAME = "no-testclass"
 PASSED = CaseResult.PASSED
@@ -25,6 +31,32 @@ SKIPPED = CaseResult.SKIPPED
 ABSENT = CaseResult.ABSENT
 UNKNOWN = CaseResult.UNKNOWN
 
+# bytes read at a time by the incremental parser backends
+CHUNK_SIZE = 64 * 1024
+
+# distinct failure, skip and output texts remembered while parsing one report
+TEXT_TABLE_SIZE = 10000
+
+# fallback anchor names for objects that are not part of a Junit report
+_ANCHOR_IDS = itertools.count(1)
+
+# str.isascii() needs python 3.7
+_find_non_ascii = re.compile(r"[^\x00-\x7f]").search
+
+
+def clean_xml_value(value: "Optional[str]"):
+    """
+    Ensure an XML attribute value is legal in XML
+    :param value:
+    :return:
+    """
+    # plain ascii can't contain surrogates or replacement chars
+    if value and _find_non_ascii(value):
+        value = value.encode("utf-8", errors="replace").decode("utf-8", errors="backslashreplace")
+        value = value.replace(u"\ufffd", "?")  # strip out the unicode replacement char
+
+    return value
+
 
 def clean_xml_attribute(element: "ET.Element", attribute: str, default: "Optional[str]"=None):
     """
@@ -34,13 +66,70 @@ def clean_xml_attribute(element: "ET.Element", attribute: str, default: "Optiona
     :param default:
     :return:
     """
+    return clean_xml_value(element.attrib.get(attribute, default))
 
-    value = element.attrib.get(attribute, default)
-    if value:
-        value = value.encode("utf-8", errors="replace").decode("utf-8", errors="backslashreplace")
-        value = value.replace(u"\ufffd", "?")  # strip out the unicode replacement char
 
-    return value
+def _escape_text(text: str) -> str:
+    """
+    Escape xml character data the same way as ElementTree
+    :param text:
+    :return:
+    """
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def _escape_attribute(text: str) -> str:
+    """
+    Escape an xml attribute value.  Carriage returns, newlines and tabs are
+    written as character references so they survive being parsed again.
+    :param text:
+    :return:
+    """
+    text = _escape_text(text)
+    if "\"" in text:
+        text = text.replace("\"", "&quot;")
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    if "\t" in text:
+        text = text.replace("\t", "&#09;")
+    return text
+
+
+def _start_tag(xmltag: str, attribs: "Optional[Dict[str, Any]]"=None) -> str:
+    """
+    Return an unfinished start tag with its attributes, eg '<tag name="value"'
+    :param xmltag:
+    :param attribs:
+    :return:
+    """
+    if not attribs:
+        return "<" + xmltag
+    return "<" + xmltag + "".join(' {}="{}"'.format(name, _escape_attribute(unicode_str(value)))
+                                  for name, value in attribs.items())
+
+
+def _leaf_element(xmltag: str, text: "Optional[str]"=None, attribs: "Optional[Dict[str, Any]]"=None) -> str:
+    """
+    Return the xml for an element with no children, for the element make_element() would build
+    :param xmltag:
+    :param text:
+    :param attribs:
+    :return:
+    """
+    start = _start_tag(xmltag, attribs)
+    if text is not None:
+        text = unicode_str(text)
+        if text:
+            return start + ">" + _escape_text(text) + "</" + xmltag + ">"
+    return start + " />"
 
 
 class ParserError(Exception):
@@ -55,6 +144,8 @@ class ToJunitXmlBase(object):
     """
     Base class of all objects that can be serialized to Junit XML
     """
+    __slots__ = ()
+
     def tojunit(self) -> "ET.Element":
         """
         Return an Element matching this object
@@ -62,6 +153,15 @@ class ToJunitXmlBase(object):
         """
         raise NotImplementedError()
 
+    def write_junit(self, stream: "IO[str]"):
+        """
+        Write this object as junit xml text to stream without building any
+        Elements.  The output parses to the same elements as tojunit() returns.
+        :param stream: text file object
+        :return:
+        """
+        raise NotImplementedError()
+
     def make_element(self, xmltag: str, text: "Optional[str]"=None, attribs: "Optional[Dict[str, Any]]"=None):
         """
         Create an Element and put text and/or attribs into it
@@ -82,7 +182,13 @@ class ToJunitXmlBase(object):
 class AnchorBase(object):
     """
     Base class that can generate a unique anchor name.
+
+    Suites and cases in a Junit report are given short anchors derived from
+    their position by Junit.allocate_anchors(), anything else gets the next
+    name from a process wide counter the first time it is asked for one.
     """
+    __slots__ = ("_anchor",)
+
     def __init__(self):
         self._anchor = None
 
@@ -95,26 +201,110 @@ class AnchorBase(object):
         :return:
         """
         if not self._anchor:
-            self._anchor = str(uuid.uuid4())
+            self._anchor = "a{}".format(next(_ANCHOR_IDS))
         return self._anchor
 
 
 class Class(AnchorBase):
     """
     A namespace for a test
+
+    Outcome lists and the total duration are indexed as cases are added and
+    kept up to date when more cases are appended to `cases`.  Changing the
+    outcome of a case that has already been indexed is not tracked.
     """
-    name: "Optional[str]" = None
+    __slots__ = ("name", "cases", "_indexed", "_failed", "_skipped", "_passed", "_duration")
+    name: "Optional[str]"
     cases: "list[Case]"
-    
+
     def __init__(self):
         super(Class, self).__init__()
+        self.name = None
         self.cases = list()
+        self._reset_index()
+
+    def _reset_index(self):
+        self._indexed = 0
+        self._failed: "List[Case]" = []
+        self._skipped: "List[Case]" = []
+        self._passed: "List[Case]" = []
+        self._duration: float = 0
+
+    def _update_index(self):
+        """
+        Index any cases appended since the last update
+        :return:
+        """
+        if self._indexed == len(self.cases):
+            return
+        if self._indexed > len(self.cases):
+            # cases were removed, start again
+            self._reset_index()
+        for test in self.cases[self._indexed:]:
+            self._index_case(test)
+        self._indexed = len(self.cases)
+
+    def _index_case(self, test: "Case"):
+        if test.failure is not None:
+            self._failed.append(test)
+            if test.skipped:
+                self._skipped.append(test)
+        elif test.skipped:
+            self._skipped.append(test)
+        else:
+            self._passed.append(test)
+        self._duration += test.duration
+
+    def add_case(self, case: "Case"):
+        """
+        Add a complete test case to this class
+        :param case:
+        :return:
+        """
+        self._update_index()
+        self.cases.append(case)
+        self._index_case(case)
+        self._indexed += 1
+
+    def failed(self):
+        """
+        Return the failed testcases
+        :return:
+        """
+        self._update_index()
+        return self._failed
+
+    def skipped(self):
+        """
+        Return the skipped testcases
+        :return:
+        """
+        self._update_index()
+        return self._skipped
+
+    def passed(self):
+        """
+        Return the passing testcases
+        :return:
+        """
+        self._update_index()
+        return self._passed
+
+    def cases_duration(self) -> float:
+        """
+        Return the sum of the durations of all testcases
+        :return:
+        """
+        self._update_index()
+        return self._duration
 
 
 class Property(AnchorBase, ToJunitXmlBase):
     """
     Test Properties
     """
+    __slots__ = ("name", "value")
+
     def __init__(self):
         super(Property, self).__init__()
         self.name: "Optional[str]" = None
@@ -130,24 +320,38 @@ class Property(AnchorBase, ToJunitXmlBase):
         prop.set(u"value", unicode_str(self.value))
         return prop
 
+    def write_junit(self, stream: "IO[str]"):
+        stream.write(_leaf_element("property", attribs={"name": self.name, "value": self.value}))
+
 
 class Case(AnchorBase, ToJunitXmlBase):
     """
     Test cases
     """
-    failure: "Optional[str]" = None
-    failure_msg: "Optional[str]" = None
-    skipped: "Optional[str]" = None
-    skipped_msg: "Optional[str]" = None
-    stderr: "Optional[Union[str,Any]]" = None
-    stdout: "Optional[Union[str,Any]]" = None
-    duration: float = 0
-    name: "Optional[str]" = None
-    testclass: "Optional[Class]" = None
+    __slots__ = ("failure", "failure_msg", "skipped", "skipped_msg", "stderr", "stdout",
+                 "duration", "name", "testclass", "properties")
+    failure: "Optional[str]"
+    failure_msg: "Optional[str]"
+    skipped: "Optional[str]"
+    skipped_msg: "Optional[str]"
+    stderr: "Optional[Union[str,Any]]"
+    stdout: "Optional[Union[str,Any]]"
+    duration: float
+    name: "Optional[str]"
+    testclass: "Optional[Class]"
     properties: "List[Property]"
 
     def __init__(self):
         super(Case, self).__init__()
+        self.failure = None
+        self.failure_msg = None
+        self.skipped = None
+        self.skipped_msg = None
+        self.stderr = None
+        self.stdout = None
+        self.duration = 0
+        self.name = None
+        self.testclass = None
         self.properties = list()
 
     @property
@@ -217,6 +421,47 @@ class Case(AnchorBase, ToJunitXmlBase):
 
         return testcase
 
+    def _junit_parts(self, parts: "List[str]"):
+        """
+        Add the xml text for this case to parts
+        :param parts:
+        :return:
+        """
+        if self.testclass is None or self.testclass.name is None:
+            testclass_name = ""
+        else:
+            testclass_name = self.testclass.name
+
+        # the same as _start_tag(), spelled out as this is the hot path for big reports
+        parts.append('<testcase name="' + _escape_attribute(unicode_str(self.name))
+                     + '" classname="' + _escape_attribute(testclass_name)
+                     + '" time="' + _escape_attribute(unicode_str(self.duration)) + '"')
+        if (self.stderr is None and self.stdout is None and self.failure is None
+                and not self.skipped and not self.properties):
+            parts.append(" />")
+            return
+
+        parts.append(">")
+        if self.stderr is not None:
+            parts.append(_leaf_element("system-err", self.stderr))
+        if self.stdout is not None:
+            parts.append(_leaf_element("system-out", self.stdout))
+        if self.failure is not None:
+            parts.append(_leaf_element("failure", self.failure, {"message": self.failure_msg}))
+        if self.skipped:
+            parts.append(_leaf_element("skipped", self.skipped, {"message": self.skipped_msg}))
+        if self.properties:
+            parts.append("<properties>")
+            for prop in self.properties:
+                parts.append(_leaf_element("property", attribs={"name": prop.name, "value": prop.value}))
+            parts.append("</properties>")
+        parts.append("</testcase>")
+
+    def write_junit(self, stream: "IO[str]"):
+        parts: "List[str]" = []
+        self._junit_parts(parts)
+        stream.write("".join(parts))
+
     def fullname(self):
         """
         Get the full name of a test case
@@ -254,21 +499,38 @@ class Case(AnchorBase, ToJunitXmlBase):
 class Suite(AnchorBase, ToJunitXmlBase):
     """
     Contains test cases (usually only one suite per report)
+
+    The lists returned by all(), failed(), skipped() and passed() are cached
+    and rebuilt only when cases or classes have been added, callers must not
+    modify them.
     """
-    name: "Optional[str]" = None
+    __slots__ = ("name", "properties", "classes", "duration", "package", "errors", "stdout", "stderr",
+                 "_indexed", "_all", "_failed", "_skipped", "_passed", "_duration")
+    name: "Optional[str]"
     properties: "List[Property]"
     classes: "OrderedDict[str, Class]"
-    duration: float = 0
-    package: "Optional[str]" = None
+    duration: float
+    package: "Optional[str]"
     errors: "List[Dict[str, Optional[Union[str,Any]]]]"
-    stdout: "Optional[Union[str,Any]]" = None
-    stderr: "Optional[Union[str,Any]]" = None
+    stdout: "Optional[Union[str,Any]]"
+    stderr: "Optional[Union[str,Any]]"
 
     def __init__(self):
         super(Suite, self).__init__()
+        self.name = None
         self.classes = collections.OrderedDict()
         self.properties = []
+        self.duration = 0
+        self.package = None
         self.errors = []
+        self.stdout = None
+        self.stderr = None
+        self._indexed = (0, 0)
+        self._all: "List[Case]" = []
+        self._failed: "List[Case]" = []
+        self._skipped: "List[Case]" = []
+        self._passed: "List[Case]" = []
+        self._duration: float = 0
 
     def tojunit(self):
         """
@@ -288,6 +550,28 @@ class Suite(AnchorBase, ToJunitXmlBase):
             suite.append(testcase.tojunit())
         return suite
 
+    def write_junit(self, stream: "IO[str]"):
+        write = stream.write
+        write(_start_tag("testsuite", {"name": self.name, "time": self.duration}))
+        cases = self.all()
+        if not self.properties and not cases:
+            write(" />")
+            return
+        write(">")
+        if self.properties:
+            write("<properties>")
+            for prop in self.properties:
+                prop.write_junit(stream)
+            write("</properties>")
+        parts: "List[str]" = []
+        for testcase in cases:
+            testcase._junit_parts(parts)
+            if len(parts) > 1024:
+                write("".join(parts))
+                del parts[:]
+        write("".join(parts))
+        write("</testsuite>")
+
     def __contains__(self, item: str):
         """
         Return True if the given test classname is part of this test suite
@@ -313,36 +597,603 @@ class Suite(AnchorBase, ToJunitXmlBase):
         """
         self.classes[key] = value
 
+    def _update_index(self):
+        """
+        Rebuild the cached case lists if any classes or cases were added
+        :return:
+        """
+        total = 0
+        for testclass in self.classes.values():
+            total += len(testclass.cases)
+        indexed = (len(self.classes), total)
+        if indexed == self._indexed:
+            return
+
+        self._all = []
+        self._failed = []
+        self._skipped = []
+        self._passed = []
+        self._duration = 0
+        for testclass in self.classes.values():
+            self._all.extend(testclass.cases)
+            self._failed.extend(testclass.failed())
+            self._skipped.extend(testclass.skipped())
+            self._passed.extend(testclass.passed())
+            self._duration += testclass.cases_duration()
+        self._indexed = indexed
+
     def all(self):
         """
         Return all testcases
         :return:
         """
-        tests: "List[Case]" = list()
-        for testclass in self.classes:
-            tests.extend(self.classes[testclass].cases)
-        return tests
+        self._update_index()
+        return self._all
 
     def failed(self):
         """
         Return all the failed testcases
         :return:
         """
-        return [test for test in self.all() if test.failed()]
+        self._update_index()
+        return self._failed
 
     def skipped(self):
         """
         Return all skipped testcases
         :return:
         """
-        return [test for test in self.all() if test.skipped]
+        self._update_index()
+        return self._skipped
 
     def passed(self):
         """
         Return all the passing testcases
         :return:
         """
-        return [test for test in self.all() if not test.failed() and not test.skipped]
+        self._update_index()
+        return self._passed
+
+    def cases_duration(self) -> float:
+        """
+        Return the sum of the durations of all testcases
+        :return:
+        """
+        self._update_index()
+        return self._duration
+
+
+def _parse_duration(attrib: "Mapping[str, str]") -> float:
+    """
+    Read the time attribute of a suite or case
+    :param attrib:
+    :return:
+    """
+    return float(attrib.get("time", '0').replace(',', '') or '0')
+
+
+def _make_property(attrib: "Mapping[str, str]") -> "Property":
+    """
+    Create a Property from the attributes of a <property> element
+    :param attrib:
+    :return:
+    """
+    newproperty = Property()
+    newproperty.name = sys.intern(attrib["name"])
+    newproperty.value = attrib["value"]
+    return newproperty
+
+
+def _make_suite(attrib: "Mapping[str, str]", suitecount: int) -> "Suite":
+    """
+    Create an empty Suite from the attributes of a <testsuite> element
+    :param attrib:
+    :param suitecount: position of this suite in the report, counting from 1
+    :return:
+    """
+    cursuite = Suite()
+    cursuite.name = clean_xml_value(attrib.get("name", "suite-" + str(suitecount)))
+    cursuite.package = clean_xml_value(attrib.get("package"))
+    cursuite.duration = _parse_duration(attrib)
+    return cursuite
+
+
+def intern_text(texts: "Optional[Dict[Any, str]]", text: "Optional[str]") -> "Optional[str]":
+    """
+    Return the copy of text already in texts, or add text to it, so cases
+    with the same failure, skip or output text share one string.  The table
+    is emptied once it holds TEXT_TABLE_SIZE texts, so streaming parses
+    don't keep every distinct text alive.
+    :param texts: table of the texts seen while parsing a report, None to not intern
+    :param text:
+    :return:
+    """
+    if texts is None or not text:
+        return text
+    # captured text with the same content may link to different full output
+    key: "Any" = (text, text.total, text.link) if isinstance(text, CapturedText) else text
+    found = texts.get(key)
+    if found is not None:
+        return found
+    if len(texts) >= TEXT_TABLE_SIZE:
+        texts.clear()
+    texts[key] = text
+    return text
+
+
+def _set_suite_text(cursuite: "Suite", tag: str, attrib: "Mapping[str, str]", text: "Optional[str]",
+                    texts: "Optional[Dict[Any, str]]"=None):
+    """
+    Apply an <error>, <system-out> or <system-err> child of a <testsuite> to the suite
+    :param cursuite:
+    :param tag:
+    :param attrib:
+    :param text:
+    :param texts: see intern_text()
+    :return:
+    """
+    text = intern_text(texts, text)
+    if tag == "error":
+        # top level error?
+        errtag = {
+            "message": attrib.get("message", ""),
+            "type": attrib.get("type", ""),
+            "text": text
+        }
+        cursuite.errors.append(errtag)
+    if tag == "system-out":
+        cursuite.stdout = text
+    if tag == "system-err":
+        cursuite.stderr = text
+
+
+def _make_case(cursuite: "Suite", attrib: "Mapping[str, str]") -> "Case":
+    """
+    Create a Case from the attributes of a <testcase> element, adding its
+    Class to the suite if needed.  The case is added to the class by
+    _finish_case() once all its children have been applied.
+    :param cursuite:
+    :param attrib:
+    :return:
+    """
+    classname = attrib.get("classname", None) or NO_CLASSNAME
+
+    testclass = cursuite.classes.get(classname)
+    if testclass is None:
+        testclass = Class()
+        testclass.name = sys.intern(classname)
+        cursuite[testclass.name] = testclass
+
+    newcase = Case()
+    newcase.name = clean_xml_value(attrib.get("name"))
+    newcase.testclass = testclass
+    newcase.duration = _parse_duration(attrib)
+    return newcase
+
+
+def _set_case_text(newcase: "Case", tag: str, attrib: "Mapping[str, str]", text: "Optional[str]",
+                   texts: "Optional[Dict[Any, str]]"=None):
+    """
+    Apply a <skipped>, <system-out>, <system-err>, <failure> or <error> child of a <testcase>
+    :param newcase:
+    :param tag:
+    :param attrib:
+    :param text:
+    :param texts: see intern_text()
+    :return:
+    """
+    text = intern_text(texts, text)
+    if tag == "skipped":
+        newcase.skipped = text
+        if "message" in attrib:
+            newcase.skipped_msg = intern_text(texts, attrib["message"])
+        if not newcase.skipped:
+           newcase.skipped = "skipped"
+    elif tag == "system-out":
+        newcase.stdout = text
+    elif tag == "system-err":
+        newcase.stderr = text
+    elif tag == "failure":
+        newcase.failure = text
+        if "message" in attrib:
+            newcase.failure_msg = intern_text(texts, attrib["message"])
+        if not newcase.failure:
+            newcase.failure = "failed"
+    elif tag == "error":
+        newcase.failure = text
+        if "message" in attrib:
+            newcase.failure_msg = intern_text(texts, attrib["message"])
+        if not newcase.failure:
+            newcase.failure = "error"
+
+
+def _finish_case(newcase: "Case"):
+    """
+    Add a complete case to its class
+    :param newcase:
+    :return:
+    """
+    newcase.testclass.add_case(newcase)
+
+
+def _element_text(element: "ET.Element", capture: "Optional[CapturePolicy]") -> "Optional[str]":
+    """
+    Return the text of an element, applying the capture policy to system-out and system-err
+    :param element:
+    :param capture:
+    :return:
+    """
+    if capture is not None and element.tag in CAPTURED_TAGS:
+        return capture.apply(element.text)
+    return element.text
+
+
+def _add_suite_child(cursuite: "Suite", element: "ET.Element", capture: "Optional[CapturePolicy]"=None,
+                     texts: "Optional[Dict[Any, str]]"=None):
+    """
+    Add a complete child element of a <testsuite> to the suite
+    :param cursuite:
+    :param element:
+    :param capture: limit the system-out and system-err text kept
+    :param texts: see intern_text()
+    :return:
+    """
+    if element.tag == "properties":
+        for prop in element:
+            if prop.tag == "property":
+                cursuite.properties.append(_make_property(prop.attrib))
+
+    elif element.tag == "testcase":
+        newcase = _make_case(cursuite, element.attrib)
+        # does this test case have any children?
+        for child in element:
+            if child.tag == "properties":
+                for property in child:
+                    newcase.properties.append(_make_property(property.attrib))
+            else:
+                _set_case_text(newcase, child.tag, child.attrib, _element_text(child, capture), texts)
+        _finish_case(newcase)
+
+    else:
+        _set_suite_text(cursuite, element.tag, element.attrib, _element_text(element, capture), texts)
+
+
+class _SuiteFinder(object):
+    """
+    Track how deep we are in a junit document and where the suites are.
+
+    Suites are the root <testsuite>, the children of a <testsuites> root, or
+    the children of the first child of a <testrun> root.
+    """
+    def __init__(self):
+        self.depth = 0
+        self.suite_depth = 0
+        self.first_child = True
+        self.suitecount = 0
+
+    def start(self, tag: str) -> bool:
+        """
+        Enter an element, return True if it is a suite
+        :param tag:
+        :return:
+        """
+        depth = self.depth
+        self.depth += 1
+        if depth == 0:
+            if tag == "testsuite":
+                self.suite_depth = 0
+            elif tag == "testsuites":
+                self.suite_depth = 1
+            elif tag == "testrun":
+                self.suite_depth = 2
+            else:
+                raise ParserError("could not find test suites in results xml")
+        elif depth == 1 and self.suite_depth == 2:
+            if not self.first_child:
+                # only the first child of <testrun> holds suites
+                self.suite_depth = -1
+            self.first_child = False
+
+        if depth == self.suite_depth:
+            self.suitecount += 1
+            return True
+        return False
+
+    def end(self):
+        """
+        Leave an element, return the depth relative to the suites
+        :return:
+        """
+        self.depth -= 1
+        return self.depth - self.suite_depth
+
+    def close(self):
+        """
+        Check we found somewhere suites could be
+        :return:
+        """
+        if self.suite_depth == 2 and self.first_child:
+            raise ParserError("could not find test suites in results xml")
+
+
+def iter_suite_children(source: "Union[str,IO[Any]]") -> "Iterator[Tuple[Suite, Optional[ET.Element]]]":
+    """
+    Incrementally parse a junit xml document, yielding (suite, element) for
+    each complete direct child element of each <testsuite>, and then
+    (suite, None) once the suite has been closed.
+
+    The yielded Suite only has its own attributes filled in.  Child elements
+    are dropped as soon as the consumer moves on, so peak memory tracks the
+    largest single child (usually a test case) rather than the whole document.
+    :param source: filename or file object
+    :return:
+    """
+    finder = _SuiteFinder()
+    stack: "List[ET.Element]" = []
+    cursuite: "Optional[Suite]" = None
+
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            if finder.start(element.tag):
+                cursuite = _make_suite(element.attrib, finder.suitecount)
+        else:
+            stack.pop()
+            depth = finder.end()
+            if cursuite is not None:
+                if depth == 1:
+                    yield cursuite, element
+                    # drop the processed child from the suite element
+                    del stack[-1][:]
+                elif depth == 0:
+                    yield cursuite, None
+                    cursuite = None
+                    if stack:
+                        del stack[-1][:]
+    finder.close()
+
+
+def iter_suites(source: "Union[str,IO[Any]]", capture: "Optional[CapturePolicy]"=None) -> "Iterator[Suite]":
+    """
+    Incrementally parse a junit xml document, yielding each Suite as soon as
+    its closing tag has been read.
+
+    Each <testcase> is turned into a Case at its end tag and the source
+    elements are then dropped, so the xml document tree is never held in memory.
+    :param source: filename or file object
+    :param capture: limit the system-out and system-err text kept, applied once each element is complete
+    :return:
+    """
+    texts: "Dict[Any, str]" = {}
+    for cursuite, element in iter_suite_children(source):
+        if element is None:
+            yield cursuite
+        else:
+            _add_suite_child(cursuite, element, capture, texts)
+
+
+class SuiteBuilder(object):
+    """
+    Parser target that builds Suites and Cases straight from start, end and
+    character data callbacks, without creating any Element objects.
+
+    It can be driven by expat or used as the target of ET.XMLParser or
+    lxml.etree.XMLParser.  Completed suites are appended to `suites`, and
+    the caller is expected to collect and clear them as parsing proceeds.
+
+    Given a CapturePolicy, system-out and system-err text is limited as it
+    arrives so an oversized stream is never held in memory.  Repeated texts
+    are shared, see intern_text().
+    """
+    def __init__(self, capture: "Optional[CapturePolicy]"=None):
+        self.capture = capture
+        self.texts: "Dict[Any, str]" = {}
+        self.finder = _SuiteFinder()
+        self.suites: "List[Suite]" = []
+        self.suite: "Optional[Suite]" = None
+        self.case: "Optional[Case]" = None
+        # the suite or case child element whose text we are collecting
+        self.child: "Optional[Tuple[str, Mapping[str, str]]]" = None
+        self.text: "Union[List[str],Capture]" = []
+        self.in_text = False
+        self.properties: "Optional[List[Property]]" = None
+
+    def start(self, tag: str, attrib: "Mapping[str, str]"):
+        if self.finder.start(tag):
+            self.suite = _make_suite(attrib, self.finder.suitecount)
+            return
+        if self.suite is None:
+            return
+        # like Element.text, only keep the text before the first child element
+        self.in_text = False
+        depth = self.finder.depth - self.finder.suite_depth - 1
+        if depth == 1:
+            if tag == "testcase":
+                self.case = _make_case(self.suite, attrib)
+            elif tag == "properties":
+                self.properties = self.suite.properties
+            else:
+                self._start_text(tag, attrib)
+        elif depth == 2:
+            if self.properties is not None:
+                if tag == "property":
+                    self.properties.append(_make_property(attrib))
+            elif self.case is not None:
+                if tag == "properties":
+                    self.properties = self.case.properties
+                else:
+                    self._start_text(tag, attrib)
+        elif depth == 3 and self.case is not None and self.properties is not None:
+            # every child of a case's <properties> is a property
+            self.properties.append(_make_property(attrib))
+
+    def _start_text(self, tag: str, attrib: "Mapping[str, str]"):
+        self.child = (tag, attrib)
+        if self.capture is not None and tag in CAPTURED_TAGS:
+            self.text = self.capture.new_capture()
+        else:
+            self.text = []
+        self.in_text = True
+
+    def _end_text(self) -> "Optional[str]":
+        if isinstance(self.text, list):
+            return "".join(self.text) or None
+        return self.text.value()
+
+    def data(self, text: str):
+        if self.in_text:
+            self.text.append(text)
+
+    def end(self, tag: str):
+        self.in_text = False
+        depth = self.finder.end()
+        if self.suite is None:
+            return
+        if depth == 0:
+            self.suites.append(self.suite)
+            self.suite = None
+        elif depth == 1:
+            if self.case is not None:
+                _finish_case(self.case)
+                self.case = None
+            elif self.child is not None:
+                _set_suite_text(self.suite, self.child[0], self.child[1], self._end_text(), self.texts)
+            self.child = None
+            self.properties = None
+        elif depth == 2 and self.case is not None:
+            if self.child is not None:
+                _set_case_text(self.case, self.child[0], self.child[1], self._end_text(), self.texts)
+            self.child = None
+            self.properties = None
+
+    def close(self):
+        self.finder.close()
+
+
+def _read_chunks(source: "Union[str,IO[Any]]") -> "Iterator[Union[str,bytes]]":
+    """
+    Read a file or file object in large chunks
+    :param source:
+    :return:
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as infile:
+            for chunk in iter(lambda: infile.read(CHUNK_SIZE), b""):
+                yield chunk
+    else:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), source.read(0)):
+            yield chunk
+
+
+def iter_suites_expat(source: "Union[str,IO[Any]]", capture: "Optional[CapturePolicy]"=None) -> "Iterator[Suite]":
+    """
+    Parse a junit xml document with expat callbacks, yielding each Suite as
+    soon as it is complete
+    :param source: filename or file object
+    :param capture: limit the system-out and system-err text kept, applied as it is read
+    :return:
+    """
+    builder = SuiteBuilder(capture)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.buffer_size = CHUNK_SIZE
+    parser.StartElementHandler = builder.start
+    parser.EndElementHandler = builder.end
+    parser.CharacterDataHandler = builder.data
+    try:
+        for chunk in _read_chunks(source):
+            parser.Parse(chunk, False)
+            if builder.suites:
+                yield from builder.suites
+                del builder.suites[:]
+        parser.Parse(b"", True)
+    except expat.ExpatError as err:
+        error = ET.ParseError("{}: line {}, column {}".format(expat.ErrorString(err.code), err.lineno, err.offset))
+        error.code = err.code
+        error.position = (err.lineno, err.offset)
+        raise error from err
+    builder.close()
+    yield from builder.suites
+
+
+def iter_suites_lxml(source: "Union[str,IO[Any]]", capture: "Optional[CapturePolicy]"=None) -> "Iterator[Suite]":
+    """
+    Parse a junit xml document with lxml, yielding each Suite as soon as it is
+    complete.  Text sources are fed to lxml as utf-8, overriding the encoding
+    their xml declaration names.
+    :param source: filename or file object
+    :param capture: limit the system-out and system-err text kept, applied as it is read
+    :return:
+    """
+    from lxml import etree as lxml_etree
+
+    builder = SuiteBuilder(capture)
+    text = not isinstance(source, str) and isinstance(source.read(0), str)
+    parser = lxml_etree.XMLParser(target=builder, huge_tree=True, encoding="utf-8" if text else None)
+    try:
+        for chunk in _read_chunks(source):
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            parser.feed(chunk)
+            if builder.suites:
+                yield from builder.suites
+                del builder.suites[:]
+        parser.close()
+    except lxml_etree.XMLSyntaxError as err:
+        error = ET.ParseError(str(err))
+        error.code = err.code
+        error.position = err.position
+        raise error from err
+    yield from builder.suites
+
+
+BACKENDS: "Dict[str, Callable[[Union[str,IO[Any]], Optional[CapturePolicy]], Iterator[Suite]]]" = {
+    "iterparse": iter_suites,
+    "expat": iter_suites_expat,
+    "lxml": iter_suites_lxml,
+}
+"""
+Incremental parser backends, each turns a filename or file object into Suites.
+The "etree" backend is the Junit.process() path over a complete ElementTree.
+"""
+
+
+def have_lxml() -> bool:
+    """
+    Return True if lxml can be imported
+    :return:
+    """
+    try:
+        import lxml.etree
+    except ImportError:
+        return False
+    return True
+
+
+def select_backend(backend: "Optional[str]"=None, streaming: bool=False, capture: bool=False) -> str:
+    """
+    Choose a parser backend name.  "auto" (or None) uses lxml if it is
+    installed, otherwise expat when capture is limited (so that long text is
+    limited as it is read), iterparse when streaming and etree when not.
+    :param backend: one of BACKEND_NAMES
+    :param streaming: True if the xml tree must not be kept
+    :param capture: True if a CapturePolicy will be applied
+    :return:
+    """
+    if backend is None or backend == "auto":
+        if have_lxml():
+            return "lxml"
+        if capture:
+            return "expat"
+        return "iterparse" if streaming else "etree"
+
+    if backend == "etree":
+        if streaming:
+            raise ValueError("the etree backend can't parse incrementally")
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError("unknown parser backend {}".format(backend))
+    return backend
 
 
 class Junit(object):
@@ -353,33 +1204,84 @@ class Junit(object):
     suites: "List[Suite]"
     tree: "Union[ET.ElementTree,ET.Element]"
 
-    def __init__(self, filename: "Optional[str]"=None, xmlstring: "Optional[str]"=None):
+    def __init__(self, filename: "Optional[str]"=None, xmlstring: "Optional[str]"=None,
+                 streaming: bool=False, backend: "Optional[str]"=None,
+                 fileobj: "Optional[IO[Any]]"=None, capture: "Optional[CapturePolicy]"=None):
         """
         Parse the file
-        :param filename:
+        :param filename: report file, gzip, bzip2 and xz files are decompressed as they are read
+        :param xmlstring:
+        :param streaming: parse incrementally, without keeping the xml document tree in memory
+        :param backend: parser backend, see select_backend()
+        :param fileobj: read the xml from this file object, filename is then only used as a name
+        :param capture: limit the system-out and system-err text kept, see CapturePolicy
         :return:
         """
         self.filename = filename
+        self.capture = capture
+        self.backend = select_backend(backend, streaming, capture is not None)
         if filename == "-":
             # read the xml from stdin
-            stdin = sys.stdin.read()
-            xmlstring = stdin
             self.filename = None
+            if self.backend != "etree":
+                fileobj = getattr(sys.stdin, "buffer", sys.stdin)
+            else:
+                stdin = sys.stdin.read()
+                xmlstring = stdin
 
         self.tree = None # type: ignore
-        if self.filename is not None:
-            self.tree = ET.parse(self.filename)
+        self.suites = []
+        if fileobj is None and self.filename is not None:
+            with open_report(self.filename) as infile:
+                self._parse(infile)
+        else:
+            self._parse(fileobj, xmlstring)
+        self.allocate_anchors()
+
+    def _parse(self, fileobj: "Optional[IO[Any]]", xmlstring: "Optional[str]"=None):
+        """
+        Build the suites from a file object or string using our backend
+        :param fileobj:
+        :param xmlstring:
+        :return:
+        """
+        if self.backend != "etree":
+            if fileobj is None:
+                if xmlstring is None:
+                    raise ValueError("Missing any filename or xmlstring")
+                fileobj = StringIO(xmlstring)
+            self.suites.extend(BACKENDS[self.backend](fileobj, self.capture))
+            return
+
+        if fileobj is not None:
+            self.tree = ET.parse(fileobj)
         elif xmlstring is not None:
             self._read(xmlstring)
         else:
             raise ValueError("Missing any filename or xmlstring")
-        self.suites = []
         self.process()
 
-
     def __iter__(self):
         return self.suites.__iter__()
 
+    def __getstate__(self):
+        # the xml tree is only needed while parsing, don't pickle it
+        state = self.__dict__.copy()
+        state["tree"] = None
+        return state
+
+    def allocate_anchors(self):
+        """
+        Give every suite and case an anchor name derived from its position in
+        the report, so the same input always renders the same html and the
+        matrix pages can link to the cases of each report.
+        :return:
+        """
+        for suiteindex, suite in enumerate(self.suites):
+            suite._anchor = "s{}".format(suiteindex)
+            for caseindex, case in enumerate(suite.all()):
+                case._anchor = "s{}c{}".format(suiteindex, caseindex)
+
     def _read(self, xmlstring: str):
         """
         Populate the junit xml document tree from a string
@@ -415,96 +1317,54 @@ class Junit(object):
         if suites is None:
             raise ParserError("could not find test suites in results xml")
         suitecount = 0
+        texts: "Dict[Any, str]" = {}
         for suite in suites:
             suitecount += 1
-            cursuite = Suite()
+            cursuite = _make_suite(suite.attrib, suitecount)
             self.suites.append(cursuite)
-            cursuite.name = clean_xml_attribute(suite, "name", default="suite-" + str(suitecount))
-            cursuite.package = clean_xml_attribute(suite, "package")
-
-            cursuite.duration = float(suite.attrib.get("time", '0').replace(',', '') or '0')
 
             for element in suite:
-                if element.tag == "error":
-                    # top level error?
-                    errtag = {
-                        "message": element.attrib.get("message", ""),
-                        "type": element.attrib.get("type", ""),
-                        "text": element.text
-                    }
-                    cursuite.errors.append(errtag)
-                if element.tag == "system-out":
-                    cursuite.stdout = element.text
-                if element.tag == "system-err":
-                    cursuite.stderr = element.text
-
-                if element.tag == "properties":
-                    for prop in element:
-                        if prop.tag == "property":
-                            newproperty = Property()
-                            newproperty.name = prop.attrib["name"]
-                            newproperty.value = prop.attrib["value"]
-                            cursuite.properties.append(newproperty)
-
-                if element.tag == "testcase":
-                    testcase = element
-
-                    if not testcase.attrib.get("classname", None):
-                        testcase.attrib["classname"] = NO_CLASSNAME
-
-                    if testcase.attrib["classname"] not in cursuite:
-                        testclass = Class()
-                        testclass.name = testcase.attrib["classname"]
-                        cursuite[testclass.name] = testclass
-
-                    testclass: "Class" = cursuite[testcase.attrib["classname"]]
-                    newcase = Case()
-                    newcase.name = clean_xml_attribute(testcase, "name")
-                    newcase.testclass = testclass
-                    newcase.duration = float(testcase.attrib.get("time", '0').replace(',', '') or '0')
-                    testclass.cases.append(newcase)
-
-                    # does this test case have any children?
-                    for child in testcase:
-                        if child.tag == "skipped":
-                            newcase.skipped = child.text
-                            if "message" in child.attrib:
-                                newcase.skipped_msg = child.attrib["message"]
-                            if not newcase.skipped:
-                               newcase.skipped = "skipped"
-                        elif child.tag == "system-out":
-                            newcase.stdout = child.text
-                        elif child.tag == "system-err":
-                            newcase.stderr = child.text
-                        elif child.tag == "failure":
-                            newcase.failure = child.text
-                            if "message" in child.attrib:
-                                newcase.failure_msg = child.attrib["message"]
-                            if not newcase.failure:
-                                newcase.failure = "failed"
-                        elif child.tag == "error":
-                            newcase.failure = child.text
-                            if "message" in child.attrib:
-                                newcase.failure_msg = child.attrib["message"]
-                            if not newcase.failure:
-                                newcase.failure = "error"
-                        elif child.tag == "properties":
-                            for property in child:
-                                newproperty = Property()
-                                newproperty.name = property.attrib["name"]
-                                newproperty.value = property.attrib["value"]
-                                newcase.properties.append(newproperty)
-
-    def html(self, show_toc: bool=True):
-        """
-        Render the test suite as a HTML report with links to errors first.
-        :return:
-        """
+                _add_suite_child(cursuite, element, self.capture, texts)
 
-        doc = HTMLReport(show_toc=show_toc)
+    def _html_report(self, show_toc: bool, compact: bool) -> "HTMLReport":
+        # cover suites and cases added or moved since parsing
+        self.allocate_anchors()
+        doc = HTMLCompactReport(show_toc=show_toc) if compact else HTMLReport(show_toc=show_toc)
         title = "Test Results"
         if self.filename:
             if os.path.exists(self.filename):
                 title = os.path.basename(self.filename)
         doc.load(self, title=title)
-        return str(doc)
+        return doc
+
+    def html(self, show_toc: bool=True, compact: bool=False):
+        """
+        Render the test suite as a HTML report with links to errors first.
+        :param show_toc:
+        :param compact: render the cases from embedded json as a searchable
+            list that only draws the rows in view, for very large reports
+        :return:
+        """
+        return str(self._html_report(show_toc, compact))
+
+    def write_html(self, stream: "IO[bytes]", show_toc: bool=True, compact: bool=False):
+        """
+        Render the HTML report into a binary stream as utf-8, without holding
+        the whole page in memory
+        :param stream:
+        :param show_toc:
+        :param compact: see html()
+        :return:
+        """
+        self._html_report(show_toc, compact).write_to(stream)
+
+    def write_html_pages(self, filename: str, show_toc: bool=True, jobs: int=1) -> "List[str]":
+        """
+        Write the HTML report as an index page with the table of contents and
+        failure index, a page per suite next to it and a shared styles.css
+        :param filename: the index page
+        :param show_toc:
+        :param jobs: write the suite pages using this many processes
+        :return: the file names of the suite pages
+        """
+        return self._html_report(show_toc, False).write_pages(filename, jobs)
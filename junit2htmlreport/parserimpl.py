@@ -1,18 +1,111 @@
 """
 Parse results files
 """
-from .parser import Junit
+import sys
+from collections import namedtuple
+from typing import TYPE_CHECKING
 
+from .case_result import CaseResult
+from .sources import open_report
+from .parser import Junit, NO_CLASSNAME, clean_xml_attribute, iter_suite_children, _parse_duration
 
-def load_report(filename: str) -> Junit:
+if TYPE_CHECKING: # pragma: no cover
+    from typing import IO, Iterator, Optional
+    from .cache import ReportCache
+    from .capture import CapturePolicy
+    import xml.etree.ElementTree as ET
+
+
+CaseRecord = namedtuple("CaseRecord", ["suite", "classname", "name", "duration", "outcome", "message",
+                                       "failed", "skipped"])
+"""
+A lightweight, read-only summary of one test case.  outcome is Case.outcome(),
+failed and skipped are set like Case.failed() and Case.skipped, so a case
+with both a <failure> and <skipped> is counted as both.
+"""
+
+
+def load_report(filename: str, streaming: bool=False, backend: "Optional[str]"=None,
+                fileobj: "Optional[IO[bytes]]"=None, cache: "Optional[ReportCache]"=None,
+                capture: "Optional[CapturePolicy]"=None) -> Junit:
     """
     Load a report from disjk
+    :param filename:
+    :param streaming: parse incrementally without keeping the xml tree in memory
+    :param backend: parser backend name, see parser.select_backend()
+    :param fileobj: read the report from this stream, filename is then only used as a name
+    :param cache: reuse previously parsed copies of report files from this cache
+    :param capture: limit the system-out and system-err text kept, see capture.CapturePolicy
     """
-    return Junit(filename=filename)
+    def parse():
+        return Junit(filename=filename, streaming=streaming, backend=backend, fileobj=fileobj,
+                     capture=capture)
+
+    if cache is None or fileobj is not None or filename == "-":
+        return parse()
+    return cache.load(filename, parse, variant=repr(capture) if capture else "")
 
 
-def load_string(text: str) -> Junit:
+def load_string(text: str, streaming: bool=False, backend: "Optional[str]"=None) -> Junit:
     """
     Load a report from a string
     """
-    return Junit(xmlstring=text)
+    return Junit(xmlstring=text, streaming=streaming, backend=backend)
+
+
+def make_case_record(suitename: "str", testcase: "ET.Element") -> CaseRecord:
+    """
+    Summarise a <testcase> element without building a Case
+    :param suitename:
+    :param testcase:
+    :return:
+    """
+    failed = skipped = False
+    failure_msg = skipped_msg = None
+    for child in testcase:
+        if child.tag == "skipped":
+            skipped = True
+            skipped_msg = child.attrib.get("message", skipped_msg)
+        elif child.tag in ("failure", "error"):
+            failed = True
+            failure_msg = child.attrib.get("message", failure_msg)
+
+    if skipped:
+        outcome = CaseResult.SKIPPED
+        message = skipped_msg
+    elif failed:
+        outcome = CaseResult.FAILED
+        message = failure_msg
+    else:
+        outcome = CaseResult.PASSED
+        message = None
+    return CaseRecord(
+        suite=suitename,
+        classname=testcase.attrib.get("classname") or NO_CLASSNAME,
+        name=clean_xml_attribute(testcase, "name"),
+        duration=_parse_duration(testcase.attrib),
+        outcome=outcome,
+        message=message,
+        failed=failed,
+        skipped=skipped)
+
+
+def iter_cases(filename: str, fileobj: "Optional[IO[bytes]]"=None) -> "Iterator[CaseRecord]":
+    """
+    Yield a CaseRecord for each test case in a report as the xml is read,
+    without building the full report model.
+    :param filename: report file (optionally compressed), or "-" to read stdin
+    :param fileobj: read the report from this stream instead of opening filename
+    :return:
+    """
+    if fileobj is None:
+        if filename == "-":
+            fileobj = getattr(sys.stdin, "buffer", sys.stdin)
+        else:
+            with open_report(filename) as infile:
+                yield from iter_cases(filename, infile)
+            return
+
+    for suite, element in iter_suite_children(fileobj):
+        if element is not None and element.tag == "testcase":
+            yield make_case_record(suite.name, element)
@@ -3,26 +3,164 @@ Render junit reports as HTML
 """
 from typing import TYPE_CHECKING
 
+import codecs
+import collections
+import json
+import math
+import os
+
 if TYPE_CHECKING: # pragma: no cover
     from .matrix import ReportMatrix
     from .parser import Junit
     from os import PathLike
-    from typing import Union, Sequence, Optional
+    from jinja2.bccache import Bucket
+    from jinja2 import BaseLoader, Template
+    from typing import IO, Any, Dict, Iterable, Iterator, List, Union, Sequence, Optional
+    from .parser import Case, Suite
+
+from jinja2 import (ChoiceLoader, Environment, FileSystemBytecodeCache, PackageLoader, select_autoescape,
+                    FileSystemLoader)
+from markupsafe import Markup, escape
+
+# one environment per template folder, so each template is only compiled once per process
+_ENVIRONMENTS: "Dict[Any, Environment]" = {}
+
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    """
+    A bytecode cache that carries on compiling templates if its folder can't be used
+    """
+    def load_bytecode(self, bucket: "Bucket"):
+        try:
+            super(_BytecodeCache, self).load_bytecode(bucket)
+        except (OSError, ValueError, EOFError):
+            bucket.reset()
+
+    def dump_bytecode(self, bucket: "Bucket"):
+        try:
+            super(_BytecodeCache, self).dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+_BYTECODE_CACHE: "Optional[_BytecodeCache]" = None
+
+# characters of rendered html gathered before each write by write_template()
+WRITE_CHUNK = 64 * 1024
+
+# the stylesheet shared by the pages of multi-page output
+STYLESHEET_NAME = "styles.css"
+
+# styles only included in the pages of the views that use them, the shared
+# stylesheet of multi-page output holds them all
+VIEW_STYLESHEETS = ("styles-matrix.css", "styles-shared-text.css", "styles-compact.css")
 
-from jinja2 import Environment, PackageLoader, select_autoescape, FileSystemLoader
+# failure, skip and output texts at least this long are written once per page
+# if more than one test case has them
+SHARED_TEXT_MIN = 256
+
+# characters of a shared text shown at each test case
+SHARED_TEXT_PREVIEW = 120
+
+SharedText = collections.namedtuple("SharedText", ["anchor", "count", "text"])
+
+
+def set_bytecode_cache(directory: "Optional[str]"):
+    """
+    Keep compiled templates in directory so later runs don't compile them again
+    :param directory: None to stop using a bytecode cache
+    :return:
+    """
+    global _BYTECODE_CACHE
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        _BYTECODE_CACHE = _BytecodeCache(directory)
+    else:
+        _BYTECODE_CACHE = None
+    _ENVIRONMENTS.clear()
+
+
+def write_template(template: "Template", stream: "IO[bytes]", **context: "Any"):
+    """
+    Render a template into a binary stream as utf-8, a piece at a time, so
+    the whole page is never held in memory
+    :param template:
+    :param stream:
+    :param context: template variables
+    :return:
+    """
+    write_pieces(template.generate(**context), stream)
+
+
+def write_pieces(pieces: "Iterable[str]", stream: "IO[bytes]"):
+    """
+    Write rendered html to a binary stream as utf-8 in WRITE_CHUNK sized writes
+    :param pieces:
+    :param stream:
+    :return:
+    """
+    encoder = codecs.getincrementalencoder("utf-8")()
+    pending = []
+    size = 0
+    for piece in pieces:
+        pending.append(piece)
+        size += len(piece)
+        if size >= WRITE_CHUNK:
+            stream.write(encoder.encode("".join(pending)))
+            pending = []
+            size = 0
+    stream.write(encoder.encode("".join(pending), final=True))
+
+
+def template_environment(template: "Optional[Union[str,PathLike[str],Sequence[Union[str,PathLike[str]]]]]"=None) -> Environment:
+    """
+    Return the jinja environment loading the packaged templates, or those in the template folder(s)
+    :param template: folder(s) searched first, templates that are not there are loaded from the package
+    :return:
+    """
+    if not template:
+        key: "Any" = None
+    elif isinstance(template, (str, os.PathLike)):
+        key = (os.fspath(template),)
+    else:
+        key = tuple(os.fspath(folder) for folder in template)
+    env = _ENVIRONMENTS.get(key)
+    if env is None:
+        loader: "BaseLoader" = PackageLoader("junit2htmlreport", "templates")
+        if template:
+            # older template folders don't have the templates added since
+            loader = ChoiceLoader([FileSystemLoader(template), loader])
+        env = _ENVIRONMENTS[key] = Environment(
+            loader=loader,
+            autoescape=select_autoescape(["html"]),
+            bytecode_cache=_BYTECODE_CACHE
+        )
+    return env
 
 
 class HTMLReport(object):
     title: str = ""
     report: "Optional[Junit]" = None
     show_toc: bool = True
+    template_name: str = "report.html"
+    stylesheet: "Optional[str]" = None
 
-    def __init__(self, show_toc: bool=True):
+    def __init__(self, show_toc: bool=True, native: bool=True, stylesheet: "Optional[str]"=None):
+        """
+        :param show_toc:
+        :param native: render report.html with render_report() instead of jinja
+        :param stylesheet: link to this stylesheet instead of including the styles in the page
+        """
         self.show_toc = show_toc
+        self.native = native and self.template_name == "report.html"
+        self.stylesheet = stylesheet
+        self._shared_texts: "Optional[Dict[str, SharedText]]" = None
 
     def load(self, report: "Junit", title: str="JUnit2HTML Report"):
         self.report = report
         self.title = title
+        self._shared_texts = None
 
     def __iter__(self):
         if self.report is None:
@@ -30,14 +168,479 @@ class HTMLReport(object):
 
         return self.report.__iter__()
 
+    def context(self) -> "Dict[str, Any]":
+        """
+        Return the template variables
+        :return:
+        """
+        return {"report": self, "title": self.title, "show_toc": self.show_toc, "stylesheet": self.stylesheet}
+
+    def shared_texts(self) -> "Dict[str, SharedText]":
+        """
+        Return the texts written once at the end of the report, see find_shared_texts()
+        :return:
+        """
+        if self._shared_texts is None:
+            assert self.report is not None
+            self._shared_texts = find_shared_texts(self.report.suites)
+        return self._shared_texts
+
+    def text_html(self, text: str) -> "Markup":
+        """
+        Return the <pre> element showing a failure, skip or output text of a test case
+        :param text:
+        :return:
+        """
+        return Markup(_text_html(text, self.shared_texts()))
+
     def __str__(self) -> str:
-        env = Environment(
-            loader=PackageLoader("junit2htmlreport", "templates"),
-            autoescape=select_autoescape(["html"])
-        )
+        if self.native:
+            return "".join(render_report(self))
+        env = template_environment()
+        template = env.get_template(self.template_name)
+        return template.render(**self.context())
+
+    def write_to(self, stream: "IO[bytes]"):
+        """
+        Render the report into a binary stream as utf-8
+        :param stream:
+        :return:
+        """
+        if self.native:
+            write_pieces(render_report(self), stream)
+            return
+        env = template_environment()
+        template = env.get_template(self.template_name)
+        write_template(template, stream, **self.context())
+
+    def write_pages(self, filename: str, jobs: int=1) -> "List[str]":
+        """
+        Write the report as an index page holding the table of contents and
+        failure index, one page per suite next to it, and a shared stylesheet.
+        The suite pages are written by worker processes if there is more than one job.
+        :param filename: the index page
+        :param jobs:
+        :return: the file names of the suite pages
+        """
+        # common imports the parser, which imports this module
+        from .common import map_jobs
+        assert self.report is not None
+        self.report.allocate_anchors()
+        outdir = os.path.dirname(filename)
+        if outdir != "" and not os.path.exists(outdir):
+            os.makedirs(outdir, exist_ok=True)
+        write_stylesheet(outdir)
+        self.stylesheet = STYLESHEET_NAME
+        index = os.path.basename(filename)
+        stem = os.path.splitext(index)[0]
+        pages = ["{}-{}.html".format(stem, suite.anchor()) for suite in self.report.suites]
+        written = list(map_jobs(_suite_page_job, list(zip(pages, self.report.suites)), jobs,
+                                outdir, self.title, index))
+        with open(filename, "wb") as filehandle:
+            write_pieces(render_index_page(self, pages), filehandle)
+        return written
+
+
+def find_shared_texts(suites: "Iterable[Suite]") -> "Dict[str, SharedText]":
+    """
+    Find the failure, skip and output texts of at least SHARED_TEXT_MIN
+    characters that more than one test case has.  These are written once and
+    each test case shows the start of the text and links to it.
+    :param suites:
+    :return: shared texts by content, anchored t1, t2, ... in the order they are first seen
+    """
+    counts: "Dict[str, int]" = {}
+    for suite in suites:
+        for case in suite.all():
+            for text in (case.failure, case.skipped, case.stdout, case.stderr):
+                if text and len(text) >= SHARED_TEXT_MIN:
+                    counts[text] = counts.get(text, 0) + 1
+    shared: "Dict[str, SharedText]" = {}
+    for text, count in counts.items():
+        if count > 1:
+            shared[text] = SharedText("t{}".format(len(shared) + 1), count, str(text))
+    return shared
+
+
+def _text_html(text: str, shared: "Dict[str, SharedText]") -> str:
+    found = shared.get(text) if shared else None
+    if found is None:
+        return "<pre>{}</pre>".format(escape(text))
+    return ('<pre class="shared-text">{}...</pre>'
+            '<a class="shared-link" href="#{}">Full text, shared by {} tests</a>').format(
+        escape(text[:SHARED_TEXT_PREVIEW]), found.anchor, found.count)
+
+
+def _render_shared_texts(shared: "Dict[str, SharedText]") -> str:
+    """
+    Return the section holding the shared texts of a page
+    :param shared:
+    :return:
+    """
+    parts = ['\n<div class="shared-texts">\n    <h2>Shared Output</h2>\n    ']
+    for found in shared.values():
+        parts += ['\n    <a id="', found.anchor, '"></a>\n    <pre>', escape(found.text), "</pre>\n    "]
+    parts.append("\n</div>\n")
+    return "".join(parts)
+
+
+def write_stylesheet(outdir: str) -> str:
+    """
+    Write the shared stylesheet of multi-page output into outdir, unless it is already there
+    :param outdir:
+    :return: the stylesheet path
+    """
+    path = os.path.join(outdir, STYLESHEET_NAME)
+    styles = [_stylesheet()] + [_stylesheet(name) for name in VIEW_STYLESHEETS]
+    content = ("\n\n".join(styles) + "\n").encode("utf-8")
+    try:
+        with open(path, "rb") as filehandle:
+            if filehandle.read() == content:
+                return path
+    except OSError:
+        pass
+    with open(path, "wb") as filehandle:
+        filehandle.write(content)
+    return path
+
+
+def _suite_page_job(item: "Any", outdir: str, title: str, index: str) -> str:
+    """
+    Write the page of one suite of a multi-page report
+    :param item: (page file name, suite)
+    :param outdir:
+    :param title:
+    :param index: file name of the index page
+    :return: the page file name
+    """
+    page, suite = item
+    with open(os.path.join(outdir, page), "wb") as filehandle:
+        write_pieces(render_suite_page(title, suite, index, STYLESHEET_NAME), filehandle)
+    return page
+
+
+_STYLESHEETS: "Dict[str, str]" = {}
+
+
+def _stylesheet(name: str=STYLESHEET_NAME) -> str:
+    """
+    Return a packaged stylesheet as the templates include it
+    :param name:
+    :return:
+    """
+    if name not in _STYLESHEETS:
+        env = template_environment()
+        assert env.loader is not None
+        source = env.loader.get_source(env, name)[0]
+        # jinja drops the last newline of a template
+        _STYLESHEETS[name] = source[:-1] if source.endswith("\n") else source
+    return _STYLESHEETS[name]
+
+
+def _full_text_link(text: "Any", indent: str, stream: str) -> str:
+    link = getattr(text, "link", None)
+    if not link:
+        return indent
+    return '{}<a class="fulltext" href="{}">Full {}</a>'.format(indent, escape(link), stream)
+
+
+def _render_toc(doc: "HTMLReport", pages: "Optional[List[str]]"=None) -> "Iterator[str]":
+    """
+    Yield the table of contents and failure index
+    :param doc:
+    :param pages: the page of each suite, if they are not on this page
+    :return:
+    """
+    yield ('\n<a id="toc"></a>\n<table class="index-table">\n    <tr>\n        <td>\n'
+           '            <ul class="toc">\n            ')
+    for suiteindex, suite in enumerate(doc):
+        page = escape(pages[suiteindex]) if pages else ""
+        yield "\n                "
+        for classname, testclass in suite.classes.items():
+            parts = ["\n                <li>", escape(classname), "\n                <ul>\n                    "]
+            for test in testclass.cases:
+                parts += ['\n                    <li class="outcome outcome-', escape(test.outcome().value),
+                          '"><a href="', page, '#', escape(test.anchor()), '">', escape(test.name), "</a>",
+                          escape(test.display_suffix), "</li>\n                    "]
+            parts.append("\n                </ul>\n                </li>\n                ")
+            yield "".join(parts)
+        yield "\n            "
+    yield ('\n            </ul>\n        </td>\n        <td class="failure-index">\n'
+           '            <ul class="toc">\n            ')
+    for suiteindex, suite in enumerate(doc):
+        page = escape(pages[suiteindex]) if pages else ""
+        yield "\n                "
+        for testclass in suite.classes.values():
+            parts = ["\n                    "]
+            for test in testclass.cases:
+                parts.append("\n                    ")
+                if test.failed():
+                    parts += ['\n                    <li><a href="', page, '#', escape(test.anchor()), '">',
+                              escape(test.prefix()), " ", escape(test.fullname()),
+                              "</a></li>\n                    "]
+                parts.append("\n                    ")
+            parts.append("\n                ")
+            yield "".join(parts)
+        yield "\n            "
+    yield "\n            </ul>\n        </td>\n    </tr>\n</table>\n"
 
-        template = env.get_template("report.html")
-        return template.render(report=self, title=self.title, show_toc=self.show_toc)
+
+def _render_properties(properties: "List[Any]", indent: str) -> "List[str]":
+    parts = ['\n', indent, '<table class="proplist">\n', indent, "    "]
+    for prop in properties:
+        parts += ["\n", indent, "    <tr>\n", indent, "        <th>", escape(prop.name), "</th><td>",
+                  escape(prop.value), "</td>\n", indent, "    </tr>\n", indent, "    "]
+    parts += ["\n", indent, "</table>\n", indent]
+    return parts
+
+
+def _render_case(test: "Case", shared: "Dict[str, SharedText]") -> str:
+    outcome = test.outcome()
+    failed = test.failed()
+    duration = escape(round(test.duration, 3))
+    parts = ['\n                    <div class="test outcome outcome-', escape(outcome.value),
+             '">\n                        <a id="', escape(test.anchor()),
+             '"></a>\n                        <table class="proplist">\n'
+             '                            <tr><th>Test case:</th><td><b>', escape(test.name),
+             '</b></td></tr>\n                            <tr><th>Outcome:</th><td>', escape(outcome.title()),
+             '</td></tr>\n                            <tr><th>Duration:</th><td>', duration,
+             ' sec</td></tr>\n                        ']
+    if failed:
+        parts += ["\n                            <tr><th>Failed</th><td>", escape(test.failure_msg),
+                  "</td></tr>\n                        "]
+    parts.append("\n                        ")
+    if test.skipped:
+        parts += ["\n                            <tr><th>Skipped</th><td>", escape(test.skipped_msg),
+                  "</td></tr>\n                        "]
+    parts.append("\n                        </table>\n\n                        ")
+    if failed:
+        parts += ["\n                        ", _text_html(test.failure, shared), "\n                        "]
+    parts.append("\n                        ")
+    if test.skipped:
+        parts += ["\n                        ", _text_html(test.skipped, shared), "\n                        "]
+    parts.append("\n\n                        ")
+    if test.properties:
+        parts += _render_properties(test.properties, "                        ")
+    parts.append("\n                        ")
+    if test.stdout:
+        parts += ['\n                        <div class="stdout"><i>Stdout</i><br>\n                            ',
+                  _text_html(test.stdout, shared), "\n",
+                  _full_text_link(test.stdout, "                            ", "stdout"),
+                  "\n                        </div>\n                        "]
+    parts.append("\n                        ")
+    if test.stderr:
+        parts += ['\n                        <div class="stderr"><i>Stderr</i><br>\n                            ',
+                  _text_html(test.stderr, shared), "\n",
+                  _full_text_link(test.stderr, "                            ", "stderr"),
+                  "\n                        </div>\n                        "]
+    parts.append("\n                    </div>\n                ")
+    return "".join(parts)
+
+
+def _render_suite(suite: "Suite", shared: "Dict[str, SharedText]") -> "Iterator[str]":
+    parts = ['\n    <div class="testsuite">\n        <h2>Test Suite: ', escape(suite.name),
+             '</h2>\n        <a id="', escape(suite.anchor()), '"></a>\n        ']
+    if suite.package:
+        parts += ["\n        <span>Package: ", escape(suite.package), "</span>\n        "]
+    parts.append("\n        ")
+    if suite.properties:
+        parts += ["\n        <h3>Suite Properties</h3>"]
+        parts += _render_properties(suite.properties, "        ")
+    parts += ['\n        <h3>Results</h3>\n        <table class="proplist">\n            <tr>\n'
+              '                <th>Duration</th><td>', escape(round(suite.duration, 3)),
+              ' sec</td>\n            </tr>\n            <tr>\n                <th>Tests</th><td>',
+              escape(len(suite.all())), '</td>\n            </tr>\n            <tr>\n'
+              '                <th>Failures</th><td>', escape(len(suite.failed())),
+              '</td>\n            </tr>\n        </table>\n\n        <div class="testclasses">\n'
+              '            <h3>Tests</h3>\n            ']
+    yield "".join(parts)
+    for classname, testclass in suite.classes.items():
+        yield ('\n            <div class="testclass">\n                <h4>{}</h4>\n'
+               '                <div class="testcases">\n                ').format(escape(classname))
+        for test in testclass.cases:
+            yield _render_case(test, shared)
+        yield "\n                </div>\n            </div>\n            "
+    parts = ["\n        </div>\n    </div>\n    "]
+    if suite.stdout or suite.stderr:
+        parts += ['\n        <h3>Suite stdout:</h3>\n        <pre class="stdio">', escape(suite.stdout),
+                  "</pre>\n", _full_text_link(suite.stdout, "        ", "stdout"),
+                  '\n        <h3>Suite stderr:</h3>\n        <pre class="stdio">', escape(suite.stderr),
+                  "</pre>\n", _full_text_link(suite.stderr, "        ", "stderr"), "\n    "]
+    parts.append("\n")
+    yield "".join(parts)
+
+
+_PAGE_FOOTER = '\n\n<p class="footer">\n    Generated by junit2html\n</p>\n</body>\n</html>'
+
+
+def _page_head(title: str, stylesheet: "Optional[str]", view: "Optional[str]"=None) -> "Iterator[str]":
+    """
+    Yield the start of a page, as base.html writes it
+    :param title:
+    :param stylesheet: link to this stylesheet, or None to include the styles
+    :param view: also include this one of VIEW_STYLESHEETS if the styles are included
+    :return:
+    """
+    yield '<!DOCTYPE html>\n<html lang="en">\n<head>\n    <meta charset="UTF-8">\n    <title>{}</title>\n    '.format(
+        escape(title))
+    if stylesheet:
+        yield '<link rel="stylesheet" type="text/css" href="{}">'.format(escape(stylesheet))
+    else:
+        yield '<style type="text/css">\n        '
+        yield _stylesheet()
+        yield "\n    </style>"
+        if view:
+            yield '<style type="text/css">\n        {}\n    </style>'.format(_stylesheet(view))
+    yield "\n</head>\n<body>\n    "
+
+
+def render_report(doc: "HTMLReport") -> "Iterator[str]":
+    """
+    Yield the html of the packaged report.html template piece by piece,
+    without going through jinja.  The output is the same as the template's.
+    :param doc:
+    :return:
+    """
+    assert doc.report is not None
+    shared = doc.shared_texts()
+    yield from _page_head(doc.title, doc.stylesheet, "styles-shared-text.css" if shared else None)
+    yield "\n<h1>\n    Test Report : {}\n</h1>\n\n".format(escape(doc.title))
+    if doc.show_toc:
+        yield from _render_toc(doc)
+    yield "\n\n"
+    for suite in doc:
+        yield from _render_suite(suite, shared)
+    yield "\n"
+    if shared:
+        yield _render_shared_texts(shared)
+    yield _PAGE_FOOTER
+
+
+def render_index_page(doc: "HTMLReport", pages: "List[str]") -> "Iterator[str]":
+    """
+    Yield the index page of a multi-page report: the table of contents and
+    failure index linking into the suite pages, and a list of the suites.
+    Links to the anchors of suites and cases on the index page are sent on
+    to the page holding them.
+    :param doc:
+    :param pages: the page of each suite
+    :return:
+    """
+    assert doc.report is not None
+    yield from _page_head(doc.title, doc.stylesheet)
+    yield "\n<h1>\n    Test Report : {}\n</h1>\n\n".format(escape(doc.title))
+    if doc.show_toc:
+        yield from _render_toc(doc, pages)
+    parts = ['\n<table class="proplist">\n    <tr>\n        <th>Test Suite</th><th>Tests</th>'
+             '<th>Failures</th><th>Skipped</th><th>Duration</th>\n    </tr>\n']
+    for page, suite in zip(pages, doc):
+        parts += ['    <tr>\n        <td><a href="', escape(page), '">', escape(suite.name), "</a></td>\n        <td>",
+                  escape(len(suite.all())), "</td>\n        <td>", escape(len(suite.failed())), "</td>\n        <td>",
+                  escape(len(suite.skipped())), "</td>\n        <td>", escape(round(suite.duration, 3)),
+                  " sec</td>\n    </tr>\n"]
+    anchors = {suite.anchor(): page for page, suite in zip(pages, doc)}
+    parts += ["</table>\n<script>\n(function () {\n    var pages = ", script_json(anchors), ";\n"
+              "    var match = /^#(s[0-9]+)(c[0-9]+)?$/.exec(window.location.hash);\n"
+              "    if (match && pages[match[1]]) {\n"
+              "        window.location.replace(pages[match[1]] + window.location.hash);\n"
+              "    }\n})();\n</script>\n"]
+    yield "".join(parts)
+    yield _PAGE_FOOTER
+
+
+def render_suite_page(title: str, suite: "Suite", index: str, stylesheet: "Optional[str]") -> "Iterator[str]":
+    """
+    Yield the page of one suite of a multi-page report
+    :param title: report title
+    :param suite:
+    :param index: file name of the index page
+    :param stylesheet:
+    :return:
+    """
+    shared = find_shared_texts([suite])
+    yield from _page_head("{} : {}".format(title, suite.name), stylesheet,
+                          "styles-shared-text.css" if shared else None)
+    yield '\n<h1>\n    Test Report : {}\n</h1>\n<p><a href="{}">Index</a></p>\n'.format(
+        escape(title), escape(index))
+    yield from _render_suite(suite, shared)
+    if shared:
+        yield _render_shared_texts(shared)
+    yield _PAGE_FOOTER
+
+
+def script_json(value: "Any") -> str:
+    """
+    Return value as json that is safe to put inside a <script> element
+    :param value:
+    :return:
+    """
+    text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return text.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+
+
+class HTMLCompactReport(HTMLReport):
+    """
+    A report for very large numbers of cases.  The cases are embedded once as
+    columns of json, with outcomes as indexes into a list of outcome names and
+    class names as indexes into a list of classes, and a small script draws
+    only the rows in view and filters them by name and outcome.
+    """
+    template_name: str = "report-compact.html"
+
+    def context(self) -> "Dict[str, Any]":
+        context = super(HTMLCompactReport, self).context()
+        context["data"] = self.data()
+        return context
+
+    def data(self) -> "Iterator[str]":
+        """
+        Yield the json data island piece by piece.  Each case is at the same
+        position in the suite, class, name, outcome and time columns, and
+        details holds [position, failure message, failure, skipped message,
+        skipped, stdout, stderr, stdout link, stderr link, properties] for the
+        cases that have any of them.  The failure, skipped, stdout and stderr
+        texts are indexes into texts, which holds each distinct text once.
+        :return:
+        """
+        assert self.report is not None
+        outcomes: "Dict[str, int]" = {}
+        classes: "Dict[str, int]" = {}
+        columns: "Dict[str, List[Any]]" = {"suite": [], "class": [], "name": [], "outcome": [], "time": []}
+        texts: "Dict[str, int]" = {}
+        details = []
+
+        def text_index(text: "Optional[str]") -> "Optional[int]":
+            if text is None:
+                return None
+            return texts.setdefault(text, len(texts))
+
+        for suiteindex, suite in enumerate(self.report.suites):
+            for case in suite.all():
+                position = len(columns["name"])
+                classname = "" if case.testclass is None or case.testclass.name is None else case.testclass.name
+                outcome = case.outcome().value
+                columns["suite"].append(suiteindex)
+                columns["class"].append(classes.setdefault(classname, len(classes)))
+                columns["name"].append(case.name or "")
+                columns["outcome"].append(outcomes.setdefault(outcome, len(outcomes)))
+                columns["time"].append(round(case.duration, 3) if math.isfinite(case.duration) else 0)
+                if case.failed() or case.skipped or case.stdout or case.stderr or case.properties:
+                    details.append([position, case.failure_msg, text_index(case.failure), case.skipped_msg,
+                                    text_index(case.skipped), text_index(case.stdout), text_index(case.stderr),
+                                    getattr(case.stdout, "link", None), getattr(case.stderr, "link", None),
+                                    [[prop.name, prop.value] for prop in case.properties]])
+
+        yield '{"outcomes":' + script_json(list(outcomes))
+        yield ',"classes":' + script_json(list(classes))
+        for name, column in columns.items():
+            yield ',"{}":'.format(name) + script_json(column)
+        yield ',"details":['
+        for number, detail in enumerate(details):
+            yield ("," if number else "") + script_json(detail)
+        yield '],"texts":['
+        for number, text in enumerate(texts):
+            yield ("," if number else "") + script_json(text)
+        yield ']}'
 
 
 class HTMLMatrix(object):
@@ -45,19 +648,102 @@ class HTMLMatrix(object):
     matrix: "ReportMatrix"
     template: "Optional[Union[str,PathLike[str],Sequence[Union[str,PathLike[str]]]]]"
 
-    def __init__(self, matrix: "ReportMatrix", template:"Optional[Union[str,PathLike[str],Sequence[Union[str,PathLike[str]]]]]"=None):
+    def __init__(self, matrix: "ReportMatrix", template:"Optional[Union[str,PathLike[str],Sequence[Union[str,PathLike[str]]]]]"=None,
+                 stylesheet: "Optional[str]"=None):
         self.matrix = matrix
         self.template = template
+        self.stylesheet = stylesheet
 
     def __str__(self) -> str:
-        if self.template:
-            loader = FileSystemLoader(self.template)
-        else:
-            loader = PackageLoader("junit2htmlreport", "templates")
-        env = Environment(
-            loader=loader,
-            autoescape=select_autoescape(["html"])
-        )
+        env = template_environment(self.template)
+        template = env.get_template("matrix.html")
+        return template.render(matrix=self.matrix, title=self.title, stylesheet=self.stylesheet)
 
+    def write_to(self, stream: "IO[bytes]"):
+        """
+        Render the matrix into a binary stream as utf-8
+        :param stream:
+        :return:
+        """
+        env = template_environment(self.template)
         template = env.get_template("matrix.html")
-        return template.render(matrix=self.matrix, title=self.title)
+        write_template(template, stream, matrix=self.matrix, title=self.title, stylesheet=self.stylesheet)
+
+
+class HTMLMatrixPage(object):
+    """
+    One page of a paginated matrix, rendered from plain rows so pages can be
+    rendered in worker processes without the matrix itself
+    """
+    title: str = "JUnit Matrix"
+    template: "Optional[Union[str,PathLike[str],Sequence[Union[str,PathLike[str]]]]]"
+
+    def __init__(self, page: "Any", template: "Optional[Union[str,PathLike[str],Sequence[Union[str,PathLike[str]]]]]"=None,
+                 stylesheet: "Optional[str]"=None):
+        """
+        :param page: a MatrixPage
+        :param template:
+        :param stylesheet: link to this stylesheet instead of including the styles in the page
+        """
+        self.page = page
+        self.template = template
+        self.stylesheet = stylesheet
+
+    def __str__(self) -> str:
+        env = template_environment(self.template)
+        template = env.get_template("matrix-page.html")
+        return template.render(page=self.page, title=self.title, stylesheet=self.stylesheet)
+
+    def write_to(self, stream: "IO[bytes]"):
+        """
+        Render the page into a binary stream as utf-8
+        :param stream:
+        :return:
+        """
+        env = template_environment(self.template)
+        template = env.get_template("matrix-page.html")
+        write_template(template, stream, page=self.page, title=self.title, stylesheet=self.stylesheet)
+
+
+class HTMLMatrixIndex(object):
+    """
+    The index page of a paginated matrix
+    """
+    title: str = "JUnit Matrix"
+    matrix: "ReportMatrix"
+    template: "Optional[Union[str,PathLike[str],Sequence[Union[str,PathLike[str]]]]]"
+
+    def __init__(self, matrix: "ReportMatrix", pages: "Any", classes: "Any", outcomes: "Any",
+                 template: "Optional[Union[str,PathLike[str],Sequence[Union[str,PathLike[str]]]]]"=None,
+                 stylesheet: "Optional[str]"=None):
+        """
+        :param matrix:
+        :param pages: the MatrixPages of the matrix
+        :param classes: the MatrixClass of each test class
+        :param outcomes: the combined outcomes counted in classes
+        :param template:
+        :param stylesheet: link to this stylesheet instead of including the styles in the page
+        """
+        self.matrix = matrix
+        self.pages = pages
+        self.classes = classes
+        self.outcomes = outcomes
+        self.template = template
+        self.stylesheet = stylesheet
+
+    def __str__(self) -> str:
+        env = template_environment(self.template)
+        template = env.get_template("matrix-index.html")
+        return template.render(matrix=self.matrix, pages=self.pages, classes=self.classes,
+                               outcomes=self.outcomes, title=self.title, stylesheet=self.stylesheet)
+
+    def write_to(self, stream: "IO[bytes]"):
+        """
+        Render the index into a binary stream as utf-8
+        :param stream:
+        :return:
+        """
+        env = template_environment(self.template)
+        template = env.get_template("matrix-index.html")
+        write_template(template, stream, matrix=self.matrix, pages=self.pages, classes=self.classes,
+                       outcomes=self.outcomes, title=self.title, stylesheet=self.stylesheet)
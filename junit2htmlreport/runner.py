@@ -5,12 +5,14 @@ from typing import TYPE_CHECKING
 
 import os
 import sys
+import xml.etree.ElementTree as ET
 from argparse import ArgumentParser
 
-from . import matrix, merge, parser
+from . import cache, capture, common, matrix, merge, parserimpl, render
+from .parser import ParserError
 
 if TYPE_CHECKING:
-    from typing import List
+    from typing import Any, Dict, List
 
 PARSER = ArgumentParser(prog="junit2html")
 
@@ -18,22 +20,48 @@ PARSER.add_argument("--summary-matrix", dest="text_matrix", action="store_true",
                     default=False,
                     help="Render multiple result files to the console")
 
+PARSER.add_argument("--summary-format", dest="summary_format", type=str, default="text",
+                    choices=["text", "csv", "tsv"],
+                    help="With --summary-matrix, write the matrix as text or as a table of "
+                         "class, case, one column per report and the combined result")
+
+PARSER.add_argument("--summary-output", dest="summary_output", type=str,
+                    metavar="FILE",
+                    help="With --summary-matrix, write the matrix to FILE instead of the console")
+
 PARSER.add_argument("--report-matrix", dest="html_matrix", type=str,
                     metavar="REPORT",
                     help="Generate an HTML report matrix")
 
+PARSER.add_argument("--matrix-page-rows", dest="page_rows", type=int,
+                    metavar="N",
+                    help="Write --report-matrix as an index page with per class counts and pages of at most N "
+                         "test cases next to it (0 for one page per test class), rendered using --jobs processes")
+
 PARSER.add_argument("--max-failures", dest="fail", type=int, default=0,
                     metavar="FAILURES",
-                    help="Exit non-zero if FAILURES or more test cases are failures (has no effect with --merge)")
+                    help="Exit non-zero if FAILURES or more test cases are failures (with --merge, of the "
+                         "merged report)")
 
 PARSER.add_argument("--max-skipped", dest="skip", type=int, default=0,
                     metavar="SKIPPED",
-                    help="Exit non-zero if SKIPPED or more test cases are skipped (has no effect with --merged)")
+                    help="Exit non-zero if SKIPPED or more test cases are skipped (with --merge, of the "
+                         "merged report)")
+
+PARSER.add_argument("--matrix-state", dest="matrix_state", type=str,
+                    metavar="STATE",
+                    help="Keep the matrix in STATE between runs, only parsing reports that are new or changed "
+                         "and dropping axes whose reports are no longer given")
 
 PARSER.add_argument("--merge", dest="merge_output", type=str,
                     metavar="NEWREPORT",
                     help="Merge multiple test results into one file")
 
+PARSER.add_argument("--incremental", dest="incremental", action="store_true",
+                    default=False,
+                    help="With --merge, append new reports to NEWREPORT from an earlier --incremental merge, "
+                         "skipping reports it already holds")
+
 PARSER.add_argument("--reports-template-folder", dest="template_folder", type=str,
                     help="Render reports with these templates")
 
@@ -41,6 +69,59 @@ PARSER.add_argument("--hide-toc", dest="hide_toc", action="store_true",
                     default=False,
                     help="Don't include a table-of-contents in the HTML report")
 
+PARSER.add_argument("--compact", dest="compact", action="store_true",
+                    default=False,
+                    help="Render the report as a searchable list that only draws the test cases in view, "
+                         "for reports with very many test cases")
+
+PARSER.add_argument("--multi-page", dest="multipage", action="store_true",
+                    default=False,
+                    help="Write each report as an index page and a page per test suite, all linking to one "
+                         "styles.css instead of including the styles (with --jobs, pages are written in parallel)")
+
+PARSER.add_argument("--streaming", dest="streaming", action="store_true",
+                    default=False,
+                    help="Parse reports incrementally instead of loading the whole xml document into memory "
+                         "(with --merge, the <testsuites> tag is padded with spaces, so the output is not "
+                         "byte for byte the same)")
+
+PARSER.add_argument("--parser", dest="backend", type=str, default="auto",
+                    choices=["auto", "etree", "iterparse", "expat", "lxml"],
+                    help="XML parser backend, auto uses lxml if it is installed (etree can't be used "
+                         "with --streaming or --incremental)")
+
+PARSER.add_argument("--cache-dir", dest="cache_dir", type=str,
+                    metavar="DIR",
+                    help="Keep parsed copies of the reports, and the compiled html templates, in DIR "
+                         "and reuse them while the files are unchanged")
+
+PARSER.add_argument("--cache-size", dest="cache_size", type=int, default=512,
+                    metavar="MB",
+                    help="Remove the least recently used entries once the cache is bigger than MB megabytes")
+
+PARSER.add_argument("--cache-hash", dest="cache_hash", action="store_true",
+                    default=False,
+                    help="Also key cache entries by a hash of the report content")
+
+PARSER.add_argument("--capture-limit", dest="capture_limit", type=int,
+                    metavar="KB",
+                    help="Keep at most KB kilobytes (thousands of characters) of each system-out/system-err, "
+                         "showing the start and end of longer output")
+
+PARSER.add_argument("--capture-dir", dest="capture_dir", type=str,
+                    metavar="DIR",
+                    help="With --capture-limit, save the full text of longer output to files in DIR "
+                         "and link to them from the report")
+
+PARSER.add_argument("--jobs", dest="jobs", type=int, default=1,
+                    metavar="N",
+                    help="Parse reports for --summary-matrix/--report-matrix, or in folders given to --merge, "
+                         "using N processes")
+
+PARSER.add_argument("--check-only", dest="check_only", action="store_true",
+                    default=False,
+                    help="Only apply --max-failures/--max-skipped, reading the reports without rendering anything")
+
 PARSER.add_argument("REPORTS", metavar="REPORT", type=str, nargs="+",
                     help="Test file to read")
 
@@ -48,6 +129,62 @@ PARSER.add_argument("OUTPUT", type=str, nargs="?",
                     help="Filename to save the html as")
 
 
+def add_capture_policy(opts: "Any", parser_options: "Dict[str, Any]", htmldir: str) -> "Dict[str, Any]":
+    """
+    Return parser options limiting captured output as requested on the command line
+    :param opts:
+    :param parser_options:
+    :param htmldir: folder the html will be written to, spilled output is linked relative to it
+    :return:
+    """
+    if not opts.capture_limit:
+        return parser_options
+    link_base = None
+    if opts.capture_dir:
+        link_base = os.path.relpath(opts.capture_dir, htmldir or os.curdir)
+    options = dict(parser_options)
+    options["capture"] = capture.CapturePolicy(opts.capture_limit * 1024,
+                                               spill_dir=opts.capture_dir,
+                                               link_base=link_base)
+    return options
+
+
+def add_matrix_reports(opts: "Any", util: "matrix.ReportMatrix", inputs: "List[str]", **options: "Any"):
+    """
+    Add the input reports to a matrix, reusing and updating the saved --matrix-state if given
+    :param opts:
+    :param util:
+    :param inputs:
+    :param options: keyword arguments for add_reports()
+    :return:
+    """
+    if not opts.matrix_state:
+        util.add_reports(inputs, **options)
+        return
+    if os.path.exists(opts.matrix_state):
+        try:
+            util.load_state(opts.matrix_state)
+        except ValueError as err:
+            print("ignoring {}".format(err), file=sys.stderr)
+    util.update_reports(inputs, **options)
+    util.save_state(opts.matrix_state)
+
+
+def add_merge_reports(util: "merge.StreamingMerger", inputs: "List[str]"):
+    """
+    Add the input reports to a streaming merge, exiting with an error message
+    if one of them can't be parsed
+    :param util:
+    :param inputs:
+    :return:
+    """
+    for inputfile in inputs:
+        try:
+            util.add_report(inputfile)
+        except (ParserError, ET.ParseError) as err:
+            PARSER.exit(1, "{}: error: can't merge {}: {}\n".format(PARSER.prog, inputfile, err))
+
+
 def run(args: "List[str]"):
     """
     Run this tool
@@ -55,37 +192,72 @@ def run(args: "List[str]"):
     :return:
     """
     opts = PARSER.parse_args(args) if args else PARSER.parse_args()
+    if opts.backend == "etree" and (opts.streaming or (opts.merge_output and opts.incremental)):
+        PARSER.error("--parser etree can't be used with --streaming or --incremental")
     inputs = opts.REPORTS
+    parser_options = {"streaming": opts.streaming, "backend": opts.backend}
+    if opts.cache_dir:
+        parser_options["cache"] = cache.ReportCache(opts.cache_dir,
+                                                    max_bytes=opts.cache_size * 1024 * 1024,
+                                                    use_hash=opts.cache_hash)
+        render.set_bytecode_cache(os.path.join(opts.cache_dir, "templates"))
     util = None
-    if opts.merge_output:
-        util = merge.Merger()
+    if opts.check_only:
+        util = common.ResultCounter()
+        for filename in inputs:
+            util.add_report(filename)
+    elif opts.merge_output and opts.incremental:
+        try:
+            util = merge.IncrementalMerger(opts.merge_output, backend=opts.backend)
+        except ValueError as err:
+            PARSER.error(str(err))
+        try:
+            add_merge_reports(util, inputs)
+        except SystemExit:
+            util.abandon()
+            raise
+        util.finish()
+    elif opts.merge_output and opts.streaming:
+        with open(opts.merge_output, "wb") as outfile:
+            util = merge.StreamingMerger(outfile, backend=opts.backend)
+            add_merge_reports(util, inputs)
+            util.finish()
+    elif opts.merge_output:
+        util = merge.Merger(jobs=opts.jobs, **parser_options)
         for inputfile in inputs:
             util.add_report(inputfile)
 
-        xmltext = util.toxmlstring()
-        with open(opts.merge_output, "w") as outfile:
-            outfile.write(xmltext)
+        util.write_xmlfile(opts.merge_output)
     elif opts.text_matrix:
-        util = matrix.TextReportMatrix()
-        for filename in inputs:
-            util.add_report(filename)
-        print(util.summary())
+        util = matrix.TextReportMatrix(jobs=opts.jobs, **add_capture_policy(opts, parser_options, os.curdir))
+        add_matrix_reports(opts, util, inputs)
+        if opts.summary_output:
+            with open(opts.summary_output, "w", encoding="utf-8", newline="") as outfile:
+                util.write_summary(outfile, opts.summary_format)
+        else:
+            util.write_summary(sys.stdout, opts.summary_format)
+            if opts.summary_format == "text":
+                sys.stdout.write("\n")
     elif opts.html_matrix:
-        util = matrix.HtmlReportMatrix(os.path.dirname(opts.html_matrix))
-        for filename in inputs:
-            util.add_report(filename, show_toc=not opts.hide_toc)
-        with open(opts.html_matrix, "w") as outfile:
-            outfile.write(util.summary(opts.template_folder))
+        outdir = os.path.dirname(opts.html_matrix)
+        util = matrix.HtmlReportMatrix(outdir, jobs=opts.jobs, multipage=opts.multipage,
+                                       **add_capture_policy(opts, parser_options, outdir))
+        add_matrix_reports(opts, util, inputs, show_toc=not opts.hide_toc)
+        if opts.page_rows is not None:
+            util.write_pages(opts.html_matrix, opts.template_folder, opts.page_rows or None)
+        else:
+            with open(opts.html_matrix, "wb") as outfile:
+                util.write_html(outfile, opts.template_folder)
 
     if util:
         if opts.fail:
-            failed = util.failures()
-            if len(failed) >= opts.fail:
-                sys.exit(len(failed))
+            failed = util.failure_count()
+            if failed >= opts.fail:
+                sys.exit(failed)
         if opts.skip:
-            skipped = util.skips()
-            if len(skipped) >= opts.fail:
-                sys.exit(len(skipped))
+            skipped = util.skip_count()
+            if skipped >= opts.skip:
+                sys.exit(skipped)
 
     if not util:
         # legacy interface that we need to preserve
@@ -102,13 +274,15 @@ def run(args: "List[str]"):
         else:
             outfilename = infilename + ".html"
 
-        report = parser.Junit(infilename)
-        html = report.html(show_toc=not opts.hide_toc)
-        if report.filename is not None:
+        report = parserimpl.load_report(infilename, **add_capture_policy(opts, parser_options,
+                                                                         os.path.dirname(outfilename)))
+        if report.filename is not None and opts.multipage:
+            report.write_html_pages(outfilename, show_toc=not opts.hide_toc, jobs=opts.jobs)
+        elif report.filename is not None:
             with open(outfilename, "wb") as outfile:
-                outfile.write(html.encode('utf-8'))
+                report.write_html(outfile, show_toc=not opts.hide_toc, compact=opts.compact)
         else:
-            print(html.encode('utf-8'))
+            print(report.html(show_toc=not opts.hide_toc, compact=opts.compact).encode('utf-8'))
 
 
 def start():
@@ -0,0 +1,155 @@
+"""
+Open report files that may be compressed or bundled in an archive
+"""
+from typing import TYPE_CHECKING
+
+import bz2
+import codecs
+import gzip
+import lzma
+import os
+import re
+import tarfile
+import zipfile
+
+if TYPE_CHECKING: # pragma: no cover
+    from typing import IO, Iterator, Tuple
+
+# leading bytes of each compressed stream format we can read
+MAGIC_OPENERS = [
+    (b"\x1f\x8b", gzip.GzipFile),
+    (b"BZh", bz2.BZ2File),
+    (b"\xfd7zXZ\x00", lzma.LZMAFile),
+]
+
+# bytes read from the start of a file to decide if it is a junit report
+SNIFF_BYTES = 512
+
+# the xml declaration, comments, processing instructions and doctype that may come before the root
+_PROLOG = re.compile(r"\s*(<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>)", re.DOTALL)
+
+_JUNIT_ROOT = re.compile(r"\s*<(testsuites|testsuite|testrun)[\s/>]")
+
+
+def _opener_for(head: bytes):
+    """
+    Return the decompressing file class for a stream starting with head, or None
+    :param head:
+    :return:
+    """
+    for magic, opener in MAGIC_OPENERS:
+        if head.startswith(magic):
+            return opener
+    return None
+
+
+def decompress(stream: "IO[bytes]") -> "IO[bytes]":
+    """
+    Wrap a binary stream that supports peek() in a decompressing reader if it
+    holds gzip, bzip2 or xz data, otherwise return it unchanged
+    :param stream:
+    :return:
+    """
+    opener = _opener_for(stream.peek(6)[:6])
+    if opener is None:
+        return stream
+    return opener(fileobj=stream)
+
+
+def open_report(filename: str) -> "IO[bytes]":
+    """
+    Open a report file for reading as bytes, decompressing it on the fly if
+    it is gzip, bzip2 or xz compressed.  Nothing is extracted to disk.
+    :param filename:
+    :return:
+    """
+    with open(filename, "rb") as infile:
+        head = infile.read(6)
+    opener = _opener_for(head)
+    if opener is None:
+        return open(filename, "rb")
+    return opener(filename, "rb")
+
+
+def looks_like_junit(head: bytes) -> bool:
+    """
+    Return True if head, the first few hundred bytes of an uncompressed
+    file, starts a <testsuites>, <testsuite> or <testrun> document
+    :param head:
+    :return:
+    """
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        text = head.decode("utf-16", errors="ignore")
+    elif head[:2] in (b"<\x00", b"\x00<"):
+        text = head.decode("utf-16-le" if head[0] else "utf-16-be", errors="ignore")
+    else:
+        text = head.decode("utf-8", errors="ignore")
+    text = text.lstrip("\ufeff")
+    position = 0
+    while True:
+        match = _PROLOG.match(text, position)
+        if match is None:
+            break
+        position = match.end()
+    return _JUNIT_ROOT.match(text, position) is not None
+
+
+def sniff_report(filename: str) -> bool:
+    """
+    Cheaply check if a file could hold junit reports, by reading the start
+    of it (decompressed if needed).  Archives are assumed to hold reports.
+    :param filename:
+    :return:
+    """
+    try:
+        if is_archive(filename):
+            return True
+        with open_report(filename) as infile:
+            head = infile.read(SNIFF_BYTES)
+    except (OSError, EOFError, lzma.LZMAError):
+        return False
+    return looks_like_junit(head)
+
+
+def is_archive(filename: str) -> bool:
+    """
+    Return True if filename is a zip or tar (optionally compressed) archive
+    :param filename:
+    :return:
+    """
+    if not os.path.isfile(filename):
+        return False
+    if zipfile.is_zipfile(filename):
+        return True
+    try:
+        return tarfile.is_tarfile(filename)
+    except (OSError, EOFError, tarfile.TarError, lzma.LZMAError):
+        return False
+
+
+def iter_archive(filename: str) -> "Iterator[Tuple[str, IO[bytes]]]":
+    """
+    Walk the regular files in a zip or tar archive in place, yielding the
+    name and a readable stream for each member.  Compressed members are
+    decompressed on the fly.  Each stream is only valid until the next
+    member is requested.
+    :param filename:
+    :return:
+    """
+    if zipfile.is_zipfile(filename):
+        with zipfile.ZipFile(filename) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, decompress(member)
+    else:
+        with tarfile.open(filename, "r:*") as archive:
+            for info in archive:
+                if not info.isfile():
+                    continue
+                member = archive.extractfile(info)
+                if member is None: # pragma: no cover
+                    continue
+                with member:
+                    yield info.name, decompress(member)
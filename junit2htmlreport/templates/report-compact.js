@@ -0,0 +1,186 @@
+(function () {
+    "use strict";
+    var ROW_HEIGHT = 22;
+    var data = JSON.parse(document.getElementById("report-data").textContent);
+    var view = document.getElementById("compact-view");
+    var rows = document.getElementById("compact-rows");
+    var search = document.getElementById("compact-search");
+    var outcomeSelect = document.getElementById("compact-outcome");
+    var count = document.getElementById("compact-count");
+    var detail = document.getElementById("compact-detail");
+    var total = data.name.length;
+    var details = {};
+    var suiteStart = [];
+    var keys = null;
+    var shown = [];
+    var selected = -1;
+    var index;
+
+    for (index = 0; index < data.details.length; index++) {
+        details[data.details[index][0]] = data.details[index];
+    }
+    for (index = 0; index < total; index++) {
+        if (suiteStart[data.suite[index]] === undefined) {
+            suiteStart[data.suite[index]] = index;
+        }
+    }
+
+    var counts = data.outcomes.map(function () { return 0; });
+    for (index = 0; index < total; index++) {
+        counts[data.outcome[index]]++;
+    }
+    data.outcomes.forEach(function (outcome, number) {
+        var option = document.createElement("option");
+        option.value = number;
+        option.textContent = (outcome || "unknown") + " (" + counts[number] + ")";
+        outcomeSelect.appendChild(option);
+    });
+
+    function anchor(position) {
+        var suite = data.suite[position];
+        return "s" + suite + "c" + (position - suiteStart[suite]);
+    }
+
+    function outcomeClass(position) {
+        return "outcome-" + data.outcomes[data.outcome[position]].replace(/ /g, "-");
+    }
+
+    function element(tag, className, text) {
+        var node = document.createElement(tag);
+        if (className) {
+            node.className = className;
+        }
+        if (text !== undefined && text !== null) {
+            node.textContent = text;
+        }
+        return node;
+    }
+
+    function draw() {
+        var first = Math.max(0, Math.floor(view.scrollTop / ROW_HEIGHT) - 10);
+        var last = Math.min(shown.length, first + Math.ceil(view.clientHeight / ROW_HEIGHT) + 20);
+        var fragment = document.createDocumentFragment();
+        for (var row = first; row < last; row++) {
+            var position = shown[row];
+            var line = element("div", "compact-row " + outcomeClass(position) +
+                (position === selected ? " compact-selected" : ""));
+            line.style.top = (row * ROW_HEIGHT) + "px";
+            line.setAttribute("data-position", position);
+            line.appendChild(element("span", "compact-class", data.classes[data["class"][position]]));
+            line.appendChild(element("span", "compact-name", data.name[position]));
+            line.appendChild(element("span", "compact-time", data.time[position] + " sec"));
+            fragment.appendChild(line);
+        }
+        rows.textContent = "";
+        rows.appendChild(fragment);
+    }
+
+    function filter() {
+        var text = search.value.toLowerCase();
+        var outcome = outcomeSelect.value === "" ? -1 : parseInt(outcomeSelect.value, 10);
+        if (text && keys === null) {
+            keys = new Array(total);
+            for (var key = 0; key < total; key++) {
+                keys[key] = (data.classes[data["class"][key]] + " " + data.name[key]).toLowerCase();
+            }
+        }
+        shown = [];
+        for (var position = 0; position < total; position++) {
+            if (outcome >= 0 && data.outcome[position] !== outcome) {
+                continue;
+            }
+            if (text && keys[position].indexOf(text) < 0) {
+                continue;
+            }
+            shown.push(position);
+        }
+        count.textContent = shown.length + " of " + total + " tests";
+        rows.style.height = (shown.length * ROW_HEIGHT) + "px";
+        draw();
+    }
+
+    function sharedText(index) {
+        return index === null ? null : data.texts[index];
+    }
+
+    function addText(title, text, link) {
+        if (text === null || text === undefined || text === "") {
+            return;
+        }
+        detail.appendChild(element("h4", null, title));
+        detail.appendChild(element("pre", null, text));
+        if (link) {
+            var full = element("a", "fulltext", "Full " + title.toLowerCase());
+            full.href = link;
+            detail.appendChild(full);
+        }
+    }
+
+    function select(position) {
+        selected = position;
+        var info = details[position] || [position, null, null, null, null, null, null, null, null, []];
+        detail.textContent = "";
+        detail.className = "compact-detail " + outcomeClass(position);
+        var table = element("table", "proplist");
+        var fields = [
+            ["Test case:", data.name[position]],
+            ["Class:", data.classes[data["class"][position]]],
+            ["Outcome:", data.outcomes[data.outcome[position]]],
+            ["Duration:", data.time[position] + " sec"]
+        ];
+        if (info[1] !== null) {
+            fields.push(["Failed", info[1]]);
+        }
+        if (info[3] !== null) {
+            fields.push(["Skipped", info[3]]);
+        }
+        info[9].forEach(function (prop) {
+            fields.push([prop[0], prop[1]]);
+        });
+        fields.forEach(function (field) {
+            var tr = element("tr");
+            tr.appendChild(element("th", null, field[0]));
+            tr.appendChild(element("td", null, field[1]));
+            table.appendChild(tr);
+        });
+        detail.appendChild(table);
+        addText("Failure", sharedText(info[2]));
+        addText("Skipped", sharedText(info[4]));
+        addText("Stdout", sharedText(info[5]), info[7]);
+        addText("Stderr", sharedText(info[6]), info[8]);
+        if (window.history && window.history.replaceState) {
+            window.history.replaceState(null, "", "#" + anchor(position));
+        }
+        draw();
+    }
+
+    function showAnchor() {
+        var match = /^#s(\d+)c(\d+)$/.exec(window.location.hash);
+        if (!match || suiteStart[match[1]] === undefined) {
+            return;
+        }
+        var position = suiteStart[match[1]] + parseInt(match[2], 10);
+        if (position >= total || data.suite[position] !== parseInt(match[1], 10)) {
+            return;
+        }
+        search.value = "";
+        outcomeSelect.value = "";
+        filter();
+        view.scrollTop = position * ROW_HEIGHT;
+        select(position);
+        view.scrollIntoView();
+    }
+
+    view.addEventListener("scroll", draw);
+    search.addEventListener("input", filter);
+    outcomeSelect.addEventListener("change", filter);
+    rows.addEventListener("click", function (event) {
+        var line = event.target.closest(".compact-row");
+        if (line) {
+            select(parseInt(line.getAttribute("data-position"), 10));
+        }
+    });
+    window.addEventListener("hashchange", showAnchor);
+    filter();
+    showAnchor();
+})();
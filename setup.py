@@ -3,7 +3,8 @@ from setuptools import setup
 
 
 files = [os.path.join("templates", "*.css"),
-         os.path.join("templates", "*.html")]
+         os.path.join("templates", "*.html"),
+         os.path.join("templates", "*.js")]
 
 
 setup(
@@ -0,0 +1,117 @@
+"""
+Test the parser backends all build the same report model
+"""
+import io
+import xml.etree.ElementTree as ET
+import pytest
+from . import inputfiles
+from .test_streaming import summarise
+from junit2htmlreport import parser
+
+BACKENDS = ["iterparse", "expat", "lxml"]
+
+
+def need_backend(backend):
+    if backend == "lxml" and not parser.have_lxml():
+        pytest.skip("lxml is not installed")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("filename", inputfiles.get_reports())
+def test_backend_matches_etree(backend, filename):
+    need_backend(backend)
+    filepath = inputfiles.get_filepath(filename)
+    expected = summarise(parser.Junit(filename=filepath, backend="etree"))
+    report = parser.Junit(filename=filepath, backend=backend)
+    assert report.backend == backend
+    assert summarise(report) == expected
+
+    with open(filepath, "r", encoding="utf-8") as data:
+        assert summarise(parser.Junit(xmlstring=data.read(), backend=backend)) == expected
+
+
+@pytest.mark.parametrize("backend", ["etree"] + BACKENDS)
+def test_backend_declared_encoding(backend):
+    need_backend(backend)
+    xml = '<?xml version="1.0" encoding="ISO-8859-1"?><testsuite name="\u00e9t\u00e9">' \
+          '<testcase classname="c" name="caf\u00e9"/></testsuite>'
+    # a string is already decoded, whatever its declaration says
+    report = parser.Junit(xmlstring=xml, backend=backend)
+    assert report.suites[0].name == "\u00e9t\u00e9"
+    assert report.suites[0].all()[0].name == "caf\u00e9"
+
+    # bytes are decoded as declared
+    report = parser.Junit(fileobj=io.BytesIO(xml.encode("iso-8859-1")), backend=backend)
+    assert report.suites[0].name == "\u00e9t\u00e9"
+    assert report.suites[0].all()[0].name == "caf\u00e9"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backend_errors(backend):
+    need_backend(backend)
+    with pytest.raises(ET.ParseError):
+        parser.Junit(xmlstring="<testsuite><testcase></testsuite>", backend=backend)
+    with pytest.raises(parser.ParserError):
+        parser.Junit(xmlstring="<notjunit/>", backend=backend)
+
+
+def test_select_backend():
+    assert parser.select_backend("expat") == "expat"
+    assert parser.select_backend("auto", streaming=True) in ("lxml", "iterparse")
+    with pytest.raises(ValueError):
+        parser.select_backend("etree", streaming=True)
+    with pytest.raises(ValueError):
+        parser.select_backend("nonsense")
+
+
+def test_clean_xml_value():
+    assert parser.clean_xml_value("plain") == "plain"
+    assert parser.clean_xml_value("euro €") == "euro €"
+    assert parser.clean_xml_value("bad \ud800") == "bad ?"
+    assert parser.clean_xml_value(None) is None
+
+
+@pytest.mark.parametrize("extra", [["--streaming"], ["--merge", "merged.xml", "--streaming"],
+                                   ["--merge", "merged.xml", "--incremental"]])
+def test_runner_rejects_streaming_etree(tmpdir, capsys, extra):
+    from junit2htmlreport import runner
+    with tmpdir.as_cwd():
+        with pytest.raises(SystemExit) as err:
+            runner.run(["--parser", "etree"] + extra + [inputfiles.get_filepath("junit-simple_suite.xml")])
+    assert err.value.code == 2
+    assert "--parser etree can't be used" in capsys.readouterr().err
+    assert not tmpdir.join("merged.xml").exists()
+
+
+REPEATED_XML = """<testsuites>
+<testsuite name="one">
+  <testcase classname="c" name="a"><failure message="boom">{trace}</failure><system-out>{out}</system-out></testcase>
+  <testcase classname="c" name="b"><failure message="boom">{trace}</failure><system-out>{out}</system-out></testcase>
+</testsuite>
+<testsuite name="two">
+  <testcase classname="c" name="c"><skipped message="boom">{trace}</skipped></testcase>
+</testsuite>
+</testsuites>""".format(trace="Traceback\n" * 50, out="output line\n" * 50)
+
+
+@pytest.mark.parametrize("backend", ["etree"] + BACKENDS)
+def test_backend_shares_repeated_text(backend):
+    need_backend(backend)
+    report = parser.Junit(xmlstring=REPEATED_XML, backend=backend)
+    first, second = report.suites[0].all()
+    third = report.suites[1].all()[0]
+    assert first.failure == "Traceback\n" * 50
+    assert first.failure is second.failure
+    assert first.failure is third.skipped
+    assert first.failure_msg is third.skipped_msg
+    assert first.stdout is second.stdout
+
+
+def test_intern_text():
+    texts = {}
+    text = "".join(["shared", " text"])
+    assert parser.intern_text(texts, text) is text
+    assert parser.intern_text(texts, "".join(["shared", " text"])) is text
+    assert parser.intern_text(None, "other") == "other"
+    assert parser.intern_text(texts, None) is None
+    assert len(texts) == 1
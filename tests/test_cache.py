@@ -0,0 +1,67 @@
+"""
+Test the parsed report cache
+"""
+import os
+import shutil
+from .inputfiles import get_filepath
+from .test_streaming import summarise
+from junit2htmlreport import cache, parserimpl, runner
+
+
+def copy_report(tmpdir, filename):
+    target = os.path.join(tmpdir.strpath, filename)
+    shutil.copy(get_filepath(filename), target)
+    return target
+
+
+def test_cache_reuse(tmpdir):
+    reports = cache.ReportCache(os.path.join(tmpdir.strpath, "cache"))
+    filename = copy_report(tmpdir, "junit-complex_suites.xml")
+    first = parserimpl.load_report(filename, cache=reports)
+    assert len(reports.entries()) == 1
+
+    loaded = []
+    second = reports.load(filename, lambda: loaded.append(1))
+    assert not loaded
+    assert second.tree is None
+    assert summarise(second) == summarise(first)
+    assert [case.anchor() for case in second.suites[0].all()] == [case.anchor() for case in first.suites[0].all()]
+
+
+def test_cache_stale_and_corrupt(tmpdir):
+    reports = cache.ReportCache(os.path.join(tmpdir.strpath, "cache"), use_hash=True)
+    filename = copy_report(tmpdir, "junit-unicode.xml")
+    parserimpl.load_report(filename, cache=reports)
+
+    # a changed file gets a new entry
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert reports.get(filename) is None
+
+    # a corrupt entry is thrown away
+    parserimpl.load_report(filename, cache=reports)
+    with open(reports.entry_path(filename), "wb") as entry:
+        entry.write(b"not a pickle")
+    assert reports.get(filename) is None
+    assert not os.path.exists(reports.entry_path(filename))
+    assert len(parserimpl.load_report(filename, cache=reports).suites) == 1
+
+
+def test_cache_eviction(tmpdir):
+    reports = cache.ReportCache(os.path.join(tmpdir.strpath, "cache"), max_bytes=1)
+    for filename in ["junit-unicode.xml", "junit-cute2.xml"]:
+        parserimpl.load_report(copy_report(tmpdir, filename), cache=reports)
+    # only the newest entry is kept, even though it is bigger than the limit
+    assert len(reports.entries()) == 1
+
+
+def test_runner_cache(tmpdir):
+    cachedir = os.path.join(tmpdir.strpath, "cache")
+    outfile = os.path.join(tmpdir.strpath, "matrix.html")
+    args = ["--cache-dir", cachedir, "--report-matrix", outfile,
+            get_filepath("junit-axis-linux.xml"), get_filepath("junit-axis-windows.xml")]
+    runner.run(args)
+    assert len([name for name in os.listdir(cachedir) if name.endswith(cache.ENTRY_SUFFIX)]) == 2
+    assert os.listdir(os.path.join(cachedir, "templates"))
+    runner.run(args)
+    assert os.path.exists(outfile)
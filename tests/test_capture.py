@@ -0,0 +1,103 @@
+"""
+Test limiting captured system-out/system-err text
+"""
+import os
+import pytest
+from junit2htmlreport import cache, capture, parser, parserimpl, runner
+
+LONG_OUTPUT = "".join("line {}\n".format(n) for n in range(20000))
+
+REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="chatty" tests="2">
+  <testcase classname="a.b" name="noisy" time="1"><system-out>{out}</system-out><system-err>short</system-err></testcase>
+  <testcase classname="a.b" name="quiet" time="1"><system-out>hello</system-out></testcase>
+  <system-out>{out}</system-out>
+</testsuite>
+""".format(out=LONG_OUTPUT)
+
+
+def write_report(tmpdir):
+    filename = os.path.join(tmpdir.strpath, "chatty.xml")
+    with open(filename, "w", encoding="utf-8") as outfile:
+        outfile.write(REPORT)
+    return filename
+
+
+def test_capture_head_and_tail():
+    policy = capture.CapturePolicy(1000, head=300, tail=200)
+    cap = policy.new_capture()
+    for start in range(0, len(LONG_OUTPUT), 777):
+        cap.append(LONG_OUTPUT[start:start + 777])
+    text = cap.value()
+    assert isinstance(text, capture.CapturedText)
+    assert text.startswith(LONG_OUTPUT[:300])
+    assert text.endswith(LONG_OUTPUT[-200:])
+    assert "[... {} characters not shown ...]".format(len(LONG_OUTPUT) - 500) in text
+    assert text.total == len(LONG_OUTPUT)
+    assert text.link is None
+
+    assert policy.apply("short") == "short"
+    assert policy.apply(None) is None
+    with pytest.raises(ValueError):
+        capture.CapturePolicy(100, head=80, tail=80)
+
+
+@pytest.mark.parametrize("backend", ["etree", "iterparse", "expat", "lxml"])
+def test_capture_backends(tmpdir, backend):
+    if backend == "lxml" and not parser.have_lxml():
+        pytest.skip("lxml is not installed")
+    policy = capture.CapturePolicy(4096)
+    report = parser.Junit(write_report(tmpdir), backend=backend, capture=policy)
+    suite = report.suites[0]
+    noisy, quiet = suite.all()
+    assert len(noisy.stdout) < 4096 + 100
+    assert noisy.stdout.total == len(LONG_OUTPUT)
+    assert noisy.stdout.startswith(LONG_OUTPUT[:2048])
+    assert noisy.stdout.endswith(LONG_OUTPUT[-2048:])
+    assert noisy.stderr == "short"
+    assert quiet.stdout == "hello"
+    assert suite.stdout == noisy.stdout
+
+
+def test_capture_spill(tmpdir):
+    spill = os.path.join(tmpdir.strpath, "output")
+    policy = capture.CapturePolicy(4096, spill_dir=spill, link_base="output")
+    report = parser.Junit(write_report(tmpdir), backend="expat", capture=policy)
+    noisy = report.suites[0].all()[0]
+    assert noisy.stdout.link.startswith("output/")
+    # identical output is only written once
+    assert os.listdir(spill) == [noisy.stdout.link[len("output/"):]]
+    with open(os.path.join(tmpdir.strpath, noisy.stdout.link), encoding="utf-8") as infile:
+        assert infile.read() == LONG_OUTPUT
+
+    html = report.html()
+    assert 'href="{}"'.format(noisy.stdout.link) in html
+    assert LONG_OUTPUT not in html
+
+
+def test_capture_cache(tmpdir):
+    filename = write_report(tmpdir)
+    reports = cache.ReportCache(os.path.join(tmpdir.strpath, "cache"))
+    policy = capture.CapturePolicy(4096, spill_dir=os.path.join(tmpdir.strpath, "output"))
+    first = parserimpl.load_report(filename, cache=reports, capture=policy)
+    second = reports.get(filename, variant=repr(policy))
+    assert second is not None
+    stdout = second.suites[0].all()[0].stdout
+    assert isinstance(stdout, capture.CapturedText)
+    assert stdout == first.suites[0].all()[0].stdout
+    assert stdout.link == first.suites[0].all()[0].stdout.link
+    # a different policy is a different entry
+    assert reports.get(filename) is None
+
+
+def test_runner_capture(tmpdir):
+    filename = write_report(tmpdir)
+    outfile = os.path.join(tmpdir.strpath, "html", "chatty.html")
+    os.makedirs(os.path.dirname(outfile))
+    spill = os.path.join(tmpdir.strpath, "html", "logs")
+    runner.run([filename, outfile, "--capture-limit", "4", "--capture-dir", spill])
+    with open(outfile, encoding="utf-8") as infile:
+        html = infile.read()
+    assert 'href="logs/' in html
+    assert len(html) < len(LONG_OUTPUT)
+    assert len(os.listdir(spill)) == 1
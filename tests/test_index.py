@@ -0,0 +1,101 @@
+"""
+Test the byte offset index of a report
+"""
+import os
+import shutil
+import pytest
+from . import inputfiles
+from junit2htmlreport import index, parserimpl
+from junit2htmlreport.parser import FAILED, ParserError
+
+
+def copy_report(tmpdir, filename):
+    target = os.path.join(tmpdir.strpath, filename)
+    shutil.copy(inputfiles.get_filepath(filename), target)
+    return target
+
+
+def describe(case):
+    return (case.testclass.name, case.name, case.duration, case.failure, case.skipped,
+            case.stdout, case.stderr, [(prop.name, prop.value) for prop in case.properties])
+
+
+@pytest.mark.parametrize("filename", inputfiles.get_reports())
+def test_index_matches_report(tmpdir, filename):
+    filepath = copy_report(tmpdir, filename)
+    report = parserimpl.load_report(filepath)
+    reportindex = index.load_index(filepath)
+    assert os.path.exists(filepath + index.INDEX_SUFFIX)
+
+    entries = reportindex.find_cases()
+    expected = [(suite.name, case.testclass.name, case.name, case.outcome())
+                for suite in report.suites for case in suite.all()]
+    assert [(e.suite, e.classname, e.name, e.outcome) for e in entries] == expected
+    assert [describe(case) for case in reportindex.load_cases(entries)] == \
+        [describe(case) for suite in report.suites for case in suite.all()]
+
+    for suite in report.suites:
+        loaded = reportindex.load_suites(suite.name)
+        assert suite.name in [item.name for item in loaded]
+
+
+def test_index_lookup_failures(tmpdir):
+    filepath = copy_report(tmpdir, "junit-unicode.xml")
+    reportindex = index.load_index(filepath)
+    failed = reportindex.find_cases(outcome=FAILED)
+    assert failed
+    cases = reportindex.load_cases(failed)
+    assert all(case.failed() for case in cases)
+    assert reportindex.find_cases(suite="no-such-suite") == []
+
+
+def test_index_sidecar_reuse(tmpdir):
+    filepath = copy_report(tmpdir, "junit-complex_suites.xml")
+    first = index.load_index(filepath)
+    sidecar = filepath + index.INDEX_SUFFIX
+    assert index.ReportIndex.read(sidecar).cases == first.cases
+
+    # a changed report is indexed again
+    with open(filepath, "a") as outfile:
+        outfile.write("\n")
+    stat = os.stat(sidecar)
+    second = index.load_index(filepath)
+    assert second.size == first.size + 1
+    assert os.stat(sidecar).st_mtime_ns >= stat.st_mtime_ns
+
+    # a corrupt sidecar is replaced
+    with open(sidecar, "w") as outfile:
+        outfile.write("{")
+    assert index.load_index(filepath).cases == second.cases
+
+
+def test_index_compressed(tmpdir):
+    import gzip
+    filepath = os.path.join(tmpdir.strpath, "report.xml.gz")
+    with open(inputfiles.get_filepath("junit-simple_suite.xml"), "rb") as infile:
+        with gzip.open(filepath, "wb") as outfile:
+            outfile.write(infile.read())
+    with pytest.raises(ParserError):
+        index.ReportIndex.build(filepath)
+
+
+@pytest.mark.parametrize("filename", ["junit-complex_suites.xml", "junit-unicode.xml", "junit-axis-windows.xml"])
+def test_index_find_cases(tmpdir, filename):
+    filepath = copy_report(tmpdir, filename)
+    built = index.load_index(filepath)
+    stored = index.ReportIndex.read(filepath + index.INDEX_SUFFIX)
+    everything = built.find_cases()
+    assert stored.find_cases() == everything
+    queries = [{"suite": "no-such-suite"}, {"name": "no-such-case"}, {"classname": "no-such-class"}]
+    for entry in everything[::25]:
+        queries += [{"suite": entry.suite}, {"name": entry.name}, {"classname": entry.classname},
+                    {"outcome": entry.outcome}, {"suite": entry.suite, "classname": entry.classname},
+                    {"name": entry.name, "outcome": entry.outcome, "classname": entry.classname}]
+    for query in queries:
+        expected = [entry for entry in everything
+                    if all(getattr(entry, field) == value for field, value in query.items())]
+        assert built.find_cases(**query) == expected
+        assert stored.find_cases(**query) == expected
+    # reading the sidecar only loads the case rows when asked for all of them
+    assert stored._cases is None
+    assert stored.cases == built.cases
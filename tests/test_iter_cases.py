@@ -0,0 +1,62 @@
+"""
+Test the lightweight case iterator
+"""
+import pytest
+from . import inputfiles
+from .helpers import run_runner
+from junit2htmlreport import parserimpl
+from junit2htmlreport.parser import FAILED, SKIPPED
+
+
+@pytest.mark.parametrize("filename", inputfiles.get_reports())
+def test_iter_cases_matches_report(filename):
+    filepath = inputfiles.get_filepath(filename)
+    report = parserimpl.load_report(filepath)
+    expected = []
+    for suite in report.suites:
+        for case in suite.all():
+            expected.append((suite.name, case.testclass.name, case.name, case.duration, case.outcome()))
+
+    records = list(parserimpl.iter_cases(filepath))
+    assert [(r.suite, r.classname, r.name, r.duration, r.outcome) for r in records] == expected
+
+
+def test_iter_cases_messages():
+    records = list(parserimpl.iter_cases(inputfiles.get_filepath("junit-unicode.xml")))
+    failed = [record for record in records if record.outcome == FAILED]
+    assert failed
+    skipped = list(parserimpl.iter_cases(inputfiles.get_filepath("junit-axis-windows.xml")))
+    assert [record.outcome for record in skipped].count(SKIPPED) == 1
+
+
+def test_check_only_exit(tmpdir):
+    with pytest.raises(SystemExit) as err:
+        run_runner(tmpdir, "junit-unicode.xml", "--check-only", "--max-failures", "1")
+    assert err.value.code != 0
+
+    # under the threshold, nothing is written and we don't exit
+    run_runner(tmpdir, "junit-axis-windows.xml", "--check-only", "--max-skipped", "2")
+
+
+def test_iter_cases_failed_and_skipped(tmpdir):
+    from junit2htmlreport import common, runner
+    report = tmpdir.join("both.xml")
+    report.write('<testsuite name="s"><testcase classname="c" name="t">'
+                 '<failure message="boom"/><skipped message="later"/></testcase></testsuite>')
+    record, = parserimpl.iter_cases(report.strpath)
+    assert record.outcome == SKIPPED
+    assert record.message == "later"
+    assert record.failed and record.skipped
+
+    counter = common.ResultCounter()
+    counter.add_report(report.strpath)
+    assert counter.failure_count() == 1
+    assert counter.skip_count() == 1
+    with pytest.raises(NotImplementedError):
+        counter.failures()
+
+    # --check-only exits the same way as a normal run
+    for extra in (["--summary-matrix", "--summary-output", tmpdir.join("both.txt").strpath], ["--check-only"]):
+        with pytest.raises(SystemExit) as err:
+            runner.run([report.strpath, "--max-failures", "1"] + extra)
+        assert err.value.code == 1
@@ -158,4 +158,13 @@ def test_skip_exit(tmpdir):
     with pytest.raises(SystemExit) as err:
         run_runner(tmpdir, "junit-axis-windows.xml", "--summary-matrix", "--max-skipped", "1")
 
-    assert err.value.code != 0
\ No newline at end of file
+    assert err.value.code != 0
+
+def test_output_is_deterministic(tmpdir):
+    """
+    Test rendering the same report twice gives identical html
+    :return:
+    """
+    first = parser.Junit(filename=get_filepath("junit-complex_suites.xml")).html()
+    second = parser.Junit(filename=get_filepath("junit-complex_suites.xml")).html()
+    assert first == second
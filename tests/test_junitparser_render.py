@@ -16,3 +16,210 @@ def test_load(filename):
 
     output = str(doc)
     assert output
+
+
+def test_shared_environment(tmpdir):
+    assert render.template_environment() is render.template_environment()
+    folder = tmpdir.mkdir("templates")
+    assert render.template_environment(folder.strpath) is render.template_environment([folder.strpath])
+    assert render.template_environment(folder.strpath) is not render.template_environment()
+
+    report = parserimpl.load_report(inputfiles.get_filepath("junit-simple_suite.xml"))
+    doc = render.HTMLReport(native=False)
+    doc.load(report)
+    expected = str(doc)
+    bytecode = tmpdir.join("bytecode")
+    try:
+        render.set_bytecode_cache(bytecode.strpath)
+        assert str(doc) == expected
+        assert bytecode.listdir()
+        # a new environment loads the compiled template
+        render.set_bytecode_cache(bytecode.strpath)
+        assert str(doc) == expected
+    finally:
+        render.set_bytecode_cache(None)
+
+
+@pytest.mark.parametrize("filename", inputfiles.get_reports())
+def test_write_html(filename):
+    from io import BytesIO
+    report = parserimpl.load_report(inputfiles.get_filepath(filename))
+    stream = BytesIO()
+    report.write_html(stream, show_toc=False)
+    assert stream.getvalue() == report.html(show_toc=False).encode("utf-8")
+
+
+def test_write_template_chunks(monkeypatch):
+    from io import BytesIO
+    monkeypatch.setattr(render, "WRITE_CHUNK", 10)
+    report = parserimpl.load_report(inputfiles.get_filepath("junit-unicode.xml"))
+    stream = BytesIO()
+    report.write_html(stream)
+    assert stream.getvalue().decode("utf-8") == report.html()
+
+
+@pytest.mark.parametrize("filename", inputfiles.get_reports())
+def test_compact_report(filename):
+    import json
+    import re
+    report = parserimpl.load_report(inputfiles.get_filepath(filename))
+    html = report.html(compact=True)
+    island = re.search(r'<script type="application/json" id="report-data">(.*?)</script>', html, re.S)
+    data = json.loads(island.group(1))
+
+    cases = [case for suite in report.suites for case in suite.all()]
+    assert len(data["name"]) == len(cases)
+    for position, case in enumerate(cases):
+        assert data["name"][position] == (case.name or "")
+        assert data["outcomes"][data["outcome"][position]] == case.outcome().value
+        assert data["classes"][data["class"][position]] == (case.testclass.name or "")
+    failed = [detail for detail in data["details"] if detail[1] is not None or detail[2] is not None]
+    assert len(failed) == len([case for case in cases if case.failed()])
+    assert [detail[0] for detail in failed] == [position for position, case in enumerate(cases) if case.failed()]
+
+
+def test_compact_report_escapes_script():
+    report = parserimpl.load_report(inputfiles.get_filepath("junit-simple_suite.xml"))
+    case = report.suites[0].all()[0]
+    case.name = "</script><script>alert(1)</script>"
+    html = report.html(compact=True)
+    assert "</script><script>alert" not in html
+
+
+def render_both(report, title, show_toc=True):
+    report.allocate_anchors()
+    native = render.HTMLReport(show_toc=show_toc)
+    native.load(report, title)
+    jinja = render.HTMLReport(show_toc=show_toc, native=False)
+    jinja.load(report, title)
+    return str(native), str(jinja)
+
+
+@pytest.mark.parametrize("filename", inputfiles.get_reports())
+@pytest.mark.parametrize("show_toc", [True, False])
+def test_native_render_parity(filename, show_toc):
+    report = parserimpl.load_report(inputfiles.get_filepath(filename))
+    native, jinja = render_both(report, filename, show_toc)
+    assert native == jinja
+
+
+def test_native_render_parity_links(tmpdir):
+    from junit2htmlreport import capture, parser
+    from .test_capture import write_report
+    policy = capture.CapturePolicy(4096, spill_dir=tmpdir.join("output").strpath, link_base="out<put>")
+    report = parserimpl.load_report(write_report(tmpdir), capture=policy)
+    suite = report.suites[0]
+    suite.package = "pkg & co"
+    prop = parser.Property()
+    prop.name = "<name>"
+    prop.value = "'value'"
+    suite.properties = [prop]
+    suite.all()[0].properties = [prop, prop]
+    native, jinja = render_both(report, "<chatty>")
+    assert 'href="out&lt;put&gt;/' in native
+    assert native == jinja
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_write_html_pages(tmpdir, jobs):
+    import os
+    import re
+    report = parserimpl.load_report(inputfiles.get_filepath("junit-complex_suites.xml"))
+    index = os.path.join(tmpdir.strpath, "out", "report.html")
+    pages = report.write_html_pages(index, jobs=jobs)
+    outdir = os.path.dirname(index)
+    assert pages == ["report-s{}.html".format(number) for number in range(len(report.suites))]
+    assert sorted(os.listdir(outdir)) == sorted(pages + ["report.html", render.STYLESHEET_NAME])
+
+    contents = {}
+    for name in pages + ["report.html"]:
+        with open(os.path.join(outdir, name), encoding="utf-8") as infile:
+            contents[name] = infile.read()
+        assert '<link rel="stylesheet" type="text/css" href="styles.css">' in contents[name]
+        assert "<style" not in contents[name]
+    links = re.findall(r'href="(report-s\d+\.html)#(s\d+c\d+)"', contents["report.html"])
+    assert len(links) >= sum(len(suite.all()) for suite in report.suites)
+    for page, anchor in links:
+        assert 'id="{}"'.format(anchor) in contents[page]
+
+
+def test_stylesheet_link_parity():
+    report = parserimpl.load_report(inputfiles.get_filepath("junit-unicode.xml"))
+    report.allocate_anchors()
+    native = render.HTMLReport(stylesheet="styles.css")
+    native.load(report, "linked")
+    jinja = render.HTMLReport(native=False, stylesheet="styles.css")
+    jinja.load(report, "linked")
+    assert str(native) == str(jinja)
+
+
+def shared_text_report():
+    from junit2htmlreport import parser
+    trace = "Traceback <most recent call last>\n" * 20
+    return parser.Junit(xmlstring="""<testsuite name="shared">
+  <testcase classname="c" name="a"><failure message="boom">{0}</failure></testcase>
+  <testcase classname="c" name="b"><failure message="boom">{0}</failure></testcase>
+  <testcase classname="c" name="c"><failure message="boom">short</failure></testcase>
+</testsuite>""".format(trace.replace("<", "&lt;").replace(">", "&gt;"))), trace
+
+
+def test_shared_text_written_once():
+    report, trace = shared_text_report()
+    native, jinja = render_both(report, "shared")
+    assert native == jinja
+    escaped = trace.replace("<", "&lt;").replace(">", "&gt;")
+    assert native.count(escaped) == 1
+    assert native.count('<a class="shared-link" href="#t1">Full text, shared by 2 tests</a>') == 2
+    assert '<a id="t1"></a>' in native
+    assert "<pre>short</pre>" in native
+
+
+def test_no_shared_text_section():
+    report = parserimpl.load_report(inputfiles.get_filepath("junit-simple_suite.xml"))
+    native, jinja = render_both(report, "plain")
+    assert '<div class="shared-texts">' not in native
+    assert native == jinja
+
+
+def test_compact_report_shared_texts():
+    import json
+    import re
+    report, trace = shared_text_report()
+    html = report.html(compact=True)
+    island = re.search(r'<script type="application/json" id="report-data">(.*?)</script>', html, re.S)
+    data = json.loads(island.group(1))
+    assert data["texts"] == [trace, "short"]
+    assert [detail[2] for detail in data["details"]] == [0, 0, 1]
+
+
+def test_write_html_pages_shared_text(tmpdir):
+    import os
+    report, trace = shared_text_report()
+    index = os.path.join(tmpdir.strpath, "report.html")
+    pages = report.write_html_pages(index)
+    with open(os.path.join(tmpdir.strpath, pages[0]), encoding="utf-8") as infile:
+        content = infile.read()
+    assert content.count(trace.replace("<", "&lt;").replace(">", "&gt;")) == 1
+    assert '<a id="t1"></a>' in content
+
+
+def test_view_styles_only_where_used(tmpdir):
+    import os
+    report = parserimpl.load_report(inputfiles.get_filepath("junit-unicode.xml"))
+    html = report.html()
+    for rule in (".compact-row", ".matrix-nav", ".shared-link"):
+        assert rule not in html
+    compact = report.html(compact=True)
+    assert ".compact-row" in compact
+    assert ".shared-link" not in compact
+
+    shared, _ = shared_text_report()
+    assert ".shared-link" in shared.html()
+
+    # the stylesheet of multi-page output holds the styles of every view
+    stylesheet = render.write_stylesheet(tmpdir.strpath)
+    with open(stylesheet, encoding="utf-8") as infile:
+        content = infile.read()
+    for name in (render.STYLESHEET_NAME,) + render.VIEW_STYLESHEETS:
+        assert render._stylesheet(name) in content
+    assert os.path.basename(stylesheet) == render.STYLESHEET_NAME
@@ -1,6 +1,9 @@
 """
 Test the matrix functionality
 """
+import os
+import re
+import pytest
 
 from junit2htmlreport import matrix
 from junit2htmlreport.matrix import PARTIAL_PASS, PARTIAL_FAIL, TOTAL_FAIL, UNTESTED
@@ -84,3 +87,260 @@ def test_matrix_html(tmpdir):
     result = htmatrix.summary()
     assert result.endswith("</html>")
 
+
+
+def test_matrix_html_anchors(tmpdir):
+    """
+    Test the matrix links point at anchors in the per-report pages
+    :return:
+    """
+    htmatrix = matrix.HtmlReportMatrix(str(tmpdir))
+    htmatrix.add_report(get_filepath("junit-axis-linux.xml"))
+    htmatrix.add_report(get_filepath("junit-axis-windows.xml"))
+    result = htmatrix.summary()
+
+    for axis in ["junit-axis-linux.xml", "junit-axis-windows.xml"]:
+        with open(os.path.join(str(tmpdir), axis + ".html"), "r", encoding="utf-8") as page:
+            content = page.read()
+        links = re.findall(r'href="{}\.html#([^"]+)"'.format(re.escape(axis)), result)
+        assert links
+        for anchor in links:
+            assert '<a id="{}"></a>'.format(anchor) in content
+
+
+def test_matrix_indexes():
+    """
+    Test the case name and outcome indexes agree with the per-axis cases
+    :return:
+    """
+    textmatrix = matrix.TextReportMatrix()
+    for axis in ["junit-axis-linux.xml", "junit-axis-solaris.xml", "junit-axis-windows.xml"]:
+        textmatrix.add_report(get_filepath(axis))
+
+    for classname, casenames in textmatrix.casenames.items():
+        assert list(casenames) == list(textmatrix.cases[classname])
+        for casename, results in textmatrix.case_results[classname].items():
+            assert textmatrix.combined_result_list(classname, casename) == textmatrix.combined_result(results)
+            assert textmatrix.case_masks[classname][casename] == matrix.outcome_mask(results)
+    assert textmatrix.combined_result_list("no-such-class", "x") == (" ", "")
+
+
+def test_matrix_parallel(tmpdir):
+    """
+    Test parsing matrix reports in worker processes gives the same matrix
+    :return:
+    """
+    axes = ["junit-axis-linux.xml", "junit-axis-solaris.xml", "junit-axis-windows.xml", "junit-unicode.xml"]
+    filenames = [get_filepath(axis) for axis in axes]
+
+    serial = matrix.TextReportMatrix()
+    serial.add_reports(filenames)
+    parallel = matrix.TextReportMatrix(jobs=2)
+    assert parallel.add_reports(filenames) == axes
+    assert parallel.summary() == serial.summary()
+    # only what the matrix needs is kept from the worker processes
+    for report in parallel.reports.values():
+        for suite in report.suites:
+            assert suite.stdout is None
+            assert all(case.stdout is None and case.stderr is None for case in suite.all())
+    assert len(parallel.failures()) == len(serial.failures())
+    assert len(parallel.skips()) == len(serial.skips())
+
+    serialdir = tmpdir.mkdir("serial").strpath
+    paralleldir = tmpdir.mkdir("parallel").strpath
+    serialhtml = matrix.HtmlReportMatrix(serialdir)
+    serialhtml.add_reports(filenames)
+    parallelhtml = matrix.HtmlReportMatrix(paralleldir, jobs=2)
+    parallelhtml.add_reports(filenames)
+    assert parallelhtml.summary() == serialhtml.summary()
+    for axis in axes:
+        with open(os.path.join(serialdir, axis + ".html"), "rb") as expected:
+            with open(os.path.join(paralleldir, axis + ".html"), "rb") as written:
+                assert written.read() == expected.read()
+
+
+def test_matrix_state(tmpdir):
+    """
+    Test saving a matrix and updating it with a rolling window of reports
+    :return:
+    """
+    import shutil
+    axes = ["junit-axis-linux.xml", "junit-axis-solaris.xml", "junit-axis-windows.xml", "junit-unicode.xml"]
+    filenames = []
+    for axis in axes:
+        filenames.append(os.path.join(tmpdir.strpath, axis))
+        shutil.copy(get_filepath(axis), filenames[-1])
+    outdir = tmpdir.mkdir("html").strpath
+    statefile = os.path.join(tmpdir.strpath, "matrix.state")
+
+    first = matrix.HtmlReportMatrix(outdir)
+    assert first.update_reports(filenames[:3]) == axes[:3]
+    first.save_state(statefile)
+    page = os.path.join(outdir, axes[0] + ".html")
+    page_mtime = os.stat(page).st_mtime_ns
+
+    loaded = matrix.HtmlReportMatrix(outdir)
+    loaded.load_state(statefile)
+    assert loaded.summary() == first.summary()
+
+    # one new axis arrives, the oldest one leaves the window
+    assert loaded.update_reports(filenames[1:]) == axes[3:]
+    fresh = matrix.HtmlReportMatrix(tmpdir.mkdir("fresh").strpath)
+    fresh.add_reports(filenames[1:])
+    assert loaded.summary() == fresh.summary()
+    assert list(loaded.casenames) == list(fresh.casenames)
+
+    # unchanged reports are not parsed again, changed ones are
+    loaded.save_state(statefile)
+    again = matrix.HtmlReportMatrix(outdir)
+    again.load_state(statefile)
+    os.utime(filenames[2], ns=(0, 0))
+    assert again.update_reports(filenames[1:]) == [axes[2]]
+    assert os.stat(page).st_mtime_ns == page_mtime
+
+    text = matrix.TextReportMatrix()
+    text.load_state(statefile)
+    text.remove_report(axes[3])
+    expected = matrix.TextReportMatrix()
+    expected.add_reports(filenames[1:3])
+    assert text.summary() == expected.summary()
+
+
+def test_runner_matrix_state(tmpdir):
+    """
+    Test keeping a report matrix state between runs
+    :return:
+    """
+    from junit2htmlreport import runner
+    statefile = os.path.join(tmpdir.strpath, "matrix.state")
+    output = os.path.join(tmpdir.strpath, "matrix.html")
+    axes = [get_filepath(axis) for axis in ["junit-axis-linux.xml", "junit-axis-windows.xml"]]
+    runner.run(["--report-matrix", output, "--matrix-state", statefile, axes[0]])
+    runner.run(["--report-matrix", output, "--matrix-state", statefile] + axes)
+    with open(output, encoding="utf-8") as infile:
+        content = infile.read()
+    assert "junit-axis-linux.xml.html" in content
+    assert "junit-axis-windows.xml.html" in content
+    with open(statefile, "wb") as outfile:
+        outfile.write(b"junk")
+    runner.run(["--report-matrix", output, "--matrix-state", statefile] + axes)
+
+
+@pytest.mark.parametrize("fmt,delimiter", [("csv", ","), ("tsv", "\t")])
+def test_matrix_summary_table(tmpdir, fmt, delimiter):
+    import csv
+    from junit2htmlreport import runner
+    axes = ["junit-axis-linux.xml", "junit-axis-solaris.xml", "junit-axis-windows.xml"]
+    outfile = os.path.join(tmpdir.strpath, "matrix." + fmt)
+    runner.run(["--summary-matrix", "--summary-format", fmt, "--summary-output", outfile] +
+               [get_filepath(name) for name in axes])
+    with open(outfile, encoding="utf-8", newline="") as infile:
+        rows = list(csv.reader(infile, delimiter=delimiter))
+
+    textmatrix = matrix.TextReportMatrix()
+    for name in axes:
+        textmatrix.add_report(get_filepath(name))
+    assert rows[0] == ["class", "case"] + textmatrix.report_order() + ["combined"]
+    assert len(rows) == 1 + sum(len(names) for names in textmatrix.casenames.values())
+    assert all(cell in ("", "/", "f", "s") for row in rows[1:] for cell in row[2:-1])
+
+
+def test_matrix_summary_stream(tmpdir):
+    from io import StringIO
+    textmatrix = matrix.TextReportMatrix()
+    textmatrix.add_report(get_filepath("junit-axis-linux.xml"))
+    textmatrix.add_report(get_filepath("junit-axis-windows.xml"))
+    stream = StringIO()
+    textmatrix.write_summary(stream)
+    assert stream.getvalue() == textmatrix.summary()
+    with pytest.raises(ValueError):
+        textmatrix.write_summary(stream, "xml")
+
+
+@pytest.mark.parametrize("page_rows,jobs", [(None, 1), (3, 1), (3, 2)])
+def test_matrix_html_pages(tmpdir, page_rows, jobs):
+    axes = ["junit-axis-linux.xml", "junit-axis-solaris.xml", "junit-axis-windows.xml"]
+    htmatrix = matrix.HtmlReportMatrix(tmpdir.strpath, jobs=jobs)
+    htmatrix.add_reports([get_filepath(name) for name in axes])
+    index = os.path.join(tmpdir.strpath, "matrix.html")
+    written = htmatrix.write_pages(index, page_rows=page_rows)
+
+    pages, classes, outcomes = htmatrix.matrix_pages(index, page_rows)
+    assert written == [page.filename for page in pages]
+    assert [testclass.name for testclass in classes] == list(htmatrix.classes)
+    total = sum(len(names) for names in htmatrix.casenames.values())
+    assert sum(testclass.total for testclass in classes) == total
+    assert sum(sum(testclass.counts.values()) for testclass in classes) == total
+    for page in pages:
+        rows = sum(len(rows) for classname, anchor, rows in page.classes)
+        if page_rows is None:
+            assert len(page.classes) == 1
+        else:
+            assert rows <= page_rows
+        assert os.path.exists(os.path.join(tmpdir.strpath, page.filename))
+    if page_rows is None:
+        assert len(pages) == len(htmatrix.classes)
+
+    with open(index, encoding="utf-8") as infile:
+        html = infile.read()
+    for testclass in classes:
+        assert testclass.href in html
+        page, anchor = testclass.href.split("#")
+        with open(os.path.join(tmpdir.strpath, page), encoding="utf-8") as infile:
+            assert 'id="{}"'.format(anchor) in infile.read()
+
+
+def test_runner_matrix_pages(tmpdir):
+    from junit2htmlreport import runner
+    output = os.path.join(tmpdir.strpath, "matrix.html")
+    runner.run(["--report-matrix", output, "--matrix-page-rows", "0",
+                get_filepath("junit-axis-linux.xml"), get_filepath("junit-axis-windows.xml")])
+    assert os.path.exists(output)
+    assert os.path.exists(os.path.join(tmpdir.strpath, "matrix-1.html"))
+
+
+def test_matrix_write_html(tmpdir):
+    from io import BytesIO
+    htmatrix = matrix.HtmlReportMatrix(tmpdir.strpath)
+    htmatrix.add_report(get_filepath("junit-axis-linux.xml"))
+    htmatrix.add_report(get_filepath("junit-unicode.xml"))
+    stream = BytesIO()
+    htmatrix.write_html(stream)
+    assert stream.getvalue() == htmatrix.summary().encode("utf-8")
+
+
+def test_matrix_multipage(tmpdir):
+    axes = [get_filepath(name) for name in ["junit-axis-linux.xml", "junit-axis-solaris.xml",
+                                            "junit-axis-windows.xml"]]
+    sizes = {}
+    for multipage in (False, True):
+        outdir = tmpdir.mkdir("multi" if multipage else "single").strpath
+        htmatrix = matrix.HtmlReportMatrix(outdir, multipage=multipage)
+        htmatrix.add_reports(axes)
+        with open(os.path.join(outdir, "matrix.html"), "wb") as outfile:
+            htmatrix.write_html(outfile)
+        sizes[multipage] = sum(os.path.getsize(os.path.join(outdir, name)) for name in os.listdir(outdir))
+        for name in os.listdir(outdir):
+            if name.endswith(".html"):
+                with open(os.path.join(outdir, name), encoding="utf-8") as infile:
+                    assert ("<style" not in infile.read()) == multipage
+    assert os.path.exists(os.path.join(tmpdir.strpath, "multi", "styles.css"))
+    assert os.path.exists(os.path.join(tmpdir.strpath, "multi", "junit-axis-linux.xml-s0.html"))
+    assert sizes[True] < sizes[False]
+
+
+def test_runner_matrix_pages_template_folder(tmpdir):
+    from junit2htmlreport import runner
+    # a template folder from before the matrix pages only overrides the single page matrix
+    folder = tmpdir.mkdir("templates")
+    folder.join("matrix.html").write('{% extends "base.html" %}{% block content %}custom{% endblock %}')
+    output = os.path.join(tmpdir.strpath, "out", "matrix.html")
+    os.makedirs(os.path.dirname(output))
+    runner.run(["--report-matrix", output, "--reports-template-folder", folder.strpath,
+                "--matrix-page-rows", "0", get_filepath("junit-axis-linux.xml"), get_filepath("junit-axis-windows.xml")])
+    assert os.path.exists(os.path.join(tmpdir.strpath, "out", "matrix-1.html"))
+
+    runner.run(["--report-matrix", output, "--reports-template-folder", folder.strpath,
+                get_filepath("junit-axis-linux.xml"), get_filepath("junit-axis-windows.xml")])
+    with open(output, encoding="utf-8") as infile:
+        assert "custom" in infile.read()
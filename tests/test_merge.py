@@ -0,0 +1,192 @@
+"""
+Test merging folders of reports
+"""
+import os
+import re
+import shutil
+import pytest
+from .inputfiles import get_filepath
+from .test_sources import compress
+from junit2htmlreport import merge, parser, runner, sources
+
+REPORTS = ["junit-axis-linux.xml", "junit-axis-solaris.xml", "junit-axis-windows.xml", "junit-unicode.xml"]
+
+
+def make_results_folder(tmpdir):
+    folder = tmpdir.mkdir("results")
+    nested = folder.mkdir("b-nested")
+    shutil.copy(get_filepath(REPORTS[0]), os.path.join(folder.strpath, "z-last.xml"))
+    shutil.copy(get_filepath(REPORTS[1]), os.path.join(nested.strpath, "report.xml"))
+    shutil.copy(get_filepath(REPORTS[2]), os.path.join(folder.strpath, "a-first.xml"))
+    shutil.move(compress(tmpdir, REPORTS[3], ".gz"), os.path.join(folder.strpath, "m-unicode.xml.gz"))
+    # a byte-identical copy is only merged once
+    shutil.copy(get_filepath(REPORTS[0]), os.path.join(nested.strpath, "copy.xml"))
+    folder.join("screenshot.png").write_binary(b"\x89PNG\r\n\x1a\n not a report")
+    folder.join("console.log").write("INFO writing <testsuite> results")
+    folder.join("page.html").write("<!DOCTYPE html><html></html>")
+    return folder.strpath
+
+
+def suite_names(suites):
+    return [suite.name for suite in suites]
+
+
+def expected_names():
+    # files in a folder come before those in its subfolders
+    order = [REPORTS[2], REPORTS[3], REPORTS[0], REPORTS[1]]
+    return [suite.name for name in order for suite in parser.Junit(get_filepath(name)).suites]
+
+
+def test_sniffing(tmpdir):
+    folder = make_results_folder(tmpdir)
+    found = [os.path.relpath(name, folder) for name in merge.iter_folder_reports(folder)]
+    assert found == ["a-first.xml", "m-unicode.xml.gz", "z-last.xml",
+                     os.path.join("b-nested", "copy.xml"), os.path.join("b-nested", "report.xml")]
+    assert sources.looks_like_junit(b'<?xml version="1.0"?>\n<!-- made by ci -->\n<testsuites>')
+    assert sources.looks_like_junit(u'<testrun name="x">'.encode("utf-16"))
+    assert not sources.looks_like_junit(b"<html>")
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_merge_folder(tmpdir, jobs):
+    folder = make_results_folder(tmpdir)
+    merger = merge.Merger(jobs=jobs)
+    merger.add_report(folder)
+    assert suite_names(merger.suites) == expected_names()
+    assert len(merger.reports) == 4
+
+    # adding the same folder again does nothing
+    merger.add_report(folder)
+    assert len(merger.suites) == len(expected_names())
+
+
+def test_merge_folder_parallel_matches_serial(tmpdir):
+    folder = make_results_folder(tmpdir)
+    serial = merge.Merger()
+    serial.add_report(folder)
+    parallel = merge.Merger(jobs=2)
+    parallel.add_report(folder)
+    assert parallel.toxmlstring() == serial.toxmlstring()
+
+
+def test_unique_files_hashes_matching_sizes(tmpdir, monkeypatch):
+    folder = make_results_folder(tmpdir)
+    hashed = []
+    digest = merge.file_digest
+    monkeypatch.setattr(merge, "file_digest", lambda name: hashed.append(name) or digest(name))
+    files = list(merge.iter_folder_reports(folder))
+    found = merge.unique_files(files, set(), {})
+    assert len(found) == len(files) - 1
+    # the copy shares its size with the file it copies, a-first.xml with nothing
+    assert os.path.join(folder, "b-nested", "copy.xml") in hashed
+    assert os.path.join(folder, "z-last.xml") in hashed
+    assert os.path.join(folder, "a-first.xml") not in hashed
+    assert os.path.join(folder, "m-unicode.xml.gz") not in hashed
+
+
+def test_streaming_merge_folder(tmpdir):
+    folder = make_results_folder(tmpdir)
+    serial = merge.Merger()
+    serial.add_report(folder)
+    outfile = os.path.join(tmpdir.strpath, "merged.xml")
+    with open(outfile, "wb") as output:
+        streamer = merge.StreamingMerger(output)
+        streamer.add_report(folder)
+        streamer.finish()
+    assert suite_names(parser.Junit(outfile).suites) == expected_names()
+    assert streamer.failure_count() == serial.failure_count()
+    assert streamer.skip_count() == serial.skip_count()
+    with pytest.raises(NotImplementedError):
+        streamer.skips()
+
+
+@pytest.mark.parametrize("mode", [["--streaming"], ["--incremental"], []])
+def test_runner_merge_max_failures(tmpdir, mode):
+    outfile = os.path.join(tmpdir.strpath, "merged.xml")
+    failed = len(parser.Junit(get_filepath("junit-unicode.xml")).suites[0].failed())
+    assert failed
+    with pytest.raises(SystemExit) as err:
+        runner.run(["--merge", outfile, "--max-failures", "1"] + mode + [get_filepath("junit-unicode.xml")])
+    assert err.value.code == failed
+
+
+def test_incremental_merge(tmpdir):
+    outfile = os.path.join(tmpdir.strpath, "soak.xml")
+    shards = [get_filepath(name) for name in REPORTS]
+
+    merger = merge.IncrementalMerger(outfile)
+    merger.add_report(shards[0])
+    merger.finish()
+    assert suite_names(parser.Junit(outfile).suites) == suite_names(parser.Junit(shards[0]).suites)
+
+    # an interrupted update is dropped by the next one
+    merger = merge.IncrementalMerger(outfile)
+    merger.add_report(shards[1])
+    merger.outfile.close()
+
+    for shard in shards:
+        merger = merge.IncrementalMerger(outfile)
+        merger.add_report(shard)
+        merger.finish()
+
+    full = merge.Merger()
+    for shard in shards:
+        full.add_report(shard)
+    with open(outfile, "rb") as infile:
+        written = infile.read().decode("utf-8")
+    assert re.sub(r'" +>', '">', written, count=1) == full.toxmlstring()
+    reopened = merge.IncrementalMerger(outfile)
+    assert reopened.failure_count() == full.failure_count()
+    reopened.finish()
+
+    with pytest.raises(ValueError):
+        merge.IncrementalMerger(shards[0])
+
+
+def test_runner_incremental_merge(tmpdir):
+    outfile = os.path.join(tmpdir.strpath, "soak.xml")
+    for name in REPORTS:
+        runner.run(["--merge", outfile, "--incremental", get_filepath(name), get_filepath(REPORTS[0])])
+    names = suite_names(parser.Junit(outfile).suites)
+    assert names == [suite.name for name in REPORTS for suite in parser.Junit(get_filepath(name)).suites]
+
+
+def test_merge_repeated_report():
+    # reports named more than once are merged each time, as before folders were deduplicated
+    report = get_filepath(REPORTS[0])
+    merger = merge.Merger()
+    merger.add_report(report)
+    merger.add_report(report)
+    assert suite_names(merger.suites) == suite_names(parser.Junit(report).suites) * 2
+
+
+def test_runner_incremental_merge_bad_input(tmpdir, capsys):
+    outfile = os.path.join(tmpdir.strpath, "soak.xml")
+    bad = tmpdir.join("bad.xml")
+    bad.write('<?xml version="1.0"?><testsuite name="broken"><testcase name="t">')
+
+    # a first merge that fails leaves nothing behind
+    with pytest.raises(SystemExit) as err:
+        runner.run(["--merge", outfile, "--incremental", get_filepath(REPORTS[0]), bad.strpath])
+    assert err.value.code == 1
+    assert "can't merge {}".format(bad.strpath) in capsys.readouterr().err
+    assert sorted(os.listdir(tmpdir.strpath)) == ["bad.xml"]
+
+    runner.run(["--merge", outfile, "--incremental", get_filepath(REPORTS[0])])
+    with open(outfile, "rb") as infile:
+        first = infile.read()
+
+    # a later update that fails leaves the merged report as it was
+    with pytest.raises(SystemExit):
+        runner.run(["--merge", outfile, "--incremental", get_filepath(REPORTS[1]), bad.strpath])
+    with open(outfile, "rb") as infile:
+        assert infile.read() == first
+    runner.run(["--merge", outfile, "--incremental", get_filepath(REPORTS[1])])
+    assert suite_names(parser.Junit(outfile).suites) == \
+        [suite.name for name in REPORTS[:2] for suite in parser.Junit(get_filepath(name)).suites]
+
+    # a report that was not written by an incremental merge is a usage error
+    with pytest.raises(SystemExit) as err:
+        runner.run(["--merge", bad.strpath, "--incremental", get_filepath(REPORTS[0])])
+    assert err.value.code == 2
+    assert "not written by an incremental merge" in capsys.readouterr().err
@@ -51,3 +51,48 @@ def test_public_api():
     assert "<html" in html
     assert """test_skippy""" in html
     assert """an exception happened""" in html
+
+
+def test_compact_model():
+    container = j2h.Junit(xmlstring="""<?xml version="1.0" encoding="UTF-8"?>
+    <testsuite name="suite">
+        <testcase classname="myclass" name="one"><properties><property name="owner" value="a"/></properties></testcase>
+        <testcase classname="myclass" name="two"><properties><property name="owner" value="b"/></properties></testcase>
+    </testsuite>
+    """)
+    for item in (j2h.Case(), j2h.Class(), j2h.Property(), j2h.Suite()):
+        assert not hasattr(item, "__dict__")
+
+    one, two = container.suites[0].all()
+    assert one.testclass is two.testclass
+    assert one.properties[0].name is two.properties[0].name
+
+
+def test_outcome_indexes():
+    suite = j2h.Suite()
+    testclass = j2h.Class()
+    testclass.name = "myclass"
+    suite.classes[testclass.name] = testclass
+
+    passed = j2h.Case()
+    passed.duration = 1.5
+    testclass.add_case(passed)
+    assert suite.all() == [passed]
+    assert suite.passed() == [passed]
+    assert suite.failed() == []
+
+    # cases appended directly are picked up too
+    failed = j2h.Case()
+    failed.failure = "boom"
+    failed.duration = 2
+    testclass.cases.append(failed)
+    skipped = j2h.Case()
+    skipped.skipped = "later"
+    testclass.cases.append(skipped)
+
+    assert suite.all() == [passed, failed, skipped]
+    assert suite.failed() == [failed]
+    assert suite.skipped() == [skipped]
+    assert suite.passed() == [passed]
+    assert suite.cases_duration() == 3.5
+    assert testclass.failed() == [failed]
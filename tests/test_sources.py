@@ -0,0 +1,85 @@
+"""
+Test reading compressed and archived reports
+"""
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tarfile
+import zipfile
+import pytest
+from .inputfiles import get_filepath
+from .test_streaming import summarise
+from junit2htmlreport import matrix, merge, parser, parserimpl, runner, sources
+
+COMPRESSORS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+
+
+def compress(tmpdir, filename, suffix):
+    target = os.path.join(tmpdir.strpath, filename + suffix)
+    with open(get_filepath(filename), "rb") as infile:
+        with COMPRESSORS[suffix](target, "wb") as outfile:
+            shutil.copyfileobj(infile, outfile)
+    return target
+
+
+@pytest.mark.parametrize("suffix", sorted(COMPRESSORS))
+def test_compressed_report(tmpdir, suffix):
+    filename = compress(tmpdir, "junit-complex_suites.xml", suffix)
+    expected = summarise(parser.Junit(get_filepath("junit-complex_suites.xml")))
+    assert summarise(parser.Junit(filename)) == expected
+    assert summarise(parser.Junit(filename, backend="expat")) == expected
+    assert len(list(parserimpl.iter_cases(filename))) == sum(len(suite[-1]) for suite in expected)
+
+
+def make_zip(tmpdir):
+    filename = os.path.join(tmpdir.strpath, "results.zip")
+    with zipfile.ZipFile(filename, "w") as archive:
+        archive.write(get_filepath("junit-axis-linux.xml"), "linux/junit-axis-linux.xml")
+        archive.write(compress(tmpdir, "junit-axis-windows.xml", ".gz"), "junit-axis-windows.xml.gz")
+        archive.writestr("screenshot.png", b"\x89PNG not a report")
+    return filename
+
+
+def make_tar(tmpdir):
+    filename = os.path.join(tmpdir.strpath, "results.tar.gz")
+    with tarfile.open(filename, "w:gz") as archive:
+        archive.add(get_filepath("junit-axis-linux.xml"), "linux/junit-axis-linux.xml")
+        archive.add(get_filepath("junit-axis-solaris.xml"), "junit-axis-solaris.xml")
+    return filename
+
+
+def test_iter_archive(tmpdir):
+    zipped = make_zip(tmpdir)
+    assert sources.is_archive(zipped)
+    assert not sources.is_archive(get_filepath("junit-axis-linux.xml"))
+    assert not sources.is_archive(compress(tmpdir, "junit-axis-linux.xml", ".gz"))
+    names = [name for name, stream in sources.iter_archive(zipped)]
+    assert names == ["linux/junit-axis-linux.xml", "junit-axis-windows.xml.gz", "screenshot.png"]
+
+
+@pytest.mark.parametrize("maker", [make_zip, make_tar])
+def test_merge_archive(tmpdir, maker):
+    merger = merge.Merger()
+    merger.add_report(maker(tmpdir))
+    assert len(merger.reports) == 2
+    assert len(merger.suites) == 2
+
+
+def test_matrix_archive(tmpdir):
+    htmatrix = matrix.HtmlReportMatrix(tmpdir.strpath)
+    added = htmatrix.add_report(make_tar(tmpdir))
+    assert added == ["junit-axis-linux.xml", "junit-axis-solaris.xml"]
+    for axis in added:
+        assert os.path.exists(os.path.join(tmpdir.strpath, axis + ".html"))
+
+
+def test_runner_compressed(tmpdir):
+    outfile = os.path.join(tmpdir.strpath, "report.html")
+    runner.run([compress(tmpdir, "junit-unicode.xml", ".xz"), outfile])
+    assert os.path.exists(outfile)
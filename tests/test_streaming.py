@@ -0,0 +1,50 @@
+"""
+Test the incremental (streaming) parser
+"""
+import os
+import pytest
+from . import inputfiles
+from junit2htmlreport import parser, runner
+
+
+def summarise(report):
+    """
+    Reduce a parsed report to plain values that can be compared
+    """
+    result = []
+    for suite in report.suites:
+        cases = [(case.testclass.name, case.name, case.outcome(), case.duration,
+                  case.failure, case.skipped, case.stdout, case.stderr,
+                  [(prop.name, prop.value) for prop in case.properties])
+                 for case in suite.all()]
+        result.append((suite.name, suite.package, suite.duration, suite.stdout, suite.stderr,
+                       suite.errors, [(prop.name, prop.value) for prop in suite.properties],
+                       cases))
+    return result
+
+
+@pytest.mark.parametrize("filename", inputfiles.get_reports())
+def test_streaming_matches_tree(filename):
+    filepath = inputfiles.get_filepath(filename)
+    tree = parser.Junit(filename=filepath)
+    streamed = parser.Junit(filename=filepath, streaming=True)
+    assert streamed.tree is None
+    assert summarise(streamed) == summarise(tree)
+
+
+def test_streaming_string():
+    with open(inputfiles.get_filepath("junit-unicode.xml"), "r", encoding="utf-8") as data:
+        junit = parser.Junit(xmlstring=data.read(), streaming=True)
+    assert len(junit.suites) == 1
+    assert len(junit.suites[0].classes) == 2
+
+
+def test_streaming_bad_root():
+    with pytest.raises(parser.ParserError):
+        parser.Junit(xmlstring="<notjunit><testsuite/></notjunit>", streaming=True)
+
+
+def test_runner_streaming(tmpdir):
+    outfile = os.path.join(tmpdir.strpath, "report.html")
+    runner.run(["--streaming", inputfiles.get_filepath("junit-complex_suites.xml"), outfile])
+    assert os.path.exists(outfile)
@@ -2,7 +2,7 @@
 Tests for emitting junit xml
 """
 
-from junit2htmlreport import parser, merge
+from junit2htmlreport import parser, merge, runner
 
 
 def test_case_tojunit_failed():
@@ -87,3 +87,112 @@ def test_merge():
 
     output = merger.toxmlstring()
     assert output
+
+
+def test_streaming_merge(tmpdir):
+    """
+    Test the streaming merge writes the same suites as the in-memory merge
+    :return:
+    """
+    import os
+    import re
+    import xml.etree.ElementTree as ET
+    from .inputfiles import get_filepath
+
+    filenames = [get_filepath(name) for name in
+                 ("junit-complex_suites.xml", "junit-cute2.xml", "junit-unicode.xml")]
+    merger = merge.Merger()
+    for filename in filenames:
+        merger.add_report(filename)
+    expected = merger.toxmlstring()
+
+    outfile = os.path.join(tmpdir.strpath, "merged.xml")
+    with open(outfile, "wb") as output:
+        streamer = merge.StreamingMerger(output)
+        for filename in filenames:
+            streamer.add_report(filename)
+        # a broken report in a folder is left out
+        folder = tmpdir.mkdir("broken")
+        folder.join("broken.xml").write('<testsuites><testsuite name="x"><testcase name="y"/></testsuite><bad')
+        streamer.add_report(folder.strpath)
+        streamer.finish()
+    with open(outfile, "rb") as infile:
+        written = infile.read().decode("utf-8")
+    assert re.sub(r'" +>', '">', written, count=1) == expected
+    assert float(ET.parse(outfile).getroot().get("duration")) == merger.calculate_duration()
+
+    newfile = os.path.join(tmpdir.strpath, "runner.xml")
+    runner.run(["--merge", newfile, "--streaming"] + filenames)
+    with open(newfile, "rb") as infile:
+        assert infile.read().decode("utf-8") == written
+
+
+def tostring(item):
+    from io import StringIO
+    buf = StringIO()
+    item.write_junit(buf)
+    return buf.getvalue()
+
+
+def assert_same_element(written, expected):
+    """
+    Compare an element parsed from write_junit() output with one from tojunit().
+    Serialised xml is not compared as ElementTree's attribute order and
+    escaping differ between python versions.
+    :param written:
+    :param expected:
+    :return:
+    """
+    assert written.tag == expected.tag
+    assert written.attrib == {name: str(value) for name, value in expected.attrib.items()}
+    assert (written.text or "") == (expected.text or "")
+    assert len(written) == len(expected)
+    for child, expected_child in zip(written, expected):
+        assert_same_element(child, expected_child)
+
+
+def assert_writes_tojunit(item):
+    import xml.etree.ElementTree as ET
+    assert_same_element(ET.fromstring(tostring(item)), item.tojunit())
+
+
+def test_write_junit_matches_tojunit():
+    """
+    Test write_junit() writes the same xml as tojunit() builds
+    :return:
+    """
+    from . import inputfiles
+
+    merger = merge.Merger()
+    for filename in inputfiles.get_reports():
+        report = parser.Junit(inputfiles.get_filepath(filename))
+        for suite in report.suites:
+            assert_writes_tojunit(suite)
+            merger.add_suite(suite)
+    assert_writes_tojunit(merger)
+    assert_writes_tojunit(merge.Merger())
+
+
+def test_write_junit_escaping():
+    """
+    Test write_junit() escapes text and attributes so they parse back unchanged
+    :return:
+    """
+    testclass = parser.Class()
+    testclass.name = 'my "class" <&>'
+    testcase = parser.Case()
+    testcase.name = "line\none\ttab\rcr"
+    testcase.testclass = testclass
+    testcase.stdout = ""
+    testcase.stderr = "<b>&amp;</b> é"
+    testcase.failure = "bad > good"
+    prop = parser.Property()
+    prop.name = "key"
+    prop.value = None
+    testcase.properties.append(prop)
+    assert_writes_tojunit(testcase)
+    assert_writes_tojunit(prop)
+
+    empty = parser.Case()
+    assert_writes_tojunit(empty)
+    assert_writes_tojunit(parser.Suite())